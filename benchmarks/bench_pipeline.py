@@ -0,0 +1,205 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from bench_profiles import ITEMS_PER_TRANSACTION, ROOT, WORK_DIR
+
+from aggregations import PASS_QUERIES, metrics_from_passes
+from backends import SQLiteBackend
+from create_realistic_dashboard import build_dashboard_figure
+from generate_realistic_data import (
+    DEFAULT_SHARD_SIZE,
+    generate_realistic_sales_data,
+    save_data_chunks,
+)
+from html_output import write_dashboard_html
+from setup_realistic_database import create_realistic_database, report_queries
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+SIZES = {
+    "1K": 1_000,
+    "10K": 10_000,
+    "100K": 100_000,
+    "1M": 1_000_000,
+    "10M": 10_000_000,
+    "100M": 100_000_000,
+}
+
+# A stage regresses when it is this much slower than the baseline and the
+# difference is above timer noise
+REGRESSION_RATIO = 1.25
+NOISE_SECONDS = 0.005
+
+
+def timed(function, *args, repeat=1):
+    """Result of ``function(*args)`` and its best wall time over ``repeat`` runs"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def timed_chunks(chunks, stages, name):
+    """Pass chunks through, adding the time spent producing them to
+    ``stages[name]``"""
+    stages[name] = 0.0
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        stages[name] += time.perf_counter() - start
+        if chunk is None:
+            return
+        yield chunk
+
+
+def bench_size(item_rows, repeat=3):
+    """Time every pipeline stage on one dataset size, in seconds per stage
+
+    Runs in the current directory, which must be a scratch directory since
+    the pipeline writes ``data/``, ``database/`` and ``dashboard/`` there.
+    """
+    for directory in ("data", "database", "dashboard"):
+        os.makedirs(directory, exist_ok=True)
+    stages = {}
+
+    # Generated and written one shard at a time, so memory stays bounded
+    # at the largest sizes; generation is timed apart from writing
+    chunks = generate_realistic_sales_data(
+        item_rows // ITEMS_PER_TRANSACTION, 42, DEFAULT_SHARD_SIZE, datetime(2024, 1, 1)
+    )
+    _, seconds = timed(save_data_chunks, timed_chunks(chunks, stages, "generate"))
+    stages["save_data"] = seconds - stages["generate"]
+
+    _, stages["create_database"] = timed(create_realistic_database)
+
+    backend = SQLiteBackend(read_only=True)
+    passes = {}
+    for name, sql in PASS_QUERIES.items():
+        passes[name], stages[f"query:{name}"] = timed(
+            backend.read_columns, sql.format(where=""), repeat=repeat
+        )
+    for name, (sql, params) in report_queries().items():
+        _, stages[f"report:{name}"] = timed(
+            backend.read_sql, sql, params, repeat=repeat
+        )
+    backend.close()
+
+    metrics, stages["metrics"] = timed(
+        metrics_from_passes,
+        pd.DataFrame(passes["sales"]),
+        pd.DataFrame(passes["items"]),
+    )
+    fig, stages["figure"] = timed(build_dashboard_figure, metrics, repeat=repeat)
+    _, stages["write_html"] = timed(
+        write_dashboard_html, fig, "dashboard/bench.html", repeat=repeat
+    )
+    return stages
+
+
+def find_regressions(results, baseline):
+    """``(size, stage, seconds, baseline_seconds)`` for every regressed stage"""
+    regressions = []
+    for size, stages in results.items():
+        for stage, seconds in stages.items():
+            before = baseline.get(size, {}).get(stage)
+            if (
+                before is not None
+                and seconds > before * REGRESSION_RATIO
+                and seconds - before > NOISE_SECONDS
+            ):
+                regressions.append((size, stage, seconds, before))
+    return regressions
+
+
+def report(results, baseline):
+    """Print a stage by size table, marking stages slower than the baseline"""
+    sizes = list(results)
+    stages = list(dict.fromkeys(stage for size in sizes for stage in results[size]))
+    regressed = {
+        (size, stage) for size, stage, *_ in find_regressions(results, baseline)
+    }
+
+    print(f"\n{'stage (ms)':<44}" + "".join(f"{size:>12}" for size in sizes))
+    for stage in stages:
+        cells = ""
+        for size in sizes:
+            seconds = results[size].get(stage)
+            mark = " !" if (size, stage) in regressed else "  "
+            cells += (
+                f"{seconds * 1000:>10.1f}{mark}" if seconds is not None else " " * 12
+            )
+        print(f"{stage[:43]:<44}{cells}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time each stage of generate -> load -> query -> render"
+    )
+    parser.add_argument(
+        "--sizes",
+        default="1K,10K,100K,1M",
+        help=f"comma-separated item row counts from {', '.join(SIZES)}",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per query/render stage"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help=f"store these results as the baseline ({os.path.relpath(BASELINE)})",
+    )
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes.split(","):
+        work = os.path.join(WORK_DIR, f"pipeline-{size}")
+        os.makedirs(work, exist_ok=True)
+        os.chdir(work)
+        print(f"\nBenchmarking {size} item rows...")
+        results[size] = bench_size(SIZES[size], args.repeat)
+        os.chdir(ROOT)
+        shutil.rmtree(work)
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)["results"]
+    report(results, baseline)
+
+    run = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{run['timestamp'].replace(':', '')}.json")
+    with open(path, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults saved to {os.path.relpath(path)}")
+
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline updated: {os.path.relpath(BASELINE)}")
+    elif baseline:
+        regressions = find_regressions(results, baseline)
+        for size, stage, seconds, before in regressions:
+            print(
+                f"REGRESSION {size} {stage}: {seconds * 1000:.1f} ms "
+                f"(baseline {before * 1000:.1f} ms)"
+            )
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
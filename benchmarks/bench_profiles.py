@@ -0,0 +1,108 @@
+import argparse
+import os
+import shutil
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+for directory in ("scripts", "database", "dashboard"):
+    sys.path.append(os.path.abspath(os.path.join(ROOT, directory)))
+
+from db_pool import DB_PATH, PROFILES, connect_reader, set_profile
+from generate_realistic_data import save_data_parallel
+from index_advisor import time_query, workload
+from setup_realistic_database import create_realistic_database
+
+WORK_DIR = os.path.abspath(os.path.join(ROOT, "benchmarks", "work"))
+SIZES = {"1M": 1_000_000, "10M": 10_000_000, "100M": 100_000_000}
+ITEMS_PER_TRANSACTION = 4  # average basket size of the generator
+
+
+def drop_page_cache(path):
+    """Ask the OS to evict a file's cached pages so the next read is cold"""
+    if hasattr(os, "posix_fadvise"):
+        fd = os.open(path, os.O_RDONLY)
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        os.close(fd)
+
+
+def build_databases(item_rows):
+    """Generate one dataset and build it once per distinct profile page size
+
+    Runs inside its own working directory, since the pipeline reads and
+    writes ``data/`` and ``database/`` relative to the current directory.
+    Returns a map of page size to database path.
+    """
+    os.makedirs("database", exist_ok=True)
+    save_data_parallel(item_rows // ITEMS_PER_TRANSACTION, os.cpu_count())
+
+    databases = {}
+    for name, profile in PROFILES.items():
+        page_size = profile["page_size"]
+        if page_size in databases:
+            continue
+        set_profile(name)
+        create_realistic_database()
+        databases[page_size] = os.path.abspath(f"database/supermarket-{page_size}.db")
+        os.replace(DB_PATH, databases[page_size])
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(DB_PATH + suffix):
+                os.remove(DB_PATH + suffix)
+    return databases
+
+
+def bench_profiles(databases):
+    """Time every workload query under every profile, cold and warm"""
+    results = {}
+    for name, profile in PROFILES.items():
+        set_profile(name)
+        db_path = databases[profile["page_size"]]
+        conn = connect_reader(db_path)
+        for query, sql, params in workload(conn):
+            drop_page_cache(db_path)
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            cold = time.perf_counter() - start
+            warm = time_query(conn, sql, params)
+            results[query, name] = (cold, warm)
+        conn.close()
+    return results
+
+
+def report(size, results):
+    """Print cold / warm milliseconds per query and profile"""
+    profiles = list(PROFILES)
+    print(f"\n{size} item rows (cold / warm ms)")
+    print(f"{'query':<40}" + "".join(f"{name:>20}" for name in profiles))
+    for query in dict.fromkeys(query for query, _ in results):
+        cells = "".join(
+            f"{results[query, name][0] * 1000:>11.1f} /{results[query, name][1] * 1000:>7.1f}"
+            for name in profiles
+        )
+        print(f"{query:<40}{cells}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the dashboard queries under each performance profile"
+    )
+    parser.add_argument(
+        "--sizes",
+        default="1M,10M,100M",
+        help=f"comma-separated item row counts from {', '.join(SIZES)}",
+    )
+    parser.add_argument(
+        "--keep", action="store_true", help="keep the generated work directories"
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes.split(","):
+        work = os.path.join(WORK_DIR, size)
+        os.makedirs(work, exist_ok=True)
+        os.chdir(work)
+        results = bench_profiles(build_databases(SIZES[size]))
+        report(size, results)
+        os.chdir(ROOT)
+        if not args.keep:
+            shutil.rmtree(work)
@@ -0,0 +1,552 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+from sketches import RELATIVE_ERROR, estimate, merge
+
+PARQUET_DIR = "data/parquet"
+
+# One pass per rollup table, at the finest grain any panel needs. Every
+# dashboard metric is derived from these two results in memory. Rows are
+# filtered and grouped on integer keys; the dimensions are joined only to
+# label the few result rows. {where} takes the predicates of a
+# ``DashboardFilters``.
+PASS_QUERIES = {
+    "sales": """
+        SELECT
+            d.date,
+            s.city,
+            p.payment_method,
+            r.transaction_count,
+            r.gross_income
+        FROM (
+            SELECT date_key, store_key, payment_key, transaction_count, gross_income
+            FROM daily_sales_rollup
+            {where}
+        ) r
+        JOIN dim_date d ON d.date_key = r.date_key
+        JOIN dim_store s ON s.store_key = r.store_key
+        JOIN dim_payment p ON p.payment_key = r.payment_key
+    """,
+    "items": """
+        SELECT
+            p.category,
+            p.product,
+            g.rating_category,
+            r.line_count,
+            r.quantity,
+            r.item_total,
+            r.rating_sum
+        FROM (
+            SELECT
+                product_key,
+                rating_key,
+                SUM(line_count) as line_count,
+                SUM(quantity) as quantity,
+                SUM(item_total) as item_total,
+                SUM(rating_sum) as rating_sum
+            FROM daily_item_rollup
+            {where}
+            GROUP BY product_key, rating_key
+        ) r
+        JOIN dim_product p ON p.product_key = r.product_key
+        JOIN dim_rating g ON g.rating_key = r.rating_key
+    """,
+}
+
+# The items pass over the stored line-item sample, for approximate mode.
+# Each sampled line stands for ``weight`` lines; the variance columns are
+# the Horvitz-Thompson variance estimates of line_count and item_total.
+APPROXIMATE_PASS_QUERIES = {
+    "items": """
+        SELECT
+            p.category,
+            p.product,
+            g.rating_category,
+            r.line_count,
+            r.quantity,
+            r.item_total,
+            r.rating_sum,
+            r.line_count_variance,
+            r.item_total_variance
+        FROM (
+            SELECT
+                product_key,
+                rating_key,
+                SUM(weight) as line_count,
+                SUM(weight * quantity) as quantity,
+                SUM(weight * item_total) as item_total,
+                SUM(weight * rating) as rating_sum,
+                SUM(weight * weight - weight) as line_count_variance,
+                SUM((weight * weight - weight) * item_total * item_total)
+                    as item_total_variance
+            FROM sample_items
+            {where}
+            GROUP BY product_key, rating_key
+        ) r
+        JOIN dim_product p ON p.product_key = r.product_key
+        JOIN dim_rating g ON g.rating_key = r.rating_key
+    """,
+}
+
+# Normal quantile of the two-sided 95% error bounds
+Z_95 = 1.96
+
+# RFM segments of the customer feature store. Each customer is scored 1-5
+# on recency (last visit), frequency (visits) and monetary value by the
+# quintile of the share of customers with a strictly lower value, so ties
+# score alike at the bottom of their block, and the first matching rule
+# names the segment. Quintiles are picked with CASE rather than FLOOR,
+# which SQLite only has when built with its math functions.
+QUINTILE_SQL = """
+    CASE
+        WHEN {share} < 0.2 THEN 1
+        WHEN {share} < 0.4 THEN 2
+        WHEN {share} < 0.6 THEN 3
+        WHEN {share} < 0.8 THEN 4
+        ELSE 5
+    END
+"""
+CUSTOMER_SEGMENTS_SQL = f"""
+    WITH ranked AS (
+        SELECT
+            customer_key,
+            visit_count,
+            monetary,
+            (RANK() OVER (ORDER BY last_date_key) - 1) * 1.0 / COUNT(*) OVER ()
+                as r_share,
+            (RANK() OVER (ORDER BY visit_count) - 1) * 1.0 / COUNT(*) OVER ()
+                as f_share,
+            (RANK() OVER (ORDER BY monetary) - 1) * 1.0 / COUNT(*) OVER ()
+                as m_share
+        FROM customer_features
+    ),
+    scored AS (
+        SELECT
+            customer_key,
+            visit_count,
+            monetary,
+            {QUINTILE_SQL.format(share="r_share")} as r,
+            {QUINTILE_SQL.format(share="f_share")} as f,
+            {QUINTILE_SQL.format(share="m_share")} as m
+        FROM ranked
+    ),
+    segmented AS (
+        SELECT
+            customer_key,
+            visit_count,
+            monetary,
+            CASE
+                WHEN r >= 4 AND f >= 4 AND m >= 4 THEN 'Champions'
+                WHEN r <= 2 AND f >= 3 THEN 'At Risk'
+                WHEN r <= 2 THEN 'Lapsed'
+                WHEN r >= 4 AND f <= 2 THEN 'New'
+                WHEN f >= 4 THEN 'Loyal'
+                ELSE 'Regular'
+            END as segment
+        FROM scored
+    )
+"""
+CUSTOMER_SEGMENTS = ["Champions", "Loyal", "Regular", "New", "At Risk", "Lapsed"]
+# Leading columns of DashboardMetrics.customers; the rest are categories
+CUSTOMER_SUMMARY_COLUMNS = ["segment", "customers", "avg_visits", "avg_spend"]
+
+# One pass per feature table, each O(customers) and grouped to a few rows
+CUSTOMER_QUERIES = {
+    "segments": CUSTOMER_SEGMENTS_SQL
+    + """
+        SELECT
+            segment,
+            COUNT(*) as customers,
+            AVG(visit_count) as avg_visits,
+            AVG(monetary) as avg_spend
+        FROM segmented
+        GROUP BY segment
+    """,
+    "mix": CUSTOMER_SEGMENTS_SQL
+    + """
+        SELECT s.segment, c.category, SUM(c.item_total) as item_total
+        FROM segmented s
+        JOIN customer_category_mix c ON c.customer_key = s.customer_key
+        GROUP BY s.segment, c.category
+    """,
+}
+
+RATING_CATEGORIES = ["High (4.5-5.0)", "Good (4.0-4.4)", "Average (3.5-3.9)"]
+
+
+@dataclass(frozen=True)
+class DashboardFilters:
+    """Which slice of the data a dashboard covers; empty fields match all
+
+    Categories narrow only line-item figures (products, categories and
+    ratings). Transaction figures such as revenue by payment method cover
+    whole baskets, which mix categories.
+    """
+
+    cities: tuple = ()
+    stores: tuple = ()
+    date_from: str = None
+    date_to: str = None
+    payment_methods: tuple = ()
+    categories: tuple = ()
+
+    def __post_init__(self):
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValueError(
+                f"Date range {self.date_from} to {self.date_to} ends before it starts"
+            )
+
+    def predicates(self, items=False):
+        """SQL predicates on the star schema's keys and their bound
+        parameters; ``items`` adds the category filter of line-item queries"""
+        clauses, params = [], []
+        # Date keys are the dates as YYYYMMDD integers
+        if self.date_from:
+            clauses.append("date_key >= ?")
+            params.append(int(self.date_from.replace("-", "")))
+        if self.date_to:
+            clauses.append("date_key <= ?")
+            params.append(int(self.date_to.replace("-", "")))
+        # Labels are looked up in their dimension, so rows are matched on keys
+        lookups = [
+            ("store_key", "dim_store", "city", self.cities),
+            ("store_key", "dim_store", "store", self.stores),
+            ("payment_key", "dim_payment", "payment_method", self.payment_methods),
+        ]
+        if items:
+            lookups.append(("product_key", "dim_product", "category", self.categories))
+        for key, table, column, values in lookups:
+            if values:
+                clauses.append(
+                    f"{key} IN (SELECT {key} FROM {table} "
+                    f"WHERE {column} IN ({', '.join('?' * len(values))}))"
+                )
+                params.extend(values)
+        return clauses, params
+
+    def where(self, items=False):
+        """SQL ``WHERE`` clause and bound parameters for these filters"""
+        clauses, params = self.predicates(items)
+        return ("WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    @property
+    def label(self):
+        """Human-readable description of the slice"""
+        parts = []
+        if self.cities or self.stores:
+            parts.append(", ".join(self.stores or self.cities))
+        for values in (self.payment_methods, self.categories):
+            if values:
+                parts.append(", ".join(values))
+        if self.date_from and self.date_to:
+            parts.append(f"{self.date_from} to {self.date_to}")
+        elif self.date_from:
+            parts.append(f"from {self.date_from}")
+        elif self.date_to:
+            parts.append(f"until {self.date_to}")
+        return " · ".join(parts) or "All data"
+
+
+@dataclass
+class DashboardMetrics:
+    """Everything the dashboard panels and the insights report show"""
+
+    payment: pd.DataFrame
+    rating: pd.DataFrame
+    city_trends: pd.DataFrame
+    city_series: dict
+    category: pd.DataFrame
+    top_products: pd.DataFrame
+    total_revenue: float
+    total_transactions: int
+    cash_percentage: float
+    city_count: int
+    # Approximate mode only: {label: (estimate, 95% error bound)}
+    estimates: dict = None
+    # Unfiltered dashboards only: one row per RFM segment, with its
+    # customers, average visits and spend, and its spend share (%) per
+    # category in one column each
+    customers: pd.DataFrame = None
+
+
+def add_filter_arguments(parser, dates=True):
+    """Add the options read by ``filters_from_args``; ``dates`` adds
+    --since/--until, for scripts that do not define their own"""
+    if dates:
+        parser.add_argument("--since", help="first date (YYYY-MM-DD) to include")
+        parser.add_argument("--until", help="last date (YYYY-MM-DD) to include")
+    parser.add_argument(
+        "--city", action="append", default=[], help="only this city (repeatable)"
+    )
+    parser.add_argument(
+        "--store", action="append", default=[], help="only this store (repeatable)"
+    )
+    parser.add_argument(
+        "--payment",
+        action="append",
+        default=[],
+        help="only this payment method (repeatable)",
+    )
+    parser.add_argument(
+        "--category",
+        action="append",
+        default=[],
+        help="only line items of this category (repeatable)",
+    )
+
+
+def check_date_range(parser, args):
+    """Reject a --since later than --until as a usage error"""
+    if args.since and args.until and args.since > args.until:
+        parser.error(f"--since {args.since} is after --until {args.until}")
+
+
+def filters_from_args(args):
+    """``DashboardFilters`` for the options added by ``add_filter_arguments``"""
+    return DashboardFilters(
+        tuple(args.city),
+        tuple(args.store),
+        args.since,
+        args.until,
+        tuple(args.payment),
+        tuple(args.category),
+    )
+
+
+def compute_metrics(backend, cache=None, filters=None, approximate=False):
+    """Compute the dashboard metrics with one scan of each rollup table
+
+    ``backend`` is any query backend from ``database/backends.py``. With a
+    ``QueryCache``, unchanged passes are served from disk. ``filters``
+    narrows both passes to a ``DashboardFilters`` slice; a date range also
+    limits them to the monthly rollup partitions it overlaps.
+    ``approximate`` reads line items from the stored sample instead and
+    sets ``estimates``; transaction figures stay exact. Customer segments
+    cover each customer's whole history, so only unfiltered dashboards
+    show them.
+    """
+    filters = filters or DashboardFilters()
+
+    def read_columns(name, queries=PASS_QUERIES):
+        where, params = filters.where(items=name == "items")
+        sql = backend.route(
+            queries[name].format(where=where), filters.date_from, filters.date_to
+        )
+        if cache:
+            return cache.read_columns(sql, backend, params)
+        return backend.read_columns(sql, params)
+
+    sales = pd.DataFrame(read_columns("sales"))
+    items = pd.DataFrame(
+        read_columns("items", APPROXIMATE_PASS_QUERIES if approximate else PASS_QUERIES)
+    )
+    metrics = metrics_from_passes(sales, items)
+    if approximate:
+        metrics.estimates = sample_estimates(backend, items, filters)
+    if filters == DashboardFilters():
+        metrics.customers = customer_segments(
+            pd.DataFrame(read_columns("segments", CUSTOMER_QUERIES)),
+            pd.DataFrame(read_columns("mix", CUSTOMER_QUERIES)),
+        )
+    return metrics
+
+
+def customer_segments(segments, mix):
+    """One row per RFM segment with its category spend shares (%)"""
+    shares = mix.pivot_table(
+        index="segment",
+        columns="category",
+        values="item_total",
+        aggfunc="sum",
+        fill_value=0,
+    )
+    shares = (shares.div(shares.sum(axis=1), axis=0) * 100).round(1)
+    order = [
+        segment for segment in CUSTOMER_SEGMENTS if segment in set(segments["segment"])
+    ]
+    return segments.set_index("segment").join(shares).reindex(order).reset_index()
+
+
+def sample_estimates(backend, items, filters):
+    """Estimates and 95% error bounds of the approximate figures
+
+    Line-item totals come from the sample's items pass. Unique customers
+    come from the HyperLogLog sketches of the selected stores and days;
+    sketches hold no payment method or category, so they are left out
+    when the filters use those.
+    """
+    estimates = {
+        "Line Items": (
+            items["line_count"].sum(),
+            Z_95 * np.sqrt(items["line_count_variance"].sum()),
+        ),
+        "Line-Item Revenue": (
+            items["item_total"].sum(),
+            Z_95 * np.sqrt(items["item_total_variance"].sum()),
+        ),
+    }
+    if not (filters.payment_methods or filters.categories):
+        where, params = DashboardFilters(
+            filters.cities, filters.stores, filters.date_from, filters.date_to
+        ).where()
+        blobs = backend.read_columns(
+            f"SELECT registers FROM customer_sketches {where}", params
+        )["registers"]
+        customers = estimate(merge(blobs))
+        estimates["Unique Customers"] = (customers, Z_95 * RELATIVE_ERROR * customers)
+    return estimates
+
+
+def compute_metrics_from_parquet(parquet_dir=PARQUET_DIR):
+    """Compute the dashboard metrics with one vectorized pass per dataset
+
+    Only the needed columns are read and each dataset is grouped once to
+    the same grain as ``PASS_QUERIES``.
+    """
+    transactions = pd.read_parquet(
+        f"{parquet_dir}/transactions",
+        columns=["date", "city", "payment_method", "gross_income"],
+    )
+    items = pd.read_parquet(
+        f"{parquet_dir}/transaction_items",
+        columns=["product", "category", "quantity", "item_total", "rating"],
+    )
+
+    # Dates are stored dictionary-encoded and read back as categoricals
+    transactions["date"] = transactions["date"].astype(str)
+    sales = (
+        transactions.groupby(["date", "city", "payment_method"], observed=True)[
+            "gross_income"
+        ]
+        .agg(transaction_count="count", gross_income="sum")
+        .reset_index()
+    )
+
+    items["rating_category"] = np.select(
+        [items["rating"] >= 4.5, items["rating"] >= 4.0, items["rating"] >= 3.5],
+        RATING_CATEGORIES,
+        "Low (3.0-3.4)",
+    )
+    item_pass = (
+        items.groupby(["category", "product", "rating_category"], observed=True)
+        .agg(
+            line_count=("rating", "size"),
+            quantity=("quantity", "sum"),
+            item_total=("item_total", "sum"),
+            rating_sum=("rating", "sum"),
+        )
+        .reset_index()
+    )
+    return metrics_from_passes(sales, item_pass)
+
+
+def split_by_key(keys, *columns):
+    """Split parallel column arrays into one group per distinct key
+
+    Keys are factorized to integer codes, one stable sort brings each
+    key's rows together in their original order, and ``np.split`` at the
+    group boundaries yields views into the sorted arrays. Every series
+    costs one pass over the data instead of one scan per key.
+    """
+    codes, uniques = pd.factorize(keys, sort=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes, minlength=len(uniques)))[:-1]
+    splits = [np.split(np.asarray(column)[order], bounds) for column in columns]
+    return {key: tuple(split[i] for split in splits) for i, key in enumerate(uniques)}
+
+
+def metrics_from_passes(sales, items):
+    """Derive every panel from the two grouped passes"""
+    for frame in (sales, items):
+        for column in frame.select_dtypes("category"):
+            frame[column] = frame[column].astype(str)
+
+    # Payment method analysis
+    payment = (
+        sales.groupby("payment_method")
+        .agg(
+            transaction_count=("transaction_count", "sum"),
+            total_revenue=("gross_income", "sum"),
+        )
+        .reset_index()
+        .sort_values("total_revenue", ascending=False, ignore_index=True)
+    )
+    total_revenue = payment["total_revenue"].sum()
+    payment["revenue_percentage"] = (
+        payment["total_revenue"] * 100.0 / total_revenue
+    ).round(1)
+
+    # Sales by city over time
+    city_trends = (
+        sales.groupby(["date", "city"])["gross_income"]
+        .sum()
+        .rename("daily_revenue")
+        .reset_index()
+    )
+    city_series = split_by_key(
+        city_trends["city"].to_numpy(),
+        city_trends["date"].to_numpy(),
+        city_trends["daily_revenue"].to_numpy(),
+    )
+
+    # Product performance by rating
+    rating = (
+        items.groupby("rating_category")
+        .agg(
+            total_quantity=("quantity", "sum"),
+            total_revenue=("item_total", "sum"),
+            product_count=("product", "nunique"),
+        )
+        .reset_index()
+        .sort_values("total_revenue", ascending=False, ignore_index=True)
+    )
+
+    # Category performance
+    category = (
+        items.groupby("category")
+        .agg(
+            total_revenue=("item_total", "sum"),
+            total_quantity=("quantity", "sum"),
+            rating_sum=("rating_sum", "sum"),
+            line_count=("line_count", "sum"),
+            product_count=("product", "nunique"),
+        )
+        .reset_index()
+        .sort_values("total_revenue", ascending=False, ignore_index=True)
+    )
+    category.insert(
+        3, "avg_rating", category.pop("rating_sum") / category.pop("line_count")
+    )
+
+    # Top products
+    top_products = (
+        items.groupby(["product", "category"])
+        .agg(
+            total_revenue=("item_total", "sum"),
+            total_quantity=("quantity", "sum"),
+            rating_sum=("rating_sum", "sum"),
+            line_count=("line_count", "sum"),
+        )
+        .reset_index()
+        .nlargest(15, "total_revenue")
+        .reset_index(drop=True)
+    )
+    top_products["avg_rating"] = top_products.pop("rating_sum") / top_products.pop(
+        "line_count"
+    )
+
+    cash = payment.loc[payment["payment_method"] == "Cash", "revenue_percentage"]
+
+    return DashboardMetrics(
+        payment=payment,
+        rating=rating,
+        city_trends=city_trends,
+        city_series=city_series,
+        category=category,
+        top_products=top_products,
+        total_revenue=float(total_revenue),
+        total_transactions=int(payment["transaction_count"].sum()),
+        cash_percentage=float(cash.iloc[0]) if len(cash) else 0.0,
+        city_count=int(sales["city"].nunique()),
+    )
@@ -1,110 +1,129 @@
-import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import pandas as pd
-import sqlite3
 import webbrowser
+import argparse
 import os
+import sys
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+
+from backends import open_backend
+from db_pool import PROFILES, set_profile
+from aggregations import (
+    CUSTOMER_SUMMARY_COLUMNS,
+    DashboardFilters,
+    add_filter_arguments,
+    check_date_range,
+    compute_metrics,
+    compute_metrics_from_parquet,
+    filters_from_args,
+)
+from downsample import DEFAULT_MAX_POINTS, METHODS, downsample
+from html_output import write_dashboard_html
+from instrumentation import add_trace_arguments, enable_tracing_from_args, stage, traced
+from query_cache import QueryCache
+
+
+@traced()
+def create_realistic_dashboard(
+    source="db",
+    use_cache=True,
+    backend="sqlite",
+    max_points=DEFAULT_MAX_POINTS,
+    sampling="lttb",
+    compact=False,
+    compress=False,
+    filters=None,
+    approximate=False,
+):
+    """Create realistic supermarket dashboard, optionally for a slice of
+    the data given as ``DashboardFilters`` or from the line-item sample"""
+    filters = filters or DashboardFilters()
 
+    with stage("load_metrics", source=source, backend=backend):
+        metrics = load_dashboard_metrics(
+            source, use_cache, backend, filters, approximate
+        )
+    with stage("build_figure", cities=metrics.city_count):
+        title = "Supermarket Sales Dashboard"
+        if filters != DashboardFilters():
+            title += f" · {filters.label}"
+        if approximate:
+            title += " (approximate)"
+        fig = build_dashboard_figure(metrics, max_points, sampling, title)
 
-def create_realistic_dashboard():
-    """Create realistic supermarket dashboard"""
+    # Save dashboard
+    with stage("write_html", compact=compact, gzip=compress) as info:
+        path = write_dashboard_html(
+            fig, "dashboard/realistic_supermarket_dashboard.html", compact, compress
+        )
+        info["bytes"] = os.path.getsize(path)
+    print(f"Realistic dashboard saved to {path}")
 
-    # Database connection
-    conn = sqlite3.connect("database/supermarket.db")
+    # Generate insights
+    generate_realistic_insights(metrics, filters.label)
 
-    # Payment method analysis
-    payment_query = """
-        SELECT 
-            payment_method,
-            COUNT(*) as transaction_count,
-            SUM(gross_income) as total_revenue,
-            ROUND(SUM(gross_income) * 100.0 / (SELECT SUM(gross_income) FROM transactions), 1) as revenue_percentage
-        FROM transactions
-        GROUP BY payment_method
-        ORDER BY total_revenue DESC
-    """
-    payment_data = pd.read_sql_query(payment_query, conn)
-
-    # Product performance by rating
-    product_rating_query = """
-        SELECT 
-            CASE 
-                WHEN rating >= 4.5 THEN 'High (4.5-5.0)'
-                WHEN rating >= 4.0 THEN 'Good (4.0-4.4)'
-                WHEN rating >= 3.5 THEN 'Average (3.5-3.9)'
-                ELSE 'Low (3.0-3.4)'
-            END as rating_category,
-            SUM(quantity) as total_quantity,
-            SUM(item_total) as total_revenue,
-            COUNT(DISTINCT product) as product_count
-        FROM transaction_items
-        GROUP BY rating_category
-        ORDER BY total_revenue DESC
-    """
-    rating_data = pd.read_sql_query(product_rating_query, conn)
-
-    # Sales by city over time
-    city_time_query = """
-        SELECT 
-            date,
-            city,
-            SUM(gross_income) as daily_revenue
-        FROM transactions
-        GROUP BY date, city
-        ORDER BY date
-    """
-    city_time_data = pd.read_sql_query(city_time_query, conn)
-
-    # Category performance
-    category_query = """
-        SELECT 
-            category,
-            SUM(item_total) as total_revenue,
-            SUM(quantity) as total_quantity,
-            AVG(rating) as avg_rating,
-            COUNT(DISTINCT product) as product_count
-        FROM transaction_items
-        GROUP BY category
-        ORDER BY total_revenue DESC
-    """
-    category_data = pd.read_sql_query(category_query, conn)
-
-    # Top products
-    top_products_query = """
-        SELECT 
-            product,
-            category,
-            SUM(item_total) as total_revenue,
-            SUM(quantity) as total_quantity,
-            AVG(rating) as avg_rating
-        FROM transaction_items
-        GROUP BY product, category
-        ORDER BY total_revenue DESC
-        LIMIT 15
+    return fig
+
+
+def load_dashboard_metrics(
+    source="db", use_cache=True, backend="sqlite", filters=None, approximate=False
+):
+    """Aggregate the dashboard metrics from the database or the data files"""
+    if approximate and source != "db":
+        raise ValueError("approximate mode needs the database's stored sample")
+    if source == "parquet" and backend == "sqlite":
+        if filters and filters != DashboardFilters():
+            raise ValueError("filters need the database or the duckdb backend")
+        return compute_metrics_from_parquet()
+
+    engine = open_backend(backend, source)
+    cache = QueryCache() if use_cache else None
+    metrics = compute_metrics(engine, cache, filters, approximate)
+    engine.close()
+
+    if cache:
+        print(f"Query cache: {cache.hits} hits, {cache.misses} misses")
+
+    return metrics
+
+
+def build_dashboard_figure(
+    metrics,
+    max_points=DEFAULT_MAX_POINTS,
+    sampling="lttb",
+    title="Supermarket Sales Dashboard",
+):
+    """Lay out the six dashboard panels for a set of metrics
+
+    Each city trend is downsampled to at most ``max_points`` points.
     """
-    top_products_data = pd.read_sql_query(top_products_query, conn)
-
-    conn.close()
-
-    # Create subplots
-    fig = make_subplots(
-        rows=3,
-        cols=2,
-        subplot_titles=(
-            "Payment Method Revenue",
-            "Product Performance by Rating",
-            "Sales Trends by City",
-            "Category Performance",
-            "Top Products by Revenue",
-            "Key Metrics",
-        ),
-        specs=[
-            [{"type": "pie"}, {"type": "bar"}],
-            [{"type": "scatter"}, {"type": "scatter"}],
-            [{"type": "bar"}, {"type": "table"}],
-        ],
-    )
+    payment_data = metrics.payment
+    rating_data = metrics.rating
+    category_data = metrics.category
+    top_products_data = metrics.top_products
+
+    # Create subplots, with a full-width customer row when segments exist
+    customers = metrics.customers
+    titles = [
+        "Payment Method Revenue",
+        "Product Performance by Rating",
+        "Sales Trends by City",
+        "Category Performance",
+        "Top Products by Revenue",
+        "Key Metrics",
+    ]
+    specs = [
+        [{"type": "pie"}, {"type": "bar"}],
+        [{"type": "scatter"}, {"type": "scatter"}],
+        [{"type": "bar"}, {"type": "table"}],
+    ]
+    if customers is not None:
+        titles.append("Customer Segments (RFM) by Category Spend %")
+        specs.append([{"type": "bar", "colspan": 2}, None])
+    fig = make_subplots(rows=len(specs), cols=2, subplot_titles=titles, specs=specs)
 
     # 1. Payment Method Pie Chart
     fig.add_trace(
@@ -130,12 +149,12 @@ def create_realistic_dashboard():
     )
 
     # 3. City Trends
-    for city in city_time_data["city"].unique():
-        city_data = city_time_data[city_time_data["city"] == city]
+    for city, (dates, revenue) in metrics.city_series.items():
+        dates, revenue = downsample(dates, revenue, max_points, sampling)
         fig.add_trace(
             go.Scatter(
-                x=city_data["date"],
-                y=city_data["daily_revenue"],
+                x=dates,
+                y=revenue,
                 mode="lines",
                 name=city,
             ),
@@ -176,37 +195,31 @@ def create_realistic_dashboard():
         col=1,
     )
 
-    # 6. Key Metrics Table
-    total_revenue = payment_data["total_revenue"].sum()
-    total_transactions = payment_data["transaction_count"].sum()
-    cash_percentage = 0
-    for _, row in payment_data.iterrows():
-        if row["payment_method"] == "Cash":
-            cash_percentage = float(row["revenue_percentage"])
-            break
-
+    # 6. Key Metrics Table, with the sample's estimates in approximate mode
+    names = [
+        "Total Revenue",
+        "Total Transactions",
+        "Cash Revenue %",
+        "Cities",
+        "Product Categories",
+    ]
+    values = [
+        f"${metrics.total_revenue:,.0f}",
+        f"{metrics.total_transactions:,}",
+        f"{metrics.cash_percentage}%",
+        str(metrics.city_count),
+        str(len(category_data)),
+    ]
+    for name, text in format_estimates(metrics.estimates or {}).items():
+        names.append(name)
+        values.append(text)
     fig.add_trace(
         go.Table(
             header=dict(
                 values=["Metric", "Value"], fill_color="lightgray", align="left"
             ),
             cells=dict(
-                values=[
-                    [
-                        "Total Revenue",
-                        "Total Transactions",
-                        "Cash Revenue %",
-                        "Cities",
-                        "Product Categories",
-                    ],
-                    [
-                        f"${total_revenue:,.0f}",
-                        f"{total_transactions:,}",
-                        f"{cash_percentage}%",
-                        "3",
-                        str(len(category_data)),
-                    ],
-                ],
+                values=[names, values],
                 fill_color="white",
                 align="left",
             ),
@@ -215,27 +228,47 @@ def create_realistic_dashboard():
         col=2,
     )
 
+    # 7. Customer Segments, stacked by each segment's category spend share
+    if customers is not None:
+        labels = [
+            f"{row.segment}<br>{row.customers:,} customers · "
+            f"{row.avg_visits:.1f} visits · ${row.avg_spend:,.0f}"
+            for row in customers.itertuples()
+        ]
+        for category in customers.columns[len(CUSTOMER_SUMMARY_COLUMNS) :]:
+            fig.add_trace(
+                go.Bar(x=labels, y=customers[category], name=category),
+                row=4,
+                col=1,
+            )
+        fig.update_layout(barmode="stack")
+
     # Update layout
-    fig.update_layout(
-        height=1200, title_text="Supermarket Sales Dashboard", showlegend=True
-    )
+    fig.update_layout(height=400 * len(specs), title_text=title, showlegend=True)
 
-    # Save dashboard
-    fig.write_html("dashboard/realistic_supermarket_dashboard.html")
-    print("Realistic dashboard saved to dashboard/realistic_supermarket_dashboard.html")
+    return fig
 
-    # Generate insights
-    generate_realistic_insights(
-        payment_data, rating_data, category_data, total_revenue, cash_percentage
-    )
 
-    return fig
+def format_estimates(estimates):
+    """``{label: "value ± bound"}`` of approximate-mode estimates"""
+    texts = {}
+    for name, (value, bound) in estimates.items():
+        unit = "$" if "Revenue" in name else ""
+        texts[f"{name} (est.)"] = f"{unit}{value:,.0f} ± {unit}{bound:,.0f}"
+    return texts
 
 
-def generate_realistic_insights(
-    payment_data, rating_data, category_data, total_revenue, cash_percentage
-):
-    """Generate realistic business insights"""
+def generate_realistic_insights(metrics, label="All data"):
+    """Generate realistic business insights for the slice named ``label``"""
+    if not metrics.total_transactions:
+        print(f"\nNo sales match {label}; no insights to report")
+        return
+
+    payment_data = metrics.payment
+    rating_data = metrics.rating
+    category_data = metrics.category
+    total_revenue = metrics.total_revenue
+    cash_percentage = metrics.cash_percentage
 
     print("\n" + "=" * 50)
     print("SUPERMARKET SALES DASHBOARD INSIGHTS")
@@ -244,6 +277,8 @@ def generate_realistic_insights(
     print(f"\n📊 OVERALL PERFORMANCE:")
     print(f"   • Total Revenue: ${total_revenue:,.2f}")
     print(f"   • Cash Revenue: {cash_percentage}% of total")
+    for name, text in format_estimates(metrics.estimates or {}).items():
+        print(f"   • {name}: {text} (95%)")
 
     print(f"\n💳 PAYMENT METHOD ANALYSIS:")
     for _, row in payment_data.iterrows():
@@ -261,32 +296,122 @@ def generate_realistic_insights(
             f"   • {row['category']}: ${row['total_revenue']:,.0f} (Avg Rating: {row['avg_rating']:.1f})"
         )
 
+    if metrics.customers is not None:
+        print(f"\n👥 CUSTOMER SEGMENTS:")
+        categories = metrics.customers.columns[len(CUSTOMER_SUMMARY_COLUMNS) :]
+        for _, row in metrics.customers.iterrows():
+            print(
+                f"   • {row['segment']}: {row['customers']:,} customers, "
+                f"{row['avg_visits']:.1f} visits, ${row['avg_spend']:,.0f} avg spend "
+                f"(top category: {row[categories].astype(float).idxmax()})"
+            )
+
     print(f"\n🔍 KEY FINDINGS:")
     print(f"   • Cash transactions contribute {cash_percentage}% of gross income")
     if cash_percentage >= 50:
         print(f"   ✓ Cash is the primary revenue source as expected")
 
-    high_rating_revenue = rating_data[
-        rating_data["rating_category"].str.contains("High", na=False)
-    ]["total_revenue"].sum()
+    # A category filter can leave baskets without any matching line items
     total_rating_revenue = rating_data["total_revenue"].sum()
-    high_rating_percentage = (high_rating_revenue / total_rating_revenue) * 100
+    if total_rating_revenue:
+        high_rating_revenue = rating_data[
+            rating_data["rating_category"].str.contains("High", na=False)
+        ]["total_revenue"].sum()
+        high_rating_percentage = (high_rating_revenue / total_rating_revenue) * 100
 
-    print(
-        f"   • High-rated products (4.5+) generate {high_rating_percentage:.1f}% of revenue"
-    )
-    if high_rating_percentage >= 20:
-        print(f"   ✓ Top-rated items achieve higher sales volume as expected")
+        print(
+            f"   • High-rated products (4.5+) generate {high_rating_percentage:.1f}% of revenue"
+        )
+        if high_rating_percentage >= 20:
+            print(f"   ✓ Top-rated items achieve higher sales volume as expected")
 
     print("\n" + "=" * 50)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the sales dashboard")
+    parser.add_argument(
+        "--source",
+        choices=["db", "csv", "parquet"],
+        default="db",
+        help="query database/supermarket.db, data/*.csv or the data/parquet datasets",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["sqlite", "duckdb"],
+        default="sqlite",
+        help="query engine; duckdb scans any source vectorized on all cores",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES),
+        help="performance profile for database connections (default: balanced)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="always query the database instead of reusing cached results",
+    )
+    parser.add_argument(
+        "--max-points",
+        type=int,
+        default=DEFAULT_MAX_POINTS,
+        help="most points plotted per city trend series",
+    )
+    parser.add_argument(
+        "--downsample",
+        choices=METHODS,
+        default="lttb",
+        help="how long city trends are thinned to --max-points",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="share dashboard/plotly.min.js instead of inlining plotly.js",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="write a gzipped .html.gz for serving instead of plain HTML",
+    )
+    parser.add_argument(
+        "--approximate",
+        action="store_true",
+        help="read line items from the stored sample and show 95%% error bounds",
+    )
+    add_filter_arguments(parser)
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    check_date_range(parser, args)
+    filters = filters_from_args(args)
+    if args.backend == "sqlite" and args.source == "csv":
+        parser.error("--source csv needs --backend duckdb")
+    if args.backend == "sqlite" and args.source == "parquet":
+        if filters != DashboardFilters():
+            parser.error("filters on --source parquet need --backend duckdb")
+    if args.approximate and args.source != "db":
+        parser.error("--approximate needs --source db")
+    if args.profile:
+        set_profile(args.profile)
+    enable_tracing_from_args(args)
+
     # Create dashboard directory if it doesn't exist
     os.makedirs("dashboard", exist_ok=True)
 
     # Generate dashboard
-    fig = create_realistic_dashboard()
+    fig = create_realistic_dashboard(
+        args.source,
+        use_cache=not args.no_cache,
+        backend=args.backend,
+        max_points=args.max_points,
+        sampling=args.downsample,
+        compact=args.compact,
+        compress=args.gzip,
+        filters=filters,
+        approximate=args.approximate,
+    )
+    if args.gzip:
+        sys.exit()
 
     # Open in browser
     dashboard_path = os.path.abspath("dashboard/realistic_supermarket_dashboard.html")
@@ -0,0 +1,83 @@
+import numpy as np
+
+DEFAULT_MAX_POINTS = 2000
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points
+
+    The first and last points are always kept. The points in between are
+    split into ``threshold - 2`` buckets, and each bucket keeps the point
+    forming the largest triangle with the previously kept point and the
+    average of the next bucket, which preserves the visual shape of the
+    line including its peaks and troughs.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def min_max(y, threshold):
+    """Min/max bucketing: indices of at most ``threshold`` points
+
+    Keeps the first and last points plus the lowest and highest point of
+    each of ``(threshold - 2) // 2`` equal-width buckets, in their
+    original order, so every extreme of the series survives.
+    """
+    n = len(y)
+    buckets = (threshold - 2) // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    keep = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        keep.append(start + np.argmin(y[start:end]))
+        keep.append(start + np.argmax(y[start:end]))
+    return np.unique(keep)
+
+
+METHODS = ["lttb", "minmax", "none"]
+
+
+def downsample(x, y, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    """Reduce one series to at most ``max_points`` points
+
+    Dates and times on the x axis are measured as timestamps, so uneven
+    gaps between them weigh into LTTB the way they appear on the chart.
+    """
+    if method == "none" or len(y) <= max_points:
+        return x, y
+
+    y = np.asarray(y, dtype=np.float64)
+    if method == "minmax":
+        keep = min_max(y, max_points)
+    else:
+        positions = np.asarray(x)
+        if not np.issubdtype(positions.dtype, np.number):
+            positions = positions.astype("datetime64[ns]").astype(np.int64)
+        keep = lttb(positions.astype(np.float64), y, max_points)
+    return np.asarray(x)[keep], y[keep]
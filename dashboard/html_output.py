@@ -0,0 +1,47 @@
+import plotly.offline
+import gzip
+import os
+import time
+
+PLOTLY_BUNDLE = "plotly.min.js"
+
+
+def ensure_plotly_bundle(directory):
+    """Write the shared plotly.js bundle into ``directory`` once"""
+    bundle = os.path.join(directory, PLOTLY_BUNDLE)
+    if not os.path.exists(bundle):
+        with open(bundle, "w", encoding="utf-8") as f:
+            f.write(plotly.offline.get_plotlyjs())
+    return bundle
+
+
+def write_dashboard_html(fig, path, compact=False, compress=False):
+    """Write a figure to HTML and report its size and write time
+
+    The default output is self-contained, with plotly.js inlined. With
+    ``compact`` the page references one ``plotly.min.js`` shared by every
+    dashboard in the same directory, and numeric arrays are embedded as
+    base64 typed arrays rather than JSON number lists. ``compress`` writes
+    ``path + ".gz"`` instead, ready to serve with ``Content-Encoding: gzip``.
+    Returns the path written.
+    """
+    start = time.perf_counter()
+
+    if compact:
+        ensure_plotly_bundle(os.path.dirname(path) or ".")
+        html = fig.to_html(include_plotlyjs="directory")
+    else:
+        html = fig.to_html(include_plotlyjs=True)
+
+    if compress:
+        path += ".gz"
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=9) as f:
+            f.write(html)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+
+    seconds = time.perf_counter() - start
+    size = os.path.getsize(path)
+    print(f"Wrote {path}: {size / 1024:,.1f} KB in {seconds:.2f}s")
+    return path
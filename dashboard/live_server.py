@@ -0,0 +1,239 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+
+from aggregations import PASS_QUERIES, compute_metrics
+from backends import SQLiteBackend
+from db_pool import DB_PATH, ConnectionPool
+from create_realistic_dashboard import build_dashboard_figure
+from html_output import PLOTLY_BUNDLE, ensure_plotly_bundle
+
+PANELS = [
+    "payment",
+    "rating",
+    "city_trends",
+    "category",
+    "top_products",
+    "key_metrics",
+    "customers",
+]
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Supermarket Sales Dashboard (live)</title>
+<script src="plotly.min.js"></script>
+</head>
+<body>
+<div id="dashboard"></div>
+<script>
+async function load() {
+    const figure = await (await fetch("api/figure")).json();
+    Plotly.react("dashboard", figure.data, figure.layout);
+}
+load();
+new EventSource("api/events").addEventListener("refresh", load);
+</script>
+</body>
+</html>
+"""
+
+
+def panel_data(metrics, name):
+    """JSON-ready data behind one dashboard panel"""
+    if name == "city_trends":
+        return {
+            city: {"dates": dates.tolist(), "revenue": revenue.tolist()}
+            for city, (dates, revenue) in metrics.city_series.items()
+        }
+    if name == "key_metrics":
+        return {
+            "total_revenue": metrics.total_revenue,
+            "total_transactions": metrics.total_transactions,
+            "cash_percentage": metrics.cash_percentage,
+            "city_count": metrics.city_count,
+            "category_count": len(metrics.category),
+        }
+    frame = getattr(metrics, name)
+    # Databases built before the customer feature store have no segments
+    return None if frame is None else frame.to_dict(orient="list")
+
+
+def database_file(db_path=DB_PATH):
+    """Device and inode of the database file, which a full rebuild replaces"""
+    stat = os.stat(db_path)
+    return stat.st_dev, stat.st_ino
+
+
+class LiveDashboard:
+    """Serve the dashboard panels and push refreshes when the data changes
+
+    One snapshot of the metrics is shared by every viewer. A background
+    task polls the loader's ``data_versions`` and rebuilds the snapshot only
+    when a load has landed, then notifies each browser over server-sent
+    events. Queries and figure building run on a thread pool against a
+    pool of read-only connections, so the event loop never blocks on them.
+    The pool is reopened when a full rebuild replaces the database file.
+    """
+
+    def __init__(self, readers=4, poll_seconds=2.0):
+        self.readers = readers
+        self.pool = None
+        self.open_pool()
+        self.executor = ThreadPoolExecutor(readers)
+        self.poll_seconds = poll_seconds
+        self.version = None
+        self.metrics = None
+        self.figure_json = None
+        self.subscribers = set()
+
+    def open_pool(self):
+        """Open the pooled readers on the current database file
+
+        Readers opened before a rebuild keep reading the replaced file,
+        which is unlinked but stays alive while they hold it, so they
+        would never see the new data.
+        """
+        if self.pool:
+            self.pool.close()
+        self.database = database_file()
+        self.pool = ConnectionPool(
+            self.readers,
+            lambda: SQLiteBackend(read_only=True, check_same_thread=False),
+        )
+
+    async def run_query(self, function, *args):
+        """Run ``function(backend, *args)`` on a pooled connection off-loop"""
+
+        def call():
+            with self.pool.connection() as backend:
+                return function(backend, *args)
+
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    async def refresh(self):
+        """Rebuild the snapshot if the data version moved; True if it did"""
+        # Only refresh() uses the pool, so no query holds a reader here
+        if database_file() != self.database:
+            self.open_pool()
+            self.version = None
+        rollups = " ".join(PASS_QUERIES.values())
+        version = await self.run_query(lambda backend: backend.fingerprint(rollups))
+        if version == self.version:
+            return False
+
+        start = time.perf_counter()
+        metrics = await self.run_query(compute_metrics)
+        figure_json = await asyncio.get_running_loop().run_in_executor(
+            self.executor, lambda: build_dashboard_figure(metrics).to_json()
+        )
+        self.version, self.metrics, self.figure_json = version, metrics, figure_json
+        print(f"Dashboard refreshed in {time.perf_counter() - start:.2f}s")
+
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(version)
+        return True
+
+    async def watch(self, app):
+        """Background task polling for new data"""
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Refresh failed: {e}")
+
+    async def page(self, request):
+        return web.Response(text=PAGE, content_type="text/html")
+
+    async def plotly_bundle(self, request):
+        return web.FileResponse(self.bundle)
+
+    async def figure(self, request):
+        return web.Response(text=self.figure_json, content_type="application/json")
+
+    async def panels(self, request):
+        return web.json_response(
+            {name: panel_data(self.metrics, name) for name in PANELS}
+        )
+
+    async def panel(self, request):
+        name = request.match_info["name"]
+        if name not in PANELS:
+            raise web.HTTPNotFound(text=f"Unknown panel {name}")
+        return web.json_response(panel_data(self.metrics, name))
+
+    async def events(self, request):
+        """Server-sent events stream with one ``refresh`` per new load"""
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        subscriber = asyncio.Queue()
+        self.subscribers.add(subscriber)
+        try:
+            while True:
+                try:
+                    version = await asyncio.wait_for(subscriber.get(), timeout=15)
+                    message = f"event: refresh\ndata: {json.dumps(version)}\n\n"
+                except asyncio.TimeoutError:
+                    message = ": keep-alive\n\n"
+                await response.write(message.encode())
+        except ConnectionResetError:
+            pass  # browser went away
+        finally:
+            self.subscribers.discard(subscriber)
+        return response
+
+    async def start(self, app):
+        self.bundle = ensure_plotly_bundle("dashboard")
+        await self.refresh()
+        app["watcher"] = asyncio.create_task(self.watch(app))
+
+    async def stop(self, app):
+        app["watcher"].cancel()
+        self.executor.shutdown()
+        self.pool.close()
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/", self.page)
+        app.router.add_get(f"/{PLOTLY_BUNDLE}", self.plotly_bundle)
+        app.router.add_get("/api/figure", self.figure)
+        app.router.add_get("/api/panels", self.panels)
+        app.router.add_get("/api/panels/{name}", self.panel)
+        app.router.add_get("/api/events", self.events)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the live sales dashboard")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind")
+    parser.add_argument("--port", type=int, default=8050, help="port to listen on")
+    parser.add_argument(
+        "--readers", type=int, default=4, help="pooled read-only connections"
+    )
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=2.0,
+        help="seconds between checks for newly loaded data",
+    )
+    args = parser.parse_args()
+
+    web.run_app(
+        LiveDashboard(args.readers, args.poll).app(), host=args.host, port=args.port
+    )
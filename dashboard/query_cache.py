@@ -0,0 +1,101 @@
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+from contextlib import suppress
+
+CACHE_DIR = ".cache/queries"
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so formatting changes don't miss the cache"""
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+class QueryCache:
+    """Persistent on-disk cache of query results with LRU eviction
+
+    Entries are keyed by the backend, the normalized SQL, its parameters
+    and the backend's fingerprint of the data the query reads: the
+    versions of its tables (kept by the loader in ``data_versions``), or
+    the size and mtime of the files it scans. A load therefore invalidates
+    exactly the entries that read a table it changed. Recency is tracked
+    through file mtimes, and the least recently used entries are evicted
+    once the cache grows past ``max_bytes``. Entries are written to a
+    temporary file and renamed into place, so readers never see a partial
+    one; an entry that still fails to unpickle counts as a miss. Several
+    processes may share the directory, so entries can vanish at any time.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def read_columns(self, sql, backend, params=()):
+        """``backend.read_columns`` that serves repeated queries from disk"""
+        path = os.path.join(self.cache_dir, self.key(sql, backend, params) + ".pkl")
+
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception:
+            # Truncated or foreign files fail in many ways: EOFError,
+            # UnpicklingError, but also AttributeError, ImportError, ...
+            with suppress(FileNotFoundError):
+                os.remove(path)
+        else:
+            self.hits += 1
+            with suppress(FileNotFoundError):
+                os.utime(path)
+            return result
+
+        self.misses += 1
+        result = backend.read_columns(sql, params)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+        return result
+
+    def key(self, sql, backend, params=()):
+        """Cache key for a query against the current state of the data"""
+        sql = normalize_sql(sql)
+        digest = hashlib.sha256(f"{backend.name}:{sql}".encode())
+        digest.update(repr(tuple(params)).encode())
+        digest.update(backend.fingerprint(sql).encode())
+        return digest.hexdigest()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its cap"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                with suppress(FileNotFoundError):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            total -= size
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+    def clear(self):
+        """Remove every cached result, and temporary files of failed writes"""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith((".pkl", ".tmp")):
+                with suppress(FileNotFoundError):
+                    os.remove(entry.path)
@@ -0,0 +1,171 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import astuple
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+
+from aggregations import DashboardFilters, check_date_range, compute_metrics
+from backends import SQLiteBackend
+from create_realistic_dashboard import build_dashboard_figure
+from html_output import ensure_plotly_bundle, write_dashboard_html
+
+OUTPUT_DIR = "dashboard/farm"
+
+# Read-only connection owned by each worker process
+_backend = None
+
+
+def list_scopes(by="store", date_from=None, date_to=None):
+    """One scope per store or per city in the store dimension"""
+    backend = SQLiteBackend(read_only=True)
+    rows = backend.conn.execute(
+        "SELECT city, store FROM dim_store ORDER BY city, store"
+    ).fetchall()
+    backend.close()
+
+    if by == "city":
+        cities = sorted({city for city, _ in rows})
+        return [DashboardFilters((city,), (), date_from, date_to) for city in cities]
+    return [
+        DashboardFilters((city,), (store,), date_from, date_to) for city, store in rows
+    ]
+
+
+def load_scopes(path):
+    """Read scopes from a JSON list of ``DashboardFilters`` fields"""
+    with open(path) as f:
+        return [
+            DashboardFilters(
+                tuple(scope.get("cities", ())),
+                tuple(scope.get("stores", ())),
+                scope.get("date_from"),
+                scope.get("date_to"),
+                tuple(scope.get("payment_methods", ())),
+                tuple(scope.get("categories", ())),
+            )
+            for scope in json.load(f)
+        ]
+
+
+def scope_slug(scope):
+    """File name stem for a scope's dashboard
+
+    Labels leave out some filters and lose case and punctuation here, so
+    a short hash of every field keeps distinct scopes in distinct files.
+    """
+    digest = hashlib.sha256(repr(astuple(scope)).encode()).hexdigest()[:8]
+    label = re.sub(r"[^a-z0-9]+", "-", scope.label.lower()).strip("-")
+    return f"{label}-{digest}"
+
+
+def _open_worker_connection():
+    global _backend
+    _backend = SQLiteBackend(read_only=True)
+
+
+def render_scope(scope, output_dir=OUTPUT_DIR):
+    """Query, build and write the dashboard for one scope; a scope without
+    sales gets no dashboard, and None for its path"""
+    metrics = compute_metrics(_backend, filters=scope)
+    if not metrics.total_transactions:
+        return scope.label, None, 0.0, 0
+    fig = build_dashboard_figure(metrics, title=f"Supermarket Sales · {scope.label}")
+    path = os.path.join(output_dir, scope_slug(scope) + ".html")
+    write_dashboard_html(fig, path, compact=True)
+    return scope.label, path, metrics.total_revenue, metrics.total_transactions
+
+
+def write_index(results, output_dir=OUTPUT_DIR):
+    """Write an index page linking every rendered dashboard, and listing
+    the scopes without sales"""
+    rows = "\n".join(
+        (
+            f'<tr><td><a href="{html.escape(os.path.basename(path))}">'
+            f"{html.escape(label)}</a></td><td>${revenue:,.0f}</td>"
+            f"<td>{transactions:,}</td></tr>"
+            if path
+            else f"<tr><td>{html.escape(label)}</td><td colspan='2'>no sales</td></tr>"
+        )
+        for label, path, revenue, transactions in results
+    )
+    path = os.path.join(output_dir, "index.html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "<!DOCTYPE html>\n<html><head><meta charset='utf-8'>"
+            "<title>Supermarket Dashboards</title></head><body>\n"
+            "<h1>Supermarket Dashboards</h1>\n<table>\n"
+            "<tr><th>Scope</th><th>Revenue</th><th>Transactions</th></tr>\n"
+            f"{rows}\n</table>\n</body></html>\n"
+        )
+    return path
+
+
+def render_farm(scopes, workers=None, output_dir=OUTPUT_DIR):
+    """Render one dashboard per scope in a process pool, plus an index
+
+    Every worker opens its own read-only connection once and reuses it for
+    all of its scopes. Dashboards share one plotly.js in ``output_dir``.
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+
+    # Written once up front so workers never race to create it
+    ensure_plotly_bundle(output_dir)
+
+    with ProcessPoolExecutor(workers, initializer=_open_worker_connection) as pool:
+        results = list(
+            pool.map(render_scope, scopes, [output_dir] * len(scopes), chunksize=1)
+        )
+
+    index = write_index(results, output_dir)
+    seconds = time.perf_counter() - start
+    rendered = 0
+    for label, path, _, _ in results:
+        if path:
+            rendered += 1
+        else:
+            print(f"No sales match {label}; no dashboard written")
+    print(
+        f"Rendered {rendered} dashboards with {workers} workers in "
+        f"{seconds:.2f}s ({len(results) / seconds:.1f}/s), index at {index}"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render one dashboard per store, city or custom scope"
+    )
+    parser.add_argument(
+        "--by",
+        choices=["store", "city"],
+        default="store",
+        help="render one dashboard per store or per city",
+    )
+    parser.add_argument(
+        "--scopes", help="JSON file listing scopes instead of --by (see README)"
+    )
+    parser.add_argument("--since", help="first date (YYYY-MM-DD) of every scope")
+    parser.add_argument("--until", help="last date (YYYY-MM-DD) of every scope")
+    parser.add_argument(
+        "--workers", type=int, help="worker processes (default: all cores)"
+    )
+    parser.add_argument("--out", default=OUTPUT_DIR, help="output directory")
+    args = parser.parse_args()
+    check_date_range(parser, args)
+
+    if args.scopes:
+        scopes = load_scopes(args.scopes)
+    else:
+        scopes = list_scopes(args.by, args.since, args.until)
+    render_farm(scopes, args.workers, args.out)
@@ -0,0 +1,204 @@
+import time
+
+import numpy as np
+
+from data_versions import bump_data_versions
+from partitions import live_partitions, partition_months, route
+from rollups import RATING_KEY_SQL
+from sketches import grouped_registers, to_blob
+from star_schema import FACT_TABLES
+
+# Line items kept per (city, category) stratum when a stratum is first
+# sampled. Small strata are kept whole; later batches are sampled at the
+# stratum's first rate, until a full rebuild resizes the sample.
+SAMPLE_ROWS_PER_STRATUM = 2_000
+
+# Line hashes are computed mod the prime 2**31 - 1, so every product
+# stays within SQLite's 64-bit integers
+HASH_PRIME = 2**31 - 1
+HASH_SEED = (1103515245, 1640531513, 12345)
+HASH_ROUNDS = (2654435, 40503)
+
+APPROXIMATE_TABLES = {
+    "sample_strata": """
+        CREATE TABLE IF NOT EXISTS sample_strata (
+            city TEXT,
+            category TEXT,
+            probability REAL,
+            PRIMARY KEY (city, category)
+        )
+    """,
+    # Sampled line items with their transaction's keys, so dashboard
+    # filters apply unchanged. weight is 1 / inclusion probability.
+    "sample_items": """
+        CREATE TABLE IF NOT EXISTS sample_items (
+            date_key INTEGER,
+            transaction_key INTEGER,
+            line INTEGER,
+            store_key INTEGER,
+            payment_key INTEGER,
+            product_key INTEGER,
+            quantity INTEGER,
+            item_total REAL,
+            rating REAL,
+            rating_key INTEGER,
+            weight REAL,
+            PRIMARY KEY (date_key, transaction_key, line)
+        ) WITHOUT ROWID
+    """,
+    # HyperLogLog sketch of the customers of each store and day
+    "customer_sketches": """
+        CREATE TABLE IF NOT EXISTS customer_sketches (
+            date_key INTEGER,
+            store_key INTEGER,
+            registers BLOB,
+            PRIMARY KEY (date_key, store_key)
+        ) WITHOUT ROWID
+    """,
+}
+
+# Sampling probability of every stratum not sampled yet, from the item
+# rollup of the days in {where}
+STRATA_SQL = f"""
+    INSERT OR IGNORE INTO sample_strata (city, category, probability)
+    SELECT
+        s.city,
+        p.category,
+        MIN(1.0, {SAMPLE_ROWS_PER_STRATUM} * 1.0 / SUM(r.line_count))
+    FROM daily_item_rollup r
+    JOIN dim_store s ON s.store_key = r.store_key
+    JOIN dim_product p ON p.product_key = r.product_key
+    {{where}}
+    GROUP BY s.city, p.category
+"""
+
+
+def line_hash_sql(transaction_key, line):
+    """SQL expression for a deterministic, uniform hash of a line item in
+    [0, 1)
+
+    A line is sampled when its hash falls below its stratum's probability,
+    so reloading a day selects the same lines again. The key and line are
+    mixed into an affine residue, then squared twice mod the prime, so
+    sequential keys show no pattern. Integer SQL runs inside the scan,
+    several times faster than a Python function called per row. SQLite
+    has no XOR and turns overflowing products into REAL, so splitmix64
+    is not an option.
+    """
+    a, b, c = HASH_SEED
+    h = (
+        f"((({transaction_key}) % {HASH_PRIME}) * {a} + ({line}) * {b} + {c})"
+        f" % {HASH_PRIME}"
+    )
+    for constant in HASH_ROUNDS:
+        h = f"(({h}) * ({h}) + {constant}) % {HASH_PRIME}"
+    return f"({h}) * 1.0 / {HASH_PRIME}"
+
+
+SAMPLE_SELECT = f"""
+    SELECT
+        t.date_key,
+        i.transaction_key,
+        i.line,
+        t.store_key,
+        t.payment_key,
+        i.product_key,
+        i.quantity,
+        i.item_total,
+        i.rating,
+        {RATING_KEY_SQL},
+        1.0 / st.probability
+    FROM fact_transaction_items i
+    JOIN fact_transactions t ON t.transaction_key = i.transaction_key
+    JOIN dim_store s ON s.store_key = t.store_key
+    JOIN dim_product p ON p.product_key = i.product_key
+    JOIN sample_strata st ON st.city = s.city AND st.category = p.category
+    WHERE {line_hash_sql("i.transaction_key", "i.line")} < st.probability
+    {{where}}
+"""
+
+
+def _prepare(conn):
+    """Create the sample and sketch tables"""
+    for ddl in APPROXIMATE_TABLES.values():
+        conn.execute(ddl)
+
+
+def _fill_month(conn, month, days=None):
+    """Resample one month's line items and re-sketch its customers, or
+    only those of the days of that month listed in the ``days`` table"""
+    days_filter = f"date_key IN (SELECT date_key FROM {days})" if days else "true"
+    month_range = (month * 100, month * 100 + 99)
+    facts = [(fact, m) for fact, m in live_partitions(conn) if fact in FACT_TABLES]
+
+    conn.execute(
+        f"DELETE FROM sample_items WHERE date_key BETWEEN ? AND ? AND {days_filter}",
+        month_range,
+    )
+    select = SAMPLE_SELECT.format(where=f"AND t.{days_filter}" if days else "")
+    conn.execute(f"INSERT INTO sample_items {route(select, facts, (month, month))}")
+
+    conn.execute(
+        "DELETE FROM customer_sketches "
+        f"WHERE date_key BETWEEN ? AND ? AND {days_filter}",
+        month_range,
+    )
+    rows = conn.execute(
+        route(
+            "SELECT date_key, store_key, customer_key FROM fact_transactions "
+            f"WHERE {days_filter}",
+            facts,
+            (month, month),
+        )
+    ).fetchall()
+    if not rows:
+        return
+    rows = np.array(rows, dtype=np.int64)
+    groups, group_of_row = np.unique(
+        rows[:, 0] * 2**20 + rows[:, 1], return_inverse=True
+    )
+    registers = grouped_registers(group_of_row, rows[:, 2], len(groups))
+    conn.executemany(
+        "INSERT INTO customer_sketches VALUES (?, ?, ?)",
+        [
+            (int(group >> 20), int(group & (2**20 - 1)), to_blob(row))
+            for group, row in zip(groups, registers)
+        ],
+    )
+
+
+def build_approximate(conn):
+    """Rebuild the line-item sample and the customer sketches of every
+    month whose facts are in the database; run after the rollups"""
+    start = time.perf_counter()
+    _prepare(conn)
+    conn.execute(STRATA_SQL.format(where=""))
+    for month in partition_months(conn, "fact_transactions"):
+        _fill_month(conn, month)
+    bump_data_versions(conn, list(APPROXIMATE_TABLES))
+    conn.commit()
+    print(f"Samples and sketches built in {time.perf_counter() - start:.2f}s")
+
+
+def refresh_approximate(conn, dates_table):
+    """Resample and re-sketch the days listed in ``dates_table``
+
+    Strata seen for the first time get their probability from these days'
+    rollups; existing strata keep theirs. Run after the rollups are
+    refreshed. The caller commits.
+    """
+    _prepare(conn)
+    conn.execute(
+        STRATA_SQL.format(
+            where=f"WHERE r.date_key IN (SELECT date_key FROM {dates_table})"
+        )
+    )
+    months = [
+        month
+        for (month,) in conn.execute(
+            f"SELECT DISTINCT date_key / 100 FROM {dates_table}"
+        ).fetchall()
+    ]
+    for month in months:
+        _fill_month(conn, month, dates_table)
+    bump_data_versions(conn, list(APPROXIMATE_TABLES))
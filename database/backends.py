@@ -0,0 +1,338 @@
+import pandas as pd
+import numpy as np
+import glob
+import os
+import re
+import sqlite3
+
+from db_pool import DB_PATH, connect_reader, connect_writer
+from partitions import live_partitions, month_range, route, table_columns
+from customer_features import (
+    CUSTOMER_FEATURE_SELECTS,
+    CUSTOMER_FEATURE_TABLES,
+    CUSTOMER_MONTH_SELECTS,
+    CUSTOMER_MONTH_TABLES,
+)
+from rollups import ROLLUP_SELECTS, ROLLUP_TABLES
+from star_schema import RATING_BANDS, TRANSACTION_PREFIX
+
+# Tables the dashboard and reports read. A database without them was built
+# by an older setup script, such as the copy in a fresh checkout.
+DASHBOARD_TABLES = ["fact_transactions", *ROLLUP_TABLES, *CUSTOMER_FEATURE_TABLES]
+
+# Fact table readers for DuckDB, by source. Parquet partition keys are
+# kept as strings so dates compare the same way they do in SQLite.
+DUCKDB_READERS = {
+    "csv": "read_csv('data/{table}.csv')",
+    "parquet": (
+        "read_parquet('data/parquet/{table}/**/*.parquet', "
+        "hive_partitioning = true, hive_types_autocast = false)"
+    ),
+}
+
+# Fact table views with the column types of the SQLite schema
+DUCKDB_FACT_VIEWS = {
+    "transactions": """
+        SELECT
+            transaction_id,
+            CAST(date AS VARCHAR) as date,
+            CAST(time AS VARCHAR) as time,
+            city,
+            store,
+            customer_id,
+            payment_method,
+            CAST(num_items AS INTEGER) as num_items,
+            subtotal,
+            tax,
+            gross_income
+        FROM {reader}
+    """,
+    "transaction_items": """
+        SELECT
+            transaction_id,
+            product,
+            category,
+            CAST(quantity AS INTEGER) as quantity,
+            unit_price,
+            item_total,
+            ROUND(CAST(rating AS DOUBLE), 1) as rating
+        FROM {reader}
+    """,
+}
+
+
+# The star schema derived from the fact views. Dimensions are small, so
+# they are materialized once per connection; the fact tables stay views
+# and read the files on every query.
+_KEY_OFFSET = len(TRANSACTION_PREFIX) + 1
+DUCKDB_DIMENSIONS = {
+    "dim_date": """
+        SELECT
+            CAST(REPLACE(date, '-', '') AS INTEGER) as date_key,
+            date,
+            CAST(SUBSTR(date, 1, 4) AS INTEGER) as year,
+            CAST(SUBSTR(date, 6, 2) AS INTEGER) as month,
+            CAST(SUBSTR(date, 9, 2) AS INTEGER) as day,
+            isodow(CAST(date AS DATE)) as weekday
+        FROM (SELECT DISTINCT date FROM transactions)
+    """,
+    "dim_store": """
+        SELECT ROW_NUMBER() OVER (ORDER BY city, store) as store_key, city, store
+        FROM (SELECT DISTINCT city, store FROM transactions)
+    """,
+    "dim_payment": """
+        SELECT ROW_NUMBER() OVER (ORDER BY payment_method) as payment_key, payment_method
+        FROM (SELECT DISTINCT payment_method FROM transactions)
+    """,
+    "dim_customer": """
+        SELECT ROW_NUMBER() OVER (ORDER BY customer_id) as customer_key, customer_id
+        FROM (SELECT DISTINCT customer_id FROM transactions)
+    """,
+    "dim_product": """
+        SELECT
+            ROW_NUMBER() OVER (ORDER BY category, product) as product_key,
+            product,
+            category
+        FROM (SELECT DISTINCT product, category FROM transaction_items)
+    """,
+    "dim_rating": "SELECT * FROM (VALUES {bands}) bands (rating_key, rating_category)",
+}
+DUCKDB_STAR_FACT_VIEWS = {
+    "fact_transactions": f"""
+        SELECT
+            CAST(SUBSTR(t.transaction_id, {_KEY_OFFSET}) AS BIGINT) as transaction_key,
+            CAST(REPLACE(t.date, '-', '') AS INTEGER) as date_key,
+            t.time,
+            s.store_key,
+            c.customer_key,
+            p.payment_key,
+            t.num_items,
+            t.subtotal,
+            t.tax,
+            t.gross_income
+        FROM transactions t
+        JOIN dim_store s ON s.city = t.city AND s.store = t.store
+        JOIN dim_customer c ON c.customer_id = t.customer_id
+        JOIN dim_payment p ON p.payment_method = t.payment_method
+    """,
+    "fact_transaction_items": f"""
+        SELECT
+            CAST(SUBSTR(i.transaction_id, {_KEY_OFFSET}) AS BIGINT) as transaction_key,
+            p.product_key,
+            i.quantity,
+            i.unit_price,
+            i.item_total,
+            i.rating
+        FROM transaction_items i
+        JOIN dim_product p ON p.product = i.product AND p.category = i.category
+    """,
+}
+
+
+def check_database(db_path=DB_PATH):
+    """Raise with the setup command if the database is missing or lacks
+    the dashboard's tables"""
+    setup = "create it with python database/setup_realistic_database.py"
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"{db_path} does not exist; {setup}")
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    names = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+    conn.close()
+    missing = [table for table in DASHBOARD_TABLES if table not in names]
+    if missing:
+        raise ValueError(
+            f"{db_path} was built by an older setup script and has no "
+            f"{', '.join(missing)}; re{setup}"
+        )
+
+
+def version_fingerprint(sql, versions):
+    """Versions of the tables a query mentions, from ``data_versions`` rows"""
+    return ";".join(
+        f"{table}={version}"
+        for table, version in sorted(versions)
+        if re.search(rf"\b{table}\b", sql)
+    )
+
+
+def file_fingerprint(paths):
+    """Size and mtime of every file a query may read"""
+    stats = [os.stat(path) for path in sorted(paths)]
+    return ";".join(f"{stat.st_size}:{stat.st_mtime_ns}" for stat in stats)
+
+
+class SQLiteBackend:
+    """Row-store queries against the SQLite database"""
+
+    name = "sqlite"
+
+    def __init__(self, db_path=DB_PATH, read_only=False, check_same_thread=True):
+        self.db_path = db_path
+        if read_only:
+            check_database(db_path)
+            self.conn = connect_reader(db_path, check_same_thread)
+        else:
+            self.conn = connect_writer(db_path)
+
+    def read_sql(self, sql, params=()):
+        """Run a query and return the result as a DataFrame"""
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def read_columns(self, sql, params=()):
+        """Run a query and return one NumPy array per result column
+
+        BLOB columns come back as object arrays of ``bytes``: NumPy's
+        fixed-width bytes dtype drops trailing NUL bytes, which would
+        corrupt compressed sketches.
+        """
+        cursor = self.conn.execute(sql, params)
+        names = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        columns = zip(*rows) if rows else [()] * len(names)
+        return {
+            name: np.array(
+                values,
+                dtype=object if values and isinstance(values[0], bytes) else None,
+            )
+            for name, values in zip(names, columns)
+        }
+
+    def route(self, sql, date_from=None, date_to=None):
+        """Restrict a query's partitioned tables to the months of a date range"""
+        if not (date_from or date_to):
+            return sql
+        try:
+            partitions = live_partitions(self.conn)
+        except sqlite3.OperationalError:
+            return sql
+        return route(sql, partitions, month_range(date_from, date_to))
+
+    def fingerprint(self, sql):
+        """Data versions of the tables a query reads"""
+        try:
+            versions = self.conn.execute(
+                "SELECT table_name, version FROM data_versions"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return file_fingerprint([self.db_path])
+        return version_fingerprint(sql, versions)
+
+    def close(self):
+        self.conn.close()
+
+
+class DuckDBBackend:
+    """Vectorized, multi-core queries through an embedded DuckDB
+
+    ``source="db"`` attaches the SQLite database read-only and queries its
+    tables in place. ``"csv"`` and ``"parquet"`` expose the generated data
+    files as ``transactions`` and ``transaction_items`` views and derive
+    the star schema and the rollup tables from them, so the same SQL runs
+    against every source without a load step.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, source="db", db_path=DB_PATH):
+        import duckdb
+
+        self.source = source
+        self.db_path = db_path
+        self.error = duckdb.Error
+        self.conn = duckdb.connect()
+
+        if source == "db":
+            check_database(db_path)
+            self.conn.execute(f"ATTACH '{db_path}' AS db (TYPE sqlite, READ_ONLY)")
+            self.conn.execute("USE db")
+            return
+
+        reader = DUCKDB_READERS[source]
+        for table, view in DUCKDB_FACT_VIEWS.items():
+            self.conn.execute(
+                f"CREATE VIEW {table} AS "
+                + view.format(reader=reader.format(table=table))
+            )
+        bands = ", ".join(f"({key}, '{label}')" for key, label, _ in RATING_BANDS)
+        for table, select in DUCKDB_DIMENSIONS.items():
+            self.conn.execute(
+                f"CREATE TEMP TABLE {table} AS " + select.format(bands=bands)
+            )
+        for table, view in DUCKDB_STAR_FACT_VIEWS.items():
+            self.conn.execute(f"CREATE VIEW {table} AS " + view)
+        # DuckDB's / divides to a float, so the monthly customer views
+        # group by day; the feature views summing them are the same
+        for tables, selects in (
+            (ROLLUP_TABLES, ROLLUP_SELECTS),
+            (CUSTOMER_MONTH_TABLES, CUSTOMER_MONTH_SELECTS),
+            (CUSTOMER_FEATURE_TABLES, CUSTOMER_FEATURE_SELECTS),
+        ):
+            for table, ddl in tables.items():
+                self.conn.execute(
+                    f"CREATE VIEW {table} ({', '.join(table_columns(ddl))}) AS "
+                    + selects[table].format(where="")
+                )
+
+    def read_sql(self, sql, params=()):
+        """Run a query and return the result as a DataFrame"""
+        result = self.conn.execute(sql, list(params))
+        return self._narrow(result.description, result.df())
+
+    def read_columns(self, sql, params=()):
+        """Run a query and return one NumPy array per result column
+
+        DuckDB hands its column vectors over as arrays directly, without
+        building a Python object per cell.
+        """
+        result = self.conn.execute(sql, list(params))
+        return self._narrow(result.description, result.fetchnumpy())
+
+    @staticmethod
+    def _narrow(description, columns):
+        """Integer sums widen to HUGEINT, which NumPy receives as float64"""
+        for column, type_code, *_ in description:
+            if str(type_code) == "HUGEINT":
+                columns[column] = columns[column].astype("int64")
+        return columns
+
+    def route(self, sql, date_from=None, date_to=None):
+        """Restrict a query's partitioned tables to the months of a date
+        range; the views derived from data files are not partitioned"""
+        if self.source != "db" or not (date_from or date_to):
+            return sql
+        try:
+            partitions = live_partitions(self.conn)
+        except self.error:
+            return sql
+        return route(sql, partitions, month_range(date_from, date_to))
+
+    def fingerprint(self, sql):
+        """Data versions of the tables a query reads, or its source files"""
+        if self.source != "db":
+            if self.source == "csv":
+                paths = [f"data/{table}.csv" for table in DUCKDB_FACT_VIEWS]
+            else:
+                paths = glob.glob("data/parquet/**/*.parquet", recursive=True)
+            return file_fingerprint(paths)
+        try:
+            versions = self.conn.execute(
+                "SELECT table_name, version FROM data_versions"
+            ).fetchall()
+        except self.error:
+            return file_fingerprint([self.db_path])
+        return version_fingerprint(sql, versions)
+
+    def close(self):
+        self.conn.close()
+
+
+BACKENDS = {"sqlite": SQLiteBackend, "duckdb": DuckDBBackend}
+
+
+def open_backend(name="sqlite", source="db"):
+    """Open a query backend by name over the given data source"""
+    if name == "sqlite":
+        if source != "db":
+            raise ValueError("the sqlite backend only reads the database")
+        return SQLiteBackend(read_only=True)
+    return BACKENDS[name](source)
@@ -0,0 +1,117 @@
+import pandas as pd
+import time
+from contextlib import contextmanager
+
+from db_pool import apply_pragmas, profile_pragmas
+from partitions import ensure_partition
+
+# Settings used only while a fresh database file is being filled. A crash
+# mid-load can corrupt the file, which is fine because the loader starts
+# from scratch anyway.
+BULK_LOAD_PRAGMAS = {
+    "journal_mode": "OFF",
+    "synchronous": "OFF",
+    "locking_mode": "EXCLUSIVE",
+    "cache_size": -512000,  # 500 MB of page cache
+    "temp_store": "MEMORY",
+}
+
+# Durable settings restored once the load has finished, followed by the
+# performance profile's cache settings. The exclusive lock is released
+# before entering WAL so readers can share the file.
+SAFE_PRAGMAS = {
+    "locking_mode": "NORMAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+}
+
+BATCH_SIZE = 100_000
+
+
+@contextmanager
+def bulk_load_settings(conn):
+    """Run a block under the bulk-load PRAGMAs, then restore safe settings"""
+    apply_pragmas(conn, BULK_LOAD_PRAGMAS)
+    try:
+        yield conn
+    finally:
+        conn.commit()
+        apply_pragmas(conn, SAFE_PRAGMAS)
+        apply_pragmas(conn, profile_pragmas())
+
+
+def iter_csv_frames(path, batch_size=BATCH_SIZE):
+    """Lazily read a CSV file in typed pandas chunks of ``batch_size`` rows
+
+    Handing SQLite ints and floats is cheaper than letting column affinity
+    convert text.
+    """
+    yield from pd.read_csv(path, chunksize=batch_size)
+
+
+def iter_parquet_frames(path, columns, batch_size=BATCH_SIZE):
+    """Lazily read the columns of a Parquet dataset in pandas chunks
+
+    Dictionary-encoded labels come back as categoricals.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+        yield batch.to_pandas()
+
+
+def frame_rows(frame, columns):
+    """Rows of a frame's columns as tuples of Python values, for executemany"""
+    return zip(*(frame[column].tolist() for column in columns))
+
+
+def bulk_insert(conn, table, columns, frames):
+    """Stream frames into a table with executemany, one frame at a time
+
+    Returns ``(row_count, seconds)``.
+    """
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+    count = 0
+    start = time.perf_counter()
+
+    for frame in frames:
+        conn.executemany(sql, frame_rows(frame, columns))
+        conn.commit()
+        count += len(frame)
+
+    return count, time.perf_counter() - start
+
+
+def bulk_insert_partitioned(conn, table, ddl, columns, frames, month_of):
+    """Stream frames into the monthly partitions of a table
+
+    ``month_of(frame)`` gives the ``YYYYMM`` month of each row as an array;
+    partitions are created as their first rows arrive. Returns
+    ``(row_count, seconds)``.
+    """
+    values = f"({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    count = 0
+    start = time.perf_counter()
+
+    for frame in frames:
+        months = month_of(frame)
+        for month in pd.unique(months):
+            partition = ensure_partition(conn, table, ddl, int(month))
+            conn.executemany(
+                f"INSERT INTO {partition} {values}",
+                frame_rows(frame[months == month], columns),
+            )
+        conn.commit()
+        count += len(frame)
+
+    return count, time.perf_counter() - start
+
+
+def report_load(table, count, seconds):
+    """Print the row count and throughput of one table load"""
+    rate = count / seconds if seconds else float("inf")
+    print(f"Loaded {table}: {count:,} rows in {seconds:.2f}s ({rate:,.0f} rows/sec)")
@@ -0,0 +1,177 @@
+import time
+
+from data_versions import bump_data_versions
+from partitions import live_partitions, partition_months, route
+from star_schema import FACT_TABLES
+
+# Per-customer aggregates for each month, the grain a load refreshes. Like
+# the rollups they outlive archived fact partitions, so the features keep
+# each customer's full history.
+CUSTOMER_MONTH_TABLES = {
+    "customer_months": """
+        CREATE TABLE IF NOT EXISTS customer_months (
+            customer_key INTEGER,
+            month INTEGER,
+            visit_count INTEGER,
+            item_count INTEGER,
+            monetary REAL,
+            first_date_key INTEGER,
+            last_date_key INTEGER,
+            PRIMARY KEY (customer_key, month)
+        ) WITHOUT ROWID
+    """,
+    "customer_month_categories": """
+        CREATE TABLE IF NOT EXISTS customer_month_categories (
+            customer_key INTEGER,
+            month INTEGER,
+            category TEXT,
+            line_count INTEGER,
+            item_total REAL,
+            PRIMARY KEY (customer_key, month, category)
+        ) WITHOUT ROWID
+    """,
+}
+
+# Aggregations over the fact tables; {where} restricts the customers.
+# Each is routed to one month's fact partitions at a time.
+CUSTOMER_MONTH_SELECTS = {
+    "customer_months": """
+        SELECT
+            t.customer_key,
+            t.date_key / 100,
+            COUNT(*),
+            SUM(t.num_items),
+            SUM(t.gross_income),
+            MIN(t.date_key),
+            MAX(t.date_key)
+        FROM fact_transactions t
+        {where}
+        GROUP BY 1, 2
+    """,
+    "customer_month_categories": """
+        SELECT
+            t.customer_key,
+            t.date_key / 100,
+            p.category,
+            COUNT(*),
+            SUM(i.item_total)
+        FROM fact_transaction_items i
+        JOIN fact_transactions t ON t.transaction_key = i.transaction_key
+        JOIN dim_product p ON p.product_key = i.product_key
+        {where}
+        GROUP BY 1, 2, 3
+    """,
+}
+
+# One row per customer, or per customer and category: recency (last
+# visit), frequency (visits) and monetary value, and the category mix of
+# their spending. Dashboards read only these.
+CUSTOMER_FEATURE_TABLES = {
+    "customer_features": """
+        CREATE TABLE IF NOT EXISTS customer_features (
+            customer_key INTEGER PRIMARY KEY,
+            first_date_key INTEGER,
+            last_date_key INTEGER,
+            visit_count INTEGER,
+            item_count INTEGER,
+            monetary REAL
+        )
+    """,
+    "customer_category_mix": """
+        CREATE TABLE IF NOT EXISTS customer_category_mix (
+            customer_key INTEGER,
+            category TEXT,
+            line_count INTEGER,
+            item_total REAL,
+            PRIMARY KEY (customer_key, category)
+        ) WITHOUT ROWID
+    """,
+}
+
+# Aggregations over the monthly tables; {where} restricts the customers
+CUSTOMER_FEATURE_SELECTS = {
+    "customer_features": """
+        SELECT
+            customer_key,
+            MIN(first_date_key),
+            MAX(last_date_key),
+            SUM(visit_count),
+            SUM(item_count),
+            SUM(monetary)
+        FROM customer_months
+        {where}
+        GROUP BY customer_key
+    """,
+    "customer_category_mix": """
+        SELECT customer_key, category, SUM(line_count), SUM(item_total)
+        FROM customer_month_categories
+        {where}
+        GROUP BY customer_key, category
+    """,
+}
+
+CUSTOMER_TABLES = {**CUSTOMER_MONTH_TABLES, **CUSTOMER_FEATURE_TABLES}
+
+
+def customer_features_exist(conn):
+    """Whether every customer feature table is present in the database"""
+    placeholders = ", ".join("?" * len(CUSTOMER_TABLES))
+    (count,) = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' "
+        f"AND name IN ({placeholders})",
+        list(CUSTOMER_TABLES),
+    ).fetchone()
+    return count == len(CUSTOMER_TABLES)
+
+
+def _fill(conn, months, customers=None):
+    """Recompute the monthly rows of ``months``, then the features, for
+    all customers or those listed in the ``customers`` table"""
+    for ddl in CUSTOMER_TABLES.values():
+        conn.execute(ddl)
+    customer_filter = (
+        f"customer_key IN (SELECT customer_key FROM {customers})"
+        if customers
+        else "true"
+    )
+    where = f"WHERE {customer_filter}" if customers else ""
+    fact_where = f"WHERE t.{customer_filter}" if customers else ""
+
+    facts = [(fact, m) for fact, m in live_partitions(conn) if fact in FACT_TABLES]
+    for month in months:
+        for table, select in CUSTOMER_MONTH_SELECTS.items():
+            conn.execute(
+                f"DELETE FROM {table} WHERE month = ? AND {customer_filter}", (month,)
+            )
+            routed = route(select.format(where=fact_where), facts, (month, month))
+            conn.execute(f"INSERT INTO {table} {routed}")
+
+    for table, select in CUSTOMER_FEATURE_SELECTS.items():
+        conn.execute(f"DELETE FROM {table} WHERE {customer_filter}")
+        conn.execute(f"INSERT INTO {table} {select.format(where=where)}")
+    bump_data_versions(conn, list(CUSTOMER_TABLES))
+
+
+def build_customer_features(conn):
+    """Rebuild the customer features from every month whose facts are in
+    the database; archived months keep their monthly rows"""
+    start = time.perf_counter()
+    _fill(conn, partition_months(conn, "fact_transactions"))
+    conn.commit()
+    print(f"Customer features built in {time.perf_counter() - start:.2f}s")
+
+
+def refresh_customer_features(conn, dates_table, customers_table):
+    """Recompute the features of the customers listed in ``customers_table``
+
+    Only the months of the days in ``dates_table`` are re-aggregated from
+    the facts, so the work is proportional to the batch. The caller
+    commits.
+    """
+    months = [
+        month
+        for (month,) in conn.execute(
+            f"SELECT DISTINCT date_key / 100 FROM {dates_table}"
+        ).fetchall()
+    ]
+    _fill(conn, months, customers_table)
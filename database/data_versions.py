@@ -0,0 +1,45 @@
+import time
+
+# Tables a full load rewrites: fact and dimension tables, the views over
+# them, the rollups, the sample and sketches, and the customer features
+LOADED_TABLES = [
+    "fact_transactions",
+    "fact_transaction_items",
+    "dim_date",
+    "dim_store",
+    "dim_payment",
+    "dim_customer",
+    "dim_product",
+    "transactions",
+    "transaction_items",
+    "daily_sales_rollup",
+    "daily_item_rollup",
+    "sample_strata",
+    "sample_items",
+    "customer_sketches",
+    "customer_months",
+    "customer_month_categories",
+    "customer_features",
+    "customer_category_mix",
+]
+
+
+def bump_data_versions(conn, tables=LOADED_TABLES):
+    """Record that ``tables`` changed, so cached query results expire
+
+    Versions are nanosecond timestamps rather than counters, so they never
+    repeat even after the database file is rebuilt from scratch. The caller
+    commits.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER
+        )
+    """)
+    version = time.time_ns()
+    conn.executemany(
+        "INSERT INTO data_versions (table_name, version) VALUES (?, ?) "
+        "ON CONFLICT (table_name) DO UPDATE SET version = excluded.version",
+        [(table, version) for table in tables],
+    )
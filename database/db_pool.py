@@ -0,0 +1,128 @@
+import queue
+import os
+import sqlite3
+from contextlib import contextmanager
+
+DB_PATH = "database/supermarket.db"
+
+# Performance profiles applied to every connection the project opens.
+# page_size only takes effect when a database file is created; SQLite
+# clamps mmap_size to its compiled maximum (2 GB in most builds). Large
+# page caches and in-memory temp stores measured slower for the big
+# GROUP BY sorts in benchmarks/bench_profiles.py, so no profile uses them.
+PROFILES = {
+    # SQLite's own defaults, kept for comparison
+    "default": {
+        "page_size": 4096,
+        "mmap_size": 0,
+        "cache_size": -2000,
+        "temp_store": "DEFAULT",
+    },
+    # Larger pages mean fewer, longer reads per scan, and mapped pages
+    # skip the read() syscall and copy into SQLite's own cache
+    "balanced": {
+        "page_size": 16384,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -2000,
+        "temp_store": "DEFAULT",
+    },
+    # Multi-GB databases: map the whole file, and keep enough page cache
+    # for the index pages of rollup refreshes, at some cost to big sorts
+    "large": {
+        "page_size": 16384,
+        "mmap_size": 64 * 1024**3,
+        "cache_size": -65536,  # 64 MB
+        "temp_store": "DEFAULT",
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+# Readers never write, so they skip the write path entirely
+READER_PRAGMAS = {"query_only": "ON"}
+
+# Writers run in WAL mode so loads never block concurrent readers.
+# synchronous=NORMAL is durable across application crashes in WAL mode.
+WRITER_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 30000,
+}
+
+
+def set_profile(name):
+    """Select the performance profile for this process and its children"""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile {name!r}, expected one of {list(PROFILES)}")
+    os.environ["SUPERMARKET_DB_PROFILE"] = name
+
+
+def active_profile():
+    """Settings of the selected performance profile"""
+    return PROFILES[os.environ.get("SUPERMARKET_DB_PROFILE", DEFAULT_PROFILE)]
+
+
+def profile_pragmas():
+    """Per-connection PRAGMAs of the selected profile"""
+    return {
+        name: value for name, value in active_profile().items() if name != "page_size"
+    }
+
+
+def apply_pragmas(conn, pragmas):
+    """Apply a dict of PRAGMA settings to a connection and return it"""
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def connect_reader(db_path=DB_PATH, check_same_thread=True):
+    """Open a read-only connection tuned for analytical queries"""
+    conn = sqlite3.connect(
+        f"file:{db_path}?mode=ro", uri=True, check_same_thread=check_same_thread
+    )
+    return apply_pragmas(conn, {**READER_PRAGMAS, **profile_pragmas()})
+
+
+def connect_writer(db_path=DB_PATH, new_database=False):
+    """Open a read-write connection with the database in WAL mode
+
+    ``new_database`` sets the profile's page size first, which SQLite only
+    honours before the file's first table is created, along with
+    incremental auto-vacuum so archived partitions can give their pages
+    back without a full VACUUM.
+    """
+    conn = sqlite3.connect(db_path)
+    if new_database:
+        apply_pragmas(
+            conn,
+            {"page_size": active_profile()["page_size"], "auto_vacuum": "INCREMENTAL"},
+        )
+    return apply_pragmas(conn, {**WRITER_PRAGMAS, **profile_pragmas()})
+
+
+class ConnectionPool:
+    """Fixed-size pool of connections shared by threads
+
+    ``factory`` opens one pooled object, by default a read-only
+    connection. Anything with a ``close()`` method can be pooled, e.g.
+    query backends wrapping a reader.
+    """
+
+    def __init__(self, size=4, factory=None):
+        factory = factory or (lambda: connect_reader(check_same_thread=False))
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(factory())
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block"""
+        conn = self.connections.get()
+        try:
+            yield conn
+        finally:
+            self.connections.put(conn)
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
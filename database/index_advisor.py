@@ -0,0 +1,262 @@
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+from aggregations import PASS_QUERIES
+from db_pool import DB_PATH, connect_writer
+from partitions import (
+    create_partition_index,
+    live_partitions,
+    partition_months,
+    partition_name,
+    record_partition_index,
+    route,
+)
+from rollups import ROLLUP_SELECTS
+from setup_realistic_database import report_queries
+
+SQL_KEYWORDS = {"where", "join", "group", "order", "on", "limit", "inner", "left"}
+
+# An index is kept only if some query using it runs in under this share
+# of its time without the candidates
+KEEP_RATIO = 0.9
+
+
+def workload(conn):
+    """Collect ``(name, sql, params)`` for every query the project runs"""
+    queries = [
+        (f"dashboard:{name}", sql.format(where=""), ())
+        for name, sql in PASS_QUERIES.items()
+    ]
+    queries += [
+        (f"report:{name}", sql, params)
+        for name, (sql, params) in report_queries().items()
+    ]
+
+    # Incremental loads rebuild rollups one day at a time, reading only
+    # that day's month partitions
+    (latest,) = conn.execute("SELECT MAX(date_key) FROM fact_transactions").fetchone()
+    month = (latest // 100, latest // 100)
+    queries += [
+        (
+            f"refresh:{name}",
+            route(
+                sql.format(where="WHERE t.date_key = ?"), live_partitions(conn), month
+            ),
+            (latest,),
+        )
+        for name, sql in ROLLUP_SELECTS.items()
+    ]
+    return queries
+
+
+def query_plan(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines of a query"""
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def time_query(conn, sql, params=(), repeat=3):
+    """Best-of-``repeat`` wall time of a query, in seconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def table_columns(conn, table):
+    """Column names of a table, in schema order"""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def is_table(conn, name):
+    """Whether a name is a plain table, and so can be indexed directly"""
+    return bool(
+        conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+    )
+
+
+def parent_tables(conn):
+    """Map each partition in the main file, and each partitioned table's
+    view, to the partitioned table"""
+    parents = {}
+    for table, month in live_partitions(conn):
+        parents[partition_name(table, month)] = table
+        parents[table] = table
+    return parents
+
+
+def existing_indexes(conn, table):
+    """Map index name to its column list for a table"""
+    return {
+        row[1]: [col[2] for col in conn.execute(f"PRAGMA index_info({row[1]})")]
+        for row in conn.execute(f"PRAGMA index_list({table})")
+    }
+
+
+def _clause(sql, keyword, terminators):
+    """Text of one SQL clause, up to the next terminating keyword"""
+    match = re.search(
+        rf"\b{keyword}\b(.*?)(?:\b(?:{'|'.join(terminators)})\b|$)",
+        sql,
+        re.IGNORECASE | re.DOTALL,
+    )
+    return match.group(1) if match else ""
+
+
+def propose_indexes(conn, sql, plan):
+    """Propose covering composite indexes for the tables a plan scans
+
+    For every table the plan reads with a full ``SCAN``, the candidate
+    leads with the columns filtered in WHERE, then the GROUP BY keys, then
+    every other column the query touches, so the scan can be answered
+    from the index alone and already in group order. Scans of monthly
+    partitions, whether read through their view or named directly, are
+    proposed for the partitioned table, to be built on every partition.
+    """
+    parents = parent_tables(conn)
+    scanned = {
+        parents.get(match.group(1), match.group(1))
+        for line in plan
+        for match in [re.match(r"SCAN (\w+)(?: AS \w+)?$", line)]
+        if match
+    }
+    refs = re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql, re.I)
+
+    proposals = []
+    for table, alias in refs:
+        if alias.lower() in SQL_KEYWORDS:
+            alias = ""
+        table = parents.get(table, table)
+        if table not in scanned and alias not in scanned:
+            continue
+        if table in parents:
+            months = partition_months(conn, table)
+            if not months:
+                continue
+            physical = partition_name(table, months[-1])
+        elif is_table(conn, table):
+            physical = table
+        else:
+            continue
+
+        columns = table_columns(conn, physical)
+        prefix = rf"\b{alias}\." if alias else r"(?<![.\w])"
+
+        def used(text):
+            return [c for c in columns if re.search(prefix + rf"{c}\b", text)]
+
+        where = used(_clause(sql, "WHERE", ["GROUP", "ORDER", "LIMIT"]))
+        group = used(_clause(sql, "GROUP BY", ["ORDER", "LIMIT", "HAVING"]))
+        rest = used(sql)
+
+        ordered = []
+        for column in where + group + rest:
+            if column not in ordered:
+                ordered.append(column)
+        if not ordered:
+            continue
+
+        # Skip candidates an existing index already leads with
+        if any(
+            cols[: len(ordered)] == ordered
+            for cols in existing_indexes(conn, physical).values()
+        ):
+            continue
+        proposals.append((table, tuple(ordered)))
+
+    return proposals
+
+
+def index_name(table, columns):
+    """Name for an advised index"""
+    return f"idx_{table}_" + "_".join(columns)
+
+
+def advise(db_path=DB_PATH, dry_run=False):
+    """Plan, propose, build and verify covering indexes for the workload"""
+    conn = connect_writer(db_path)
+    queries = workload(conn)
+
+    before = {}
+    candidates = {}
+    for name, sql, params in queries:
+        plan = query_plan(conn, sql, params)
+        before[name] = (plan, time_query(conn, sql, params))
+        for table, columns in propose_indexes(conn, sql, plan):
+            candidates.setdefault(index_name(table, columns), (table, columns))
+
+    # Partitioned tables get the index on every partition, named per month
+    parents = parent_tables(conn)
+    built = {}
+    print(f"Proposed {len(candidates)} indexes:")
+    for name, (table, columns) in candidates.items():
+        if table in parents:
+            print(f"   • {name} ON every {table} partition({', '.join(columns)})")
+            built[name] = create_partition_index(conn, name, table, columns)
+        else:
+            print(f"   • {name} ON {table}({', '.join(columns)})")
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})"
+            )
+            built[name] = [name]
+    conn.execute("ANALYZE")
+    conn.commit()
+
+    used = set()
+    for name, sql, params in queries:
+        plan = query_plan(conn, sql, params)
+        seconds = time_query(conn, sql, params)
+        old_plan, old_seconds = before[name]
+        if seconds < old_seconds * KEEP_RATIO:
+            used.update(
+                index
+                for index, physical in built.items()
+                if any(
+                    re.search(rf"\b{copy}\b", line)
+                    for copy in physical
+                    for line in plan
+                )
+            )
+
+        print(f"\n{name}: {old_seconds * 1000:.1f} ms -> {seconds * 1000:.1f} ms")
+        print("   before: " + " | ".join(old_plan))
+        print("   after:  " + " | ".join(plan))
+
+    # Keep only the indexes that sped up a query picking them up, and have
+    # new partitions of their tables built with them
+    for name, (table, columns) in candidates.items():
+        if dry_run or name not in used:
+            for copy in built[name]:
+                conn.execute(f"DROP INDEX {copy}")
+        elif table in parents:
+            record_partition_index(conn, name, table, columns)
+    conn.commit()
+    conn.close()
+
+    kept = [] if dry_run else sorted(used)
+    print(f"\nKept {len(kept)} indexes: {', '.join(kept) or 'none'}")
+    return kept
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Propose and build covering indexes for the query workload"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="report plans and timings, then drop the proposed indexes again",
+    )
+    args = parser.parse_args()
+
+    advise(dry_run=args.dry_run)
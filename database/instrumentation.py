@@ -0,0 +1,225 @@
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Where finished stages go. Set through enable_tracing() or the
+# environment, so worker processes inherit the settings.
+LOG_ENV = "SUPERMARKET_TRACE_LOG"
+CHROME_ENV = "SUPERMARKET_TRACE_CHROME"
+# tracemalloc slows allocation-heavy code several times over; set to 0 to
+# keep wall times honest and record only the process's peak RSS
+MEMORY_ENV = "SUPERMARKET_TRACE_MEMORY"
+
+# Open stages of this thread, innermost last
+_local = threading.local()
+_write_lock = threading.Lock()
+# Chrome traces this process closes at exit
+_closing_at_exit = set()
+
+
+def enable_tracing(log_path=None, chrome_path=None, memory=True):
+    """Record stages as JSON lines to ``log_path`` ("-" for stderr) and/or
+    as Chrome trace events to ``chrome_path``
+
+    The Chrome trace is closed into a valid JSON array when the process
+    exits, and reopened for appending by the next run that enables it.
+    Enabling the same trace again is harmless.
+    """
+    if log_path:
+        os.environ[LOG_ENV] = log_path
+    if chrome_path:
+        os.environ[CHROME_ENV] = chrome_path
+        _reopen_chrome_trace(chrome_path)
+        if chrome_path not in _closing_at_exit:
+            _closing_at_exit.add(chrome_path)
+            atexit.register(_close_chrome_trace, chrome_path)
+    if not memory:
+        os.environ[MEMORY_ENV] = "0"
+
+
+def tracing_enabled():
+    return bool(os.environ.get(LOG_ENV) or os.environ.get(CHROME_ENV))
+
+
+def add_trace_arguments(parser):
+    """Add the tracing options read by ``enable_tracing_from_args``"""
+    parser.add_argument(
+        "--trace-log",
+        metavar="PATH",
+        help="append per-stage timings and memory as JSON lines (- for stderr)",
+    )
+    parser.add_argument(
+        "--chrome-trace",
+        metavar="PATH",
+        help="append stages to a Chrome trace JSON file (open in ui.perfetto.dev)",
+    )
+    parser.add_argument(
+        "--trace-no-memory",
+        action="store_true",
+        help="skip tracemalloc, which slows allocation-heavy stages",
+    )
+
+
+def enable_tracing_from_args(args):
+    """Apply the options added by ``add_trace_arguments``"""
+    enable_tracing(args.trace_log, args.chrome_trace, not args.trace_no_memory)
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _append(path, line):
+    with _write_lock:
+        if path == "-":
+            print(line, file=sys.stderr)
+            return
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+
+def _emit(record):
+    log_path = os.environ.get(LOG_ENV)
+    if log_path:
+        _append(log_path, json.dumps(record))
+
+    chrome_path = os.environ.get(CHROME_ENV)
+    if chrome_path:
+        # One event per line, each with a trailing comma, so worker
+        # processes can append to the file while the run is open
+        if not os.path.exists(chrome_path):
+            _append(chrome_path, "[")
+        event = {
+            "name": record["stage"],
+            "ph": "X",
+            "ts": record["start"] * 1e6,
+            "dur": record["wall_s"] * 1e6,
+            "pid": record["pid"],
+            "tid": threading.get_ident(),
+            "args": {
+                key: value
+                for key, value in record.items()
+                if key not in ("stage", "start", "pid")
+            },
+        }
+        _append(chrome_path, json.dumps(event) + ",")
+
+
+def _close_chrome_trace(path):
+    """Replace the last event's comma with the array's closing bracket,
+    unless the trace is already closed"""
+    if not os.path.exists(path):
+        return
+    with _write_lock, open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        f.seek(max(end - 2, 0))
+        tail = f.read()
+        if tail == b"]\n":
+            return
+        if tail == b",\n":
+            f.seek(end - 2)
+        f.write(b"\n]\n")
+
+
+def _reopen_chrome_trace(path):
+    """Undo ``_close_chrome_trace`` so further events can be appended"""
+    if not os.path.exists(path):
+        return
+    with _write_lock, open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        f.seek(max(end - 4, 0))
+        tail = f.read()
+        if tail.endswith(b"}\n]\n"):
+            f.seek(end - 3)
+            f.write(b",\n")
+            f.truncate()
+        elif tail.endswith(b"\n]\n"):
+            f.seek(end - 2)
+            f.truncate()
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time a block of work as one named stage
+
+    Records wall time, CPU time, the peak of Python allocations made
+    inside the block (tracemalloc) and the process's peak RSS. Yields a
+    dict of fields for the log record, e.g. ``info["rows"] = len(df)``.
+    Does nothing beyond that when tracing is not enabled.
+    """
+    if not tracing_enabled():
+        yield fields
+        return
+
+    memory = os.environ.get(MEMORY_ENV) != "0"
+    stack = _local.__dict__.setdefault("stack", [])
+    frame = {"peak": 0, "started_tracing": False}
+    if memory:
+        # Nested stages reset tracemalloc's peak, so each open stage keeps
+        # the highest peak its children saw
+        if stack:
+            stack[-1]["peak"] = max(
+                stack[-1]["peak"], tracemalloc.get_traced_memory()[1]
+            )
+        elif not tracemalloc.is_tracing():
+            tracemalloc.start()
+            frame["started_tracing"] = True
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    stack.append(frame)
+
+    start = time.time()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield fields
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        stack.pop()
+        record = {
+            "stage": name,
+            "start": start,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "max_rss_mb": _max_rss_mb(),
+            "depth": len(stack),
+            "pid": os.getpid(),
+        }
+        if memory:
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+            elif frame["started_tracing"]:
+                tracemalloc.stop()
+            record["peak_alloc_mb"] = round(max(peak - base, 0) / 2**20, 3)
+        _emit({**record, **fields})
+
+
+def traced(name=None):
+    """Decorator running every call of a function as a stage"""
+
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name or function.__name__):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
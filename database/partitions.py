@@ -0,0 +1,315 @@
+import os
+import re
+
+import numpy as np
+
+# Date-keyed tables are split into one table per month, e.g.
+# fact_transactions_202601, listed in this catalog. The unsuffixed name
+# is a UNION ALL view over the partitions kept in the main file.
+CATALOG_DDL = """
+    CREATE TABLE IF NOT EXISTS partition_catalog (
+        table_name TEXT,
+        month INTEGER,
+        location TEXT DEFAULT 'main',
+        PRIMARY KEY (table_name, month)
+    )
+"""
+
+# Indexes kept on every partition of a table, including months created
+# later, e.g. those the index advisor accepted. Each partition's copy is
+# named like the partition, e.g. idx_..._202601.
+INDEX_CATALOG_DDL = """
+    CREATE TABLE IF NOT EXISTS partition_indexes (
+        index_name TEXT PRIMARY KEY,
+        table_name TEXT,
+        columns TEXT
+    )
+"""
+
+ARCHIVE_DIR = "database/archive"
+
+
+def table_columns(ddl):
+    """Column names declared in a CREATE TABLE statement"""
+    return re.findall(r"^\s*(\w+) (?:TEXT|INTEGER|REAL)", ddl, re.M)
+
+
+def partition_name(table, month):
+    return f"{table}_{month}"
+
+
+def month_of(date):
+    """``YYYYMM`` month of a ``YYYY-MM-DD`` date"""
+    return int(date[:7].replace("-", ""))
+
+
+def month_range(date_from=None, date_to=None):
+    """Inclusive ``(first, last)`` months of a date range; None is open"""
+    return (
+        month_of(date_from) if date_from else 0,
+        month_of(date_to) if date_to else 999999,
+    )
+
+
+def partition_months(conn, table):
+    """Months of a table's partitions in the main database file"""
+    return [
+        month
+        for (month,) in conn.execute(
+            "SELECT month FROM partition_catalog "
+            "WHERE table_name = ? AND location = 'main' ORDER BY month",
+            (table,),
+        )
+    ]
+
+
+def live_partitions(conn):
+    """``(table, month)`` of every partition in the main database file"""
+    return conn.execute(
+        "SELECT table_name, month FROM partition_catalog WHERE location = 'main'"
+    ).fetchall()
+
+
+def rebuild_view(conn, table, ddl):
+    """Point a partitioned table's view at its current partitions"""
+    months = partition_months(conn, table)
+    if months:
+        select = " UNION ALL ".join(
+            f"SELECT * FROM {partition_name(table, month)}" for month in months
+        )
+    else:
+        columns = ", ".join(f"NULL as {column}" for column in table_columns(ddl))
+        select = f"SELECT {columns} WHERE 0"
+    conn.execute(f"DROP VIEW IF EXISTS {table}")
+    conn.execute(f"CREATE VIEW {table} AS {select}")
+
+
+def create_partitioned(conn, tables):
+    """Create the catalogs and an (empty) view for each partitioned table"""
+    conn.execute(CATALOG_DDL)
+    conn.execute(INDEX_CATALOG_DDL)
+    for table, ddl in tables.items():
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (table,)
+        ).fetchone():
+            rebuild_view(conn, table, ddl)
+
+
+def ensure_partition(conn, table, ddl, month):
+    """Create a month's partition of a table if needed; returns its name"""
+    name = partition_name(table, month)
+    (location,) = conn.execute(
+        "SELECT COALESCE(MAX(location), '') FROM partition_catalog "
+        "WHERE table_name = ? AND month = ?",
+        (table, month),
+    ).fetchone()
+    if location == "main":
+        return name
+    if location:
+        raise ValueError(f"{name} is archived in {location}; it cannot be loaded")
+
+    conn.execute(ddl.replace(f" {table} (", f" {name} (", 1))
+    conn.execute(
+        "INSERT INTO partition_catalog (table_name, month) VALUES (?, ?)",
+        (table, month),
+    )
+    for index, columns in partition_indexes(conn, table):
+        create_partition_index(conn, index, table, columns, [month])
+    rebuild_view(conn, table, ddl)
+    return name
+
+
+def partition_indexes(conn, table):
+    """``(index, columns)`` of the indexes kept on a table's partitions"""
+    return [
+        (index, columns.split(","))
+        for index, columns in conn.execute(
+            "SELECT index_name, columns FROM partition_indexes WHERE table_name = ?",
+            (table,),
+        )
+    ]
+
+
+def create_partition_index(conn, index, table, columns, months=None):
+    """Create an index on a table's partitions in the main file, or on those
+    of ``months``; returns the names of the partitions' indexes"""
+    names = []
+    for month in months or partition_months(conn, table):
+        names.append(partition_name(index, month))
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {names[-1]} "
+            f"ON {partition_name(table, month)}({', '.join(columns)})"
+        )
+    return names
+
+
+def record_partition_index(conn, index, table, columns):
+    """Keep an index on the partitions a table gains from now on"""
+    conn.execute(
+        "INSERT OR REPLACE INTO partition_indexes VALUES (?, ?, ?)",
+        (index, table, ",".join(columns)),
+    )
+
+
+def route(sql, partitions, months):
+    """Rewrite a query to read only the partitions within ``months``
+
+    Every partitioned table named after FROM or JOIN in ``sql`` is replaced
+    by its partitions whose month lies in the inclusive ``(first, last)``
+    range: one table directly, several as a UNION ALL subquery. The same
+    name elsewhere, e.g. in a string or a column alias, is left alone.
+    ``partitions`` lists ``(table, month)`` pairs, e.g. from
+    ``live_partitions``.
+    """
+    first, last = months
+    by_table = {}
+    for table, month in sorted(partitions):
+        if first <= month <= last:
+            by_table.setdefault(table, []).append(month)
+        else:
+            by_table.setdefault(table, [])
+
+    for table, selected in by_table.items():
+        if len(selected) == 1:
+            source = partition_name(table, selected[0])
+        elif selected:
+            source = (
+                "("
+                + " UNION ALL ".join(
+                    f"SELECT * FROM {partition_name(table, month)}"
+                    for month in selected
+                )
+                + ")"
+            )
+        else:
+            source = f"(SELECT * FROM {table} WHERE 0)"
+        sql = re.sub(
+            rf"\b(FROM|JOIN)(\s+){table}\b",
+            lambda match: match.group(1) + match.group(2) + source,
+            sql,
+            flags=re.IGNORECASE,
+        )
+    return sql
+
+
+def partition_tables(conn, months=None):
+    """Names of the partitions in ``months``, or of all partitions"""
+    return [
+        partition_name(table, month)
+        for table, month in conn.execute(
+            "SELECT table_name, month FROM partition_catalog"
+        )
+        if months is None or month in months
+    ]
+
+
+def archive_partitions(conn, tables, before, archive_dir=ARCHIVE_DIR):
+    """Move every partition of ``tables`` older than month ``before`` out
+
+    Each month goes to its own file in ``archive_dir``, holding the same
+    tables, and drops out of the views. Freed pages are returned to the
+    file system with an incremental vacuum, without rebuilding the
+    database. Returns the archived months.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    months = sorted(
+        {month for table in tables for month in partition_months(conn, table)}
+    )
+    archived = [month for month in months if month < before]
+
+    for month in archived:
+        path = os.path.join(archive_dir, f"{month}.db")
+        conn.commit()
+        conn.execute("ATTACH ? AS archive", (path,))
+        for table in tables:
+            name = partition_name(table, month)
+            (sql,) = conn.execute(
+                "SELECT sql FROM sqlite_master WHERE name = ?", (name,)
+            ).fetchone()
+            conn.execute(sql.replace(name, f"archive.{name}", 1))
+            conn.execute(f"INSERT INTO archive.{name} SELECT * FROM {name}")
+            conn.execute(f"DROP TABLE {name}")
+            conn.execute(
+                "UPDATE partition_catalog SET location = ? "
+                "WHERE table_name = ? AND month = ?",
+                (path, table, month),
+            )
+        conn.commit()
+        conn.execute("DETACH archive")
+
+    for table, ddl in tables.items():
+        rebuild_view(conn, table, ddl)
+    conn.commit()
+    # execute() would step the pragma once and free a single page
+    conn.executescript("PRAGMA incremental_vacuum")
+    return archived
+
+
+class TransactionValues:
+    """A nonzero int32 value per transaction key, read and written for
+    whole arrays of keys; keys never written read as 0
+
+    Generated transaction keys are dense, so values live in a flat NumPy
+    array indexed from the first key, at 4 bytes per transaction. Keys far
+    outside that run go to a dict.
+    """
+
+    MAX_GAP = 1_000_000
+
+    def __init__(self):
+        self.first = None
+        self.size = 0
+        self.values = np.zeros(0, dtype=np.int32)
+        self.sparse = {}
+
+    def _offsets(self, keys):
+        """Offsets of keys into the array, and which of them belong there"""
+        if self.first is None:
+            self.first = int(keys.min())
+        offsets = keys - self.first
+        return offsets, (offsets >= 0) & (offsets < self.size + self.MAX_GAP)
+
+    def __getitem__(self, keys):
+        values = np.zeros(len(keys), dtype=np.int32)
+        if not len(keys) or self.first is None:
+            return values
+        offsets, dense = self._offsets(keys)
+        stored = dense & (offsets < self.size)
+        values[stored] = self.values[offsets[stored]]
+        if self.sparse:
+            for i in np.flatnonzero(values == 0):
+                values[i] = self.sparse.get(int(keys[i]), 0)
+        return values
+
+    def __setitem__(self, keys, values):
+        if not len(keys):
+            return
+        offsets, dense = self._offsets(keys)
+        if dense.any():
+            end = int(offsets[dense].max()) + 1
+            if end > len(self.values):
+                grown = np.zeros(max(end, 2 * len(self.values)), dtype=np.int32)
+                grown[: self.size] = self.values[: self.size]
+                self.values = grown
+            self.size = max(self.size, end)
+            self.values[offsets[dense]] = values[dense]
+        for key, value in zip(keys[~dense].tolist(), values[~dense].tolist()):
+            self.sparse[key] = value
+
+
+class TransactionMonths(TransactionValues):
+    """Month of every loaded transaction, so its line items follow it"""
+
+    def add(self, keys, months):
+        """Record the months of transactions and return them"""
+        self[keys] = months
+        return months
+
+    def of(self, keys):
+        """Months of the transactions of line items"""
+        months = self[keys]
+        if not months.all():
+            raise ValueError(
+                f"Line item for unknown transaction key {keys[months == 0][0]}"
+            )
+        return months
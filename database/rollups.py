@@ -0,0 +1,157 @@
+import time
+
+from data_versions import bump_data_versions
+from partitions import (
+    create_partitioned,
+    ensure_partition,
+    live_partitions,
+    partition_months,
+    partition_name,
+    route,
+)
+from star_schema import FACT_TABLES, RATING_BANDS
+
+# Rating band key of a line item, from the dashboard's rating buckets
+RATING_KEY_SQL = (
+    "CASE "
+    + " ".join(
+        f"WHEN i.rating >= {floor} THEN {key}"
+        for key, _, floor in RATING_BANDS
+        if floor is not None
+    )
+    + f" ELSE {RATING_BANDS[-1][0]} END"
+)
+
+# Rollup table schemas, at the grain of the star schema's keys. Both are
+# keyed by day first so a refresh can replace whole days and date-range
+# reads are index range scans. Like the facts, they are partitioned by
+# month; rollups of archived months stay, so the history remains visible.
+ROLLUP_TABLES = {
+    "daily_sales_rollup": """
+        CREATE TABLE IF NOT EXISTS daily_sales_rollup (
+            date_key INTEGER,
+            store_key INTEGER,
+            payment_key INTEGER,
+            transaction_count INTEGER,
+            item_count INTEGER,
+            subtotal REAL,
+            tax REAL,
+            gross_income REAL,
+            PRIMARY KEY (date_key, store_key, payment_key)
+        )
+    """,
+    "daily_item_rollup": """
+        CREATE TABLE IF NOT EXISTS daily_item_rollup (
+            date_key INTEGER,
+            store_key INTEGER,
+            payment_key INTEGER,
+            product_key INTEGER,
+            rating_key INTEGER,
+            line_count INTEGER,
+            quantity INTEGER,
+            item_total REAL,
+            rating_sum REAL,
+            PRIMARY KEY (date_key, store_key, payment_key, product_key, rating_key)
+        )
+    """,
+}
+
+# Aggregations over the fact tables; {where} restricts the days rebuilt.
+# Each is routed to one month's fact partitions at a time.
+ROLLUP_SELECTS = {
+    "daily_sales_rollup": """
+        SELECT
+            t.date_key,
+            t.store_key,
+            t.payment_key,
+            COUNT(*),
+            SUM(t.num_items),
+            SUM(t.subtotal),
+            SUM(t.tax),
+            SUM(t.gross_income)
+        FROM fact_transactions t
+        {where}
+        GROUP BY t.date_key, t.store_key, t.payment_key
+    """,
+    "daily_item_rollup": f"""
+        SELECT
+            t.date_key,
+            t.store_key,
+            t.payment_key,
+            i.product_key,
+            {RATING_KEY_SQL},
+            COUNT(*),
+            SUM(i.quantity),
+            SUM(i.item_total),
+            SUM(i.rating)
+        FROM fact_transaction_items i
+        JOIN fact_transactions t ON t.transaction_key = i.transaction_key
+        {{where}}
+        GROUP BY 1, 2, 3, 4, 5
+    """,
+}
+
+
+def rollups_exist(conn):
+    """Whether every rollup table is present in the database"""
+    placeholders = ", ".join("?" * len(ROLLUP_TABLES))
+    (count,) = conn.execute(
+        f"SELECT COUNT(*) FROM sqlite_master WHERE type IN ('table', 'view') "
+        f"AND name IN ({placeholders})",
+        list(ROLLUP_TABLES),
+    ).fetchone()
+    return count == len(ROLLUP_TABLES)
+
+
+def _fill_month(conn, table, month, days=None):
+    """Recompute a rollup's partition for one month, or for the days of
+    that month listed in the ``days`` table"""
+    partition = ensure_partition(conn, table, ROLLUP_TABLES[table], month)
+    days_filter = f"date_key IN (SELECT date_key FROM {days})" if days else "true"
+    conn.execute(f"DELETE FROM {partition} WHERE {days_filter}")
+    where = f"WHERE t.{days_filter}" if days else ""
+
+    facts = [(fact, m) for fact, m in live_partitions(conn) if fact in FACT_TABLES]
+    select = route(ROLLUP_SELECTS[table].format(where=where), facts, (month, month))
+    conn.execute(f"INSERT INTO {partition} {select}")
+
+
+def _bump_rollups(conn, months):
+    bump_data_versions(
+        conn,
+        list(ROLLUP_TABLES)
+        + [partition_name(table, month) for table in ROLLUP_TABLES for month in months],
+    )
+
+
+def build_rollups(conn):
+    """Rebuild the rollups of every month whose facts are in the database"""
+    start = time.perf_counter()
+    create_partitioned(conn, ROLLUP_TABLES)
+    months = partition_months(conn, "fact_transactions")
+    for month in months:
+        for table in ROLLUP_TABLES:
+            _fill_month(conn, table, month)
+    _bump_rollups(conn, months)
+    conn.commit()
+    print(f"Rollups built in {time.perf_counter() - start:.2f}s")
+
+
+def refresh_rollups(conn, dates_table):
+    """Recompute the rollup rows for the days listed in ``dates_table``
+
+    ``dates_table`` holds a single ``date_key`` column with every day touched
+    by a load, so the work is proportional to those days, and only their
+    months' partitions are read. The caller commits.
+    """
+    create_partitioned(conn, ROLLUP_TABLES)
+    months = [
+        month
+        for (month,) in conn.execute(
+            f"SELECT DISTINCT date_key / 100 FROM {dates_table}"
+        ).fetchall()
+    ]
+    for month in months:
+        for table in ROLLUP_TABLES:
+            _fill_month(conn, table, month, dates_table)
+    _bump_rollups(conn, months)
@@ -1,137 +1,722 @@
-import sqlite3
-import pandas as pd
+import argparse
+import glob
+import hashlib
 import os
+import sys
+import time
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
 
-def create_realistic_database():
-    """Create SQLite database and load realistic data"""
+from aggregations import (
+    Z_95,
+    DashboardFilters,
+    add_filter_arguments,
+    check_date_range,
+    filters_from_args,
+)
+from approximate import build_approximate, refresh_approximate
+from customer_features import (
+    build_customer_features,
+    customer_features_exist,
+    refresh_customer_features,
+)
+from backends import open_backend
+from bulk_loader import (
+    bulk_insert,
+    bulk_insert_partitioned,
+    bulk_load_settings,
+    iter_csv_frames,
+    iter_parquet_frames,
+    report_load,
+)
+from data_versions import LOADED_TABLES, bump_data_versions
+from db_pool import DB_PATH, PROFILES, connect_writer, set_profile
+from instrumentation import add_trace_arguments, enable_tracing_from_args, stage, traced
+from partitions import (
+    TransactionMonths,
+    archive_partitions,
+    ensure_partition,
+    month_of,
+    partition_months,
+    partition_name,
+    partition_tables,
+)
+from rollups import build_rollups, refresh_rollups, rollups_exist
+from star_schema import (
+    COMPATIBILITY_VIEWS,
+    FACT_COLUMNS,
+    FACT_FOR_SOURCE,
+    FACT_TABLES,
+    StarEncoder,
+    create_star_schema,
+    date_key,
+)
 
-    # Remove existing database
-    if os.path.exists("database/supermarket.db"):
-        os.remove("database/supermarket.db")
+PARQUET_DIR = "data/parquet"
+
+TRANSACTION_COLUMNS = [
+    "transaction_id",
+    "date",
+    "time",
+    "city",
+    "store",
+    "customer_id",
+    "payment_method",
+    "num_items",
+    "subtotal",
+    "tax",
+    "gross_income",
+]
+ITEM_COLUMNS = [
+    "transaction_id",
+    "product",
+    "category",
+    "quantity",
+    "unit_price",
+    "item_total",
+    "rating",
+]
+
+# Secondary indexes of every fact partition: (name, table, column). Line
+# items need none for their transaction: they are clustered on its key.
+FACT_INDEXES = [
+    ("idx_transactions_date", "fact_transactions", "date_key"),
+    ("idx_transactions_store", "fact_transactions", "store_key"),
+    ("idx_transactions_payment", "fact_transactions", "payment_key"),
+    ("idx_items_product", "fact_transaction_items", "product_key"),
+]
+
+
+def source_path(table, source="csv"):
+    """Default location of a table's CSV file or Parquet dataset"""
+    if source == "parquet":
+        return f"{PARQUET_DIR}/{table}"
+    return f"data/{table}.csv"
+
+
+def iter_source_frames(table, source="csv", path=None):
+    """Lazily read a table from the CSV or Parquet files in pandas chunks"""
+    path = path or source_path(table, source)
+    if source == "parquet":
+        columns = TRANSACTION_COLUMNS if table == "transactions" else ITEM_COLUMNS
+        return iter_parquet_frames(path, columns)
+    return iter_csv_frames(path)
 
-    # Create database connection
-    conn = sqlite3.connect("database/supermarket.db")
-    cursor = conn.cursor()
 
-    # Create tables
+def create_tables(cursor):
+    """Create the star schema and the ingest manifest"""
+    create_star_schema(cursor)
+
+    # One row per ingested batch, so re-running a load is a no-op
     cursor.execute("""
-        CREATE TABLE transactions (
-            transaction_id TEXT PRIMARY KEY,
-            date TEXT,
-            time TEXT,
-            city TEXT,
-            store TEXT,
-            customer_id TEXT,
-            payment_method TEXT,
-            num_items INTEGER,
-            subtotal REAL,
-            tax REAL,
-            gross_income REAL
+        CREATE TABLE IF NOT EXISTS ingest_manifest (
+            batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fingerprint TEXT UNIQUE,
+            source TEXT,
+            date_from TEXT,
+            date_to TEXT,
+            transactions INTEGER,
+            items INTEGER,
+            ingested_at TEXT DEFAULT CURRENT_TIMESTAMP
         )
     """)
 
-    cursor.execute("""
-        CREATE TABLE transaction_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transaction_id TEXT,
-            product TEXT,
-            category TEXT,
-            quantity INTEGER,
-            unit_price REAL,
-            item_total REAL,
-            rating REAL,
-            FOREIGN KEY (transaction_id) REFERENCES transactions (transaction_id)
+
+def create_indexes(cursor):
+    """Create the secondary indexes of every fact partition"""
+    for index, table, column in FACT_INDEXES:
+        for month in partition_months(cursor, table):
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {partition_name(index, month)} "
+                f"ON {partition_name(table, month)}({column})"
+            )
+
+
+def batch_fingerprint(paths, date_from=None, date_to=None):
+    """Hash the batch files' contents together with the requested date range"""
+    digest = hashlib.sha256(f"{date_from}|{date_to}".encode())
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "**", "*"), recursive=True))
+        else:
+            files = [path]
+        for name in files:
+            if os.path.isfile(name):
+                with open(name, "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+    return digest.hexdigest()
+
+
+def record_batch(
+    conn, fingerprint, source, date_from, date_to, counts, months=None, dimensions=()
+):
+    """Add a batch to the ingest manifest and bump the data versions of the
+    tables it changed
+
+    A full load (no ``months``) changes every loaded table. An increment
+    changes the fact tables, their views and partitions of ``months``, and
+    the ``dimensions`` that gained rows; the rollups, sample and customer
+    features bump their own versions when they are refreshed. Cached
+    queries over other months and unchanged dimensions stay valid.
+    """
+    if months is None:
+        tables = LOADED_TABLES + partition_tables(conn)
+    else:
+        tables = [
+            *FACT_TABLES,
+            *COMPATIBILITY_VIEWS,
+            *dimensions,
+            *partition_tables(conn, months),
+        ]
+    bump_data_versions(conn, tables)
+    conn.execute(
+        """
+        INSERT INTO ingest_manifest
+            (fingerprint, source, date_from, date_to, transactions, items)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (
+            fingerprint,
+            source,
+            date_from,
+            date_to,
+            counts["transactions"],
+            counts["transaction_items"],
+        ),
+    )
+
+
+@traced()
+def optimize_database(conn):
+    """Refresh planner statistics and rewrite the file compactly"""
+    start = time.perf_counter()
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.execute("VACUUM")
+    print(f"Database analyzed and vacuumed in {time.perf_counter() - start:.2f}s")
+
+
+@traced()
+def create_realistic_database(source="csv", optimize=False):
+    """Create SQLite database and bulk-load realistic data
+
+    The page size comes from the active performance profile. ``optimize``
+    runs ANALYZE and VACUUM once the load is complete. The database is
+    built in a temporary file that replaces the existing one only once the
+    load has succeeded, so a failed load leaves the old database in place.
+    """
+    building = DB_PATH + ".building"
+    remove_database_files(building)
+    try:
+        counts = _fill_database(building, source, optimize)
+    except BaseException:
+        remove_database_files(building)
+        raise
+
+    # The old database's WAL must not outlive it into the new file
+    remove_database_files(DB_PATH, main=False)
+    os.replace(building, DB_PATH)
+
+    print("Realistic database created successfully!")
+    print(f"Transactions: {counts['transactions']} records")
+    print(f"Items: {counts['transaction_items']} records")
+
+
+def remove_database_files(path, main=True):
+    """Delete a database file, unless ``main`` is false, and its WAL files"""
+    for name in ([path] if main else []) + [path + "-wal", path + "-shm"]:
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _fill_database(db_path, source, optimize):
+    """Create and load the database at ``db_path``; returns the row counts"""
+    conn = connect_writer(db_path, new_database=True)
+    cursor = conn.cursor()
+
+    with bulk_load_settings(conn):
+        # Create tables
+        create_tables(cursor)
+
+        # Stream realistic data in batches, swapping labels for keys, into
+        # monthly partitions. Line items go to their transaction's month.
+        encoder = StarEncoder(conn)
+        months = TransactionMonths()
+        months_of = {
+            "transactions": lambda frame: months.add(
+                frame["transaction_key"].to_numpy(),
+                frame["date_key"].to_numpy() // 100,
+            ),
+            "transaction_items": lambda frame: months.of(
+                frame["transaction_key"].to_numpy()
+            ),
+        }
+        counts = {}
+        for table, fact in FACT_FOR_SOURCE.items():
+            with stage(f"load:{table}", source=source) as info:
+                counts[table], seconds = bulk_insert_partitioned(
+                    conn,
+                    fact,
+                    FACT_TABLES[fact],
+                    FACT_COLUMNS[fact],
+                    encoder.encode(table, iter_source_frames(table, source)),
+                    months_of[table],
+                )
+                info["rows"] = counts[table]
+            report_load(table, counts[table], seconds)
+        encoder.save(conn)
+
+        # Create indexes once the tables are filled
+        start = time.perf_counter()
+        with stage("create_indexes"):
+            create_indexes(cursor)
+            conn.commit()
+        print(f"Indexes built in {time.perf_counter() - start:.2f}s")
+
+        # Pre-aggregate the dashboard rollups
+        with stage("build_rollups"):
+            build_rollups(conn)
+        with stage("build_approximate"):
+            build_approximate(conn)
+        with stage("build_customer_features"):
+            build_customer_features(conn)
+
+        date_from, date_to = cursor.execute(
+            "SELECT MIN(date), MAX(date) FROM dim_date"
+        ).fetchone()
+        paths = [source_path(table, source) for table in counts]
+        record_batch(
+            conn,
+            batch_fingerprint(paths),
+            f"{source}:{paths[0]}",
+            date_from,
+            date_to,
+            counts,
         )
-    """)
 
-    # Load realistic data
-    transactions_df = pd.read_csv("data/transactions.csv")
-    items_df = pd.read_csv("data/transaction_items.csv")
+    if optimize:
+        optimize_database(conn)
+    conn.close()
+    return counts
+
+
+@traced()
+def ingest_incremental(
+    transactions_path,
+    items_path,
+    source="csv",
+    date_from=None,
+    date_to=None,
+):
+    """Upsert one batch of new transactions into the existing database
 
-    # Insert data
-    transactions_df.to_sql("transactions", conn, if_exists="append", index=False)
-    items_df.to_sql("transaction_items", conn, if_exists="append", index=False)
+    The batch is staged in temp tables, optionally trimmed to
+    ``date_from``..``date_to``, then upserted on the transaction key: any
+    existing copy of a transaction and its line items is removed from its
+    month's partitions before the batch is added to its own. Batches already
+    in ``ingest_manifest`` are skipped. Rollups are refreshed for the
+    affected days only, so the cost of a refresh follows the size of the
+    batch, not of the history.
+    """
+    fingerprint = batch_fingerprint([transactions_path, items_path], date_from, date_to)
 
-    # Create indexes for better performance
-    cursor.execute("CREATE INDEX idx_transactions_date ON transactions(date)")
-    cursor.execute("CREATE INDEX idx_transactions_city ON transactions(city)")
+    conn = connect_writer()
+    cursor = conn.cursor()
+    if cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'"
+    ).fetchone():
+        conn.close()
+        raise ValueError(
+            f"{DB_PATH} predates the star schema; rebuild it with "
+            "setup_realistic_database.py before loading increments"
+        )
+    create_tables(cursor)
+
+    if cursor.execute(
+        "SELECT 1 FROM ingest_manifest WHERE fingerprint = ?", (fingerprint,)
+    ).fetchone():
+        print(f"Batch {transactions_path} already ingested, skipping")
+        conn.close()
+        return None
+
+    # Stage the batch in temp tables shaped like the fact tables. New
+    # labels get their dimension keys as they stream in.
     cursor.execute(
-        "CREATE INDEX idx_transactions_payment ON transactions(payment_method)"
+        "CREATE TEMP TABLE stage_transactions AS "
+        "SELECT * FROM fact_transactions WHERE 0"
+    )
+    cursor.execute(
+        "CREATE TEMP TABLE stage_items AS SELECT * FROM fact_transaction_items WHERE 0"
+    )
+    encoder = StarEncoder(conn)
+    for table, staging, path in (
+        ("transactions", "stage_transactions", transactions_path),
+        ("transaction_items", "stage_items", items_path),
+    ):
+        count, seconds = bulk_insert(
+            conn,
+            f"temp.{staging}",
+            FACT_COLUMNS[FACT_FOR_SOURCE[table]],
+            encoder.encode(table, iter_source_frames(table, source, path)),
+        )
+        report_load(f"{table} (staged)", count, seconds)
+    new_dimensions = encoder.save(conn)
+
+    # Keep only the requested date range
+    cursor.execute(
+        "DELETE FROM stage_transactions WHERE date_key < COALESCE(?, date_key) "
+        "OR date_key > COALESCE(?, date_key)",
+        (date_from and date_key(date_from), date_to and date_key(date_to)),
+    )
+    cursor.execute(
+        "DELETE FROM stage_items WHERE transaction_key NOT IN "
+        "(SELECT transaction_key FROM stage_transactions)"
+    )
+
+    columns = ", ".join(FACT_COLUMNS["fact_transactions"])
+    item_columns = ", ".join(FACT_COLUMNS["fact_transaction_items"])
+    staged_items = ", ".join(
+        f"i.{column}" for column in FACT_COLUMNS["fact_transaction_items"]
     )
-    cursor.execute("CREATE INDEX idx_items_category ON transaction_items(category)")
-    cursor.execute("CREATE INDEX idx_items_rating ON transaction_items(rating)")
 
+    # Days whose rollups change: the batch's days plus the old days of any
+    # transaction being overwritten
+    cursor.execute("""
+        CREATE TEMP TABLE affected_dates AS
+        SELECT date_key FROM stage_transactions
+        UNION
+        SELECT date_key FROM fact_transactions
+        WHERE transaction_key IN (SELECT transaction_key FROM stage_transactions)
+    """)
+    # Customers whose features change, found the same way
+    cursor.execute("""
+        CREATE TEMP TABLE affected_customers AS
+        SELECT customer_key FROM stage_transactions
+        UNION
+        SELECT customer_key FROM fact_transactions
+        WHERE transaction_key IN (SELECT transaction_key FROM stage_transactions)
+    """)
+    months = [
+        month
+        for (month,) in cursor.execute(
+            "SELECT DISTINCT date_key / 100 FROM affected_dates"
+        ).fetchall()
+    ]
+
+    # Upsert the transactions and replace their line items atomically, one
+    # affected month's partitions at a time
+    counts = {"transactions": 0, "transaction_items": 0}
+    start = time.perf_counter()
+    for month in months:
+        transactions, items = (
+            ensure_partition(conn, fact, FACT_TABLES[fact], month)
+            for fact in FACT_TABLES
+        )
+        for partition in (transactions, items):
+            cursor.execute(f"""
+                DELETE FROM {partition}
+                WHERE transaction_key IN (SELECT transaction_key FROM stage_transactions)
+            """)
+        cursor.execute(
+            f"INSERT INTO {transactions} ({columns}) "
+            f"SELECT {columns} FROM stage_transactions WHERE date_key / 100 = ?",
+            (month,),
+        )
+        counts["transactions"] += cursor.rowcount
+        cursor.execute(
+            f"INSERT INTO {items} ({item_columns}) "
+            f"SELECT {staged_items} FROM stage_items i "
+            "JOIN stage_transactions s "
+            "ON s.transaction_key = i.transaction_key WHERE s.date_key / 100 = ?",
+            (month,),
+        )
+        counts["transaction_items"] += cursor.rowcount
+    create_indexes(cursor)
+    has_rollups = rollups_exist(conn)
+    if has_rollups:
+        refresh_rollups(conn, "affected_dates")
+        refresh_approximate(conn, "affected_dates")
+    has_customer_features = customer_features_exist(conn)
+    if has_customer_features:
+        refresh_customer_features(conn, "affected_dates", "affected_customers")
+
+    batch_from, batch_to = cursor.execute("""
+        SELECT MIN(d.date), MAX(d.date)
+        FROM stage_transactions s
+        JOIN dim_date d ON d.date_key = s.date_key
+    """).fetchone()
+    record_batch(
+        conn,
+        fingerprint,
+        f"{source}:{transactions_path}",
+        batch_from,
+        batch_to,
+        counts,
+        months,
+        new_dimensions,
+    )
     conn.commit()
+
+    # A database built before rollups or customer features existed gets
+    # them in full once
+    if not has_rollups:
+        build_rollups(conn)
+        build_approximate(conn)
+    if not has_customer_features:
+        build_customer_features(conn)
     conn.close()
 
-    print("Realistic database created successfully!")
-    print(f"Transactions: {len(transactions_df)} records")
-    print(f"Items: {len(items_df)} records")
+    print(
+        f"Ingested {counts['transactions']} transactions and "
+        f"{counts['transaction_items']} items ({batch_from} to {batch_to}) "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return counts
 
 
-def run_realistic_queries():
-    """Run sample queries to verify realistic data"""
-    conn = sqlite3.connect("database/supermarket.db")
+@traced()
+def archive_old_months(before):
+    """Move the fact partitions of months before ``before`` (YYYY-MM) into
+    one archive file per month
 
-    # Total sales by payment method
-    payment_stats = pd.read_sql_query(
-        """
-        SELECT 
-            payment_method,
-            COUNT(*) as transaction_count,
-            SUM(gross_income) as total_revenue,
-            ROUND(SUM(gross_income) * 100.0 / (SELECT SUM(gross_income) FROM transactions), 1) as revenue_percentage
-        FROM transactions
-        GROUP BY payment_method
-        ORDER BY total_revenue DESC
-    """,
+    Their rollups stay in the database, so the dashboard keeps the full
+    history; only row-level queries lose the archived months.
+    """
+    conn = connect_writer()
+    archived = archive_partitions(conn, FACT_TABLES, month_of(before))
+    # Only row-level reads change; the rollups keep the archived months
+    bump_data_versions(
         conn,
+        [*FACT_TABLES, *COMPATIBILITY_VIEWS]
+        + [partition_name(table, month) for table in FACT_TABLES for month in archived],
     )
+    conn.commit()
+    conn.close()
+    print(f"Archived {len(archived)} months: {', '.join(map(str, archived))}")
+    return archived
 
-    print("\nPayment Method Analysis:")
-    print(payment_stats)
 
+# Sample queries printed after every load, keyed by their report heading.
+# {where} takes the predicates of a ``DashboardFilters``; see report_queries.
+# Reports over the whole history, read from the daily rollups: they hold
+# the same totals as the facts and take the dashboard's filters, at a few
+# rows per day instead of one per transaction or line item
+SAMPLE_QUERIES = {
+    # Total sales by payment method
+    "Payment Method Analysis": """
+        SELECT
+            p.payment_method,
+            r.transaction_count,
+            r.total_revenue,
+            ROUND(r.total_revenue * 100.0 / SUM(r.total_revenue) OVER (), 1) as revenue_percentage
+        FROM (
+            SELECT
+                payment_key,
+                SUM(transaction_count) as transaction_count,
+                SUM(gross_income) as total_revenue
+            FROM daily_sales_rollup
+            {where}
+            GROUP BY payment_key
+        ) r
+        JOIN dim_payment p ON p.payment_key = r.payment_key
+        ORDER BY r.total_revenue DESC
+    """,
     # Top performing products
-    top_products = pd.read_sql_query(
-        """
-        SELECT 
-            product,
-            category,
-            SUM(quantity) as total_quantity,
-            SUM(item_total) as total_revenue,
-            AVG(rating) as avg_rating
-        FROM transaction_items
-        GROUP BY product, category
+    "Top 10 Products by Revenue": """
+        SELECT
+            p.product,
+            p.category,
+            r.total_quantity,
+            r.total_revenue,
+            r.avg_rating
+        FROM (
+            SELECT
+                product_key,
+                SUM(quantity) as total_quantity,
+                SUM(item_total) as total_revenue,
+                SUM(rating_sum) / SUM(line_count) as avg_rating
+            FROM daily_item_rollup
+            {where}
+            GROUP BY product_key
+            ORDER BY total_revenue DESC
+            LIMIT 10
+        ) r
+        JOIN dim_product p ON p.product_key = r.product_key
+        ORDER BY r.total_revenue DESC
+    """,
+    # Sales by city
+    "Sales by City": """
+        SELECT
+            s.city,
+            SUM(r.transaction_count) as transaction_count,
+            SUM(r.total_revenue) as total_revenue
+        FROM (
+            SELECT
+                store_key,
+                SUM(transaction_count) as transaction_count,
+                SUM(gross_income) as total_revenue
+            FROM daily_sales_rollup
+            {where}
+            GROUP BY store_key
+        ) r
+        JOIN dim_store s ON s.store_key = r.store_key
+        GROUP BY s.city
         ORDER BY total_revenue DESC
-        LIMIT 10
     """,
-        conn,
-    )
+}
 
-    print("\nTop 10 Products by Revenue:")
-    print(top_products)
 
-    # Sales by city
-    city_stats = pd.read_sql_query(
-        """
-        SELECT 
-            city,
-            COUNT(DISTINCT transaction_id) as transaction_count,
-            SUM(gross_income) as total_revenue
-        FROM transactions
-        GROUP BY city
-        ORDER BY total_revenue DESC
+# Line-item reports answered from the stored sample in approximate mode.
+# Weighted sums estimate the totals; revenue_variance is the
+# Horvitz-Thompson variance of the sampled lines, turned into a 95% bound
+# in Python because SQLite only has SQRT when built with its math
+# functions.
+APPROXIMATE_QUERIES = {
+    "Top 10 Products by Revenue": """
+        SELECT
+            p.product,
+            p.category,
+            r.total_quantity,
+            r.total_revenue,
+            r.revenue_variance,
+            r.avg_rating
+        FROM (
+            SELECT
+                product_key,
+                ROUND(SUM(weight * quantity)) as total_quantity,
+                SUM(weight * item_total) as total_revenue,
+                SUM((weight * weight - weight) * item_total * item_total)
+                    as revenue_variance,
+                SUM(weight * rating) / SUM(weight) as avg_rating
+            FROM sample_items
+            {where}
+            GROUP BY product_key
+            ORDER BY total_revenue DESC
+            LIMIT 10
+        ) r
+        JOIN dim_product p ON p.product_key = r.product_key
+        ORDER BY r.total_revenue DESC
     """,
-        conn,
-    )
+}
 
-    print("\nSales by City:")
-    print(city_stats)
 
-    conn.close()
+def report_queries(filters=None, approximate=False):
+    """``{title: (sql, params)}`` of the sample queries narrowed to a slice
+
+    ``approximate`` answers line-item reports from the stored sample
+    instead of the rollups; both take the filters directly.
+    """
+    filters = filters or DashboardFilters()
+    queries = {}
+    for title, sql in SAMPLE_QUERIES.items():
+        if approximate and title in APPROXIMATE_QUERIES:
+            sql = APPROXIMATE_QUERIES[title]
+        where, params = filters.where(items="daily_sales_rollup" not in sql)
+        queries[title] = (sql.format(where=where), params)
+    return queries
+
+
+@traced()
+def run_realistic_queries(backend="sqlite", filters=None, approximate=False):
+    """Run sample queries to verify realistic data, optionally on a slice
+    or with line-item reports estimated from the stored sample"""
+    engine = open_backend(backend)
+    filters = filters or DashboardFilters()
+    if filters != DashboardFilters():
+        print(f"\nReports for: {filters.label}")
+
+    for title, (query, params) in report_queries(filters, approximate).items():
+        print(f"\n{title}:")
+        start = time.perf_counter()
+        with stage(f"query:{title}", backend=engine.name) as info:
+            query = engine.route(query, filters.date_from, filters.date_to)
+            result = engine.read_sql(query, params)
+            info["rows"] = len(result)
+        if "revenue_variance" in result:
+            result["revenue_variance"] = Z_95 * result["revenue_variance"] ** 0.5
+            result = result.rename(columns={"revenue_variance": "revenue_error"})
+        print(result)
+        print(f"({engine.name}: {(time.perf_counter() - start) * 1000:.1f} ms)")
+
+    engine.close()
 
 
 if __name__ == "__main__":
-    create_realistic_database()
-    run_realistic_queries()
+    parser = argparse.ArgumentParser(description="Build the supermarket database")
+    parser.add_argument(
+        "--source",
+        choices=["csv", "parquet"],
+        default="csv",
+        help="load from data/*.csv or the partitioned data/parquet datasets",
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs=2,
+        metavar=("TRANSACTIONS", "ITEMS"),
+        help="upsert one batch of transaction and item files instead of rebuilding",
+    )
+    parser.add_argument(
+        "--since", help="first date (YYYY-MM-DD) to ingest and to report on"
+    )
+    parser.add_argument(
+        "--until", help="last date (YYYY-MM-DD) to ingest and to report on"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["sqlite", "duckdb"],
+        default="sqlite",
+        help="query engine for the sample report queries",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES),
+        help="performance profile for every connection (default: balanced)",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="run ANALYZE and VACUUM after a full load",
+    )
+    parser.add_argument(
+        "--archive-before",
+        metavar="YYYY-MM",
+        help="move fact partitions of earlier months to database/archive/",
+    )
+    parser.add_argument(
+        "--advise-indexes",
+        action="store_true",
+        help="run the index advisor over the query workload after loading",
+    )
+    parser.add_argument(
+        "--approximate",
+        action="store_true",
+        help="estimate line-item reports from the stored sample, with error bounds",
+    )
+    add_filter_arguments(parser, dates=False)
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    check_date_range(parser, args)
+    if args.profile:
+        set_profile(args.profile)
+    enable_tracing_from_args(args)
+
+    if args.incremental:
+        ingest_incremental(
+            *args.incremental,
+            source=args.source,
+            date_from=args.since,
+            date_to=args.until,
+        )
+    elif not args.archive_before:
+        create_realistic_database(args.source, args.optimize)
+    if args.archive_before:
+        archive_old_months(args.archive_before)
+
+    if args.advise_indexes:
+        from index_advisor import advise
+
+        advise()
+    run_realistic_queries(args.backend, filters_from_args(args), args.approximate)
@@ -0,0 +1,331 @@
+from datetime import date as Date
+
+import numpy as np
+import pandas as pd
+
+from partitions import TransactionValues, create_partitioned
+
+# Transaction ids are the generator's "TXN<number>"; the number itself is
+# the integer key of a transaction
+TRANSACTION_PREFIX = "TXN"
+
+# Dimension tables: every distinct label is stored once, under a small
+# integer key. Each entry is (key column, natural key columns, DDL).
+DIMENSIONS = {
+    "dim_date": (
+        "date_key",
+        ["date"],
+        """
+        CREATE TABLE IF NOT EXISTS dim_date (
+            date_key INTEGER PRIMARY KEY,
+            date TEXT UNIQUE,
+            year INTEGER,
+            month INTEGER,
+            day INTEGER,
+            weekday INTEGER
+        )
+        """,
+    ),
+    "dim_store": (
+        "store_key",
+        ["city", "store"],
+        """
+        CREATE TABLE IF NOT EXISTS dim_store (
+            store_key INTEGER PRIMARY KEY,
+            city TEXT,
+            store TEXT,
+            UNIQUE (city, store)
+        )
+        """,
+    ),
+    "dim_payment": (
+        "payment_key",
+        ["payment_method"],
+        """
+        CREATE TABLE IF NOT EXISTS dim_payment (
+            payment_key INTEGER PRIMARY KEY,
+            payment_method TEXT UNIQUE
+        )
+        """,
+    ),
+    "dim_customer": (
+        "customer_key",
+        ["customer_id"],
+        """
+        CREATE TABLE IF NOT EXISTS dim_customer (
+            customer_key INTEGER PRIMARY KEY,
+            customer_id TEXT UNIQUE
+        )
+        """,
+    ),
+    "dim_product": (
+        "product_key",
+        ["product", "category"],
+        """
+        CREATE TABLE IF NOT EXISTS dim_product (
+            product_key INTEGER PRIMARY KEY,
+            product TEXT,
+            category TEXT,
+            UNIQUE (product, category)
+        )
+        """,
+    ),
+}
+
+# Rating buckets the dashboard shows, best first, with their lower bounds
+RATING_BANDS = [
+    (1, "High (4.5-5.0)", 4.5),
+    (2, "Good (4.0-4.4)", 4.0),
+    (3, "Average (3.5-3.9)", 3.5),
+    (4, "Low (3.0-3.4)", None),
+]
+RATING_DDL = """
+    CREATE TABLE IF NOT EXISTS dim_rating (
+        rating_key INTEGER PRIMARY KEY,
+        rating_category TEXT
+    )
+"""
+
+# Fact tables hold only keys and measures. Line items are clustered on
+# their transaction, so a transaction's lines sit together on disk. Both
+# are partitioned by month (see partitions.py); a transaction's line items
+# live in the partition of its date.
+FACT_TABLES = {
+    "fact_transactions": """
+        CREATE TABLE IF NOT EXISTS fact_transactions (
+            transaction_key INTEGER PRIMARY KEY,
+            date_key INTEGER,
+            time TEXT,
+            store_key INTEGER,
+            customer_key INTEGER,
+            payment_key INTEGER,
+            num_items INTEGER,
+            subtotal REAL,
+            tax REAL,
+            gross_income REAL
+        )
+    """,
+    "fact_transaction_items": """
+        CREATE TABLE IF NOT EXISTS fact_transaction_items (
+            transaction_key INTEGER,
+            line INTEGER,
+            product_key INTEGER,
+            quantity INTEGER,
+            unit_price REAL,
+            item_total REAL,
+            rating REAL,
+            PRIMARY KEY (transaction_key, line)
+        ) WITHOUT ROWID
+    """,
+}
+FACT_COLUMNS = {
+    "fact_transactions": [
+        "transaction_key",
+        "date_key",
+        "time",
+        "store_key",
+        "customer_key",
+        "payment_key",
+        "num_items",
+        "subtotal",
+        "tax",
+        "gross_income",
+    ],
+    "fact_transaction_items": [
+        "transaction_key",
+        "line",
+        "product_key",
+        "quantity",
+        "unit_price",
+        "item_total",
+        "rating",
+    ],
+}
+
+# Dimension table of each key column in the fact tables
+DIMENSION_OF_KEY = {key: table for table, (key, _, _) in DIMENSIONS.items()}
+
+# Fact table loaded from each source table
+FACT_FOR_SOURCE = {
+    "transactions": "fact_transactions",
+    "transaction_items": "fact_transaction_items",
+}
+
+# The original flat tables, as views over the star schema. Their text
+# transaction ids are computed, so no index can serve a join on them: join
+# the two views on their integer transaction_key instead.
+COMPATIBILITY_VIEWS = {
+    "transactions": f"""
+        CREATE VIEW IF NOT EXISTS transactions AS
+        SELECT
+            '{TRANSACTION_PREFIX}' || t.transaction_key as transaction_id,
+            t.transaction_key,
+            d.date,
+            t.time,
+            s.city,
+            s.store,
+            c.customer_id,
+            p.payment_method,
+            t.num_items,
+            t.subtotal,
+            t.tax,
+            t.gross_income
+        FROM fact_transactions t
+        JOIN dim_date d ON d.date_key = t.date_key
+        JOIN dim_store s ON s.store_key = t.store_key
+        JOIN dim_customer c ON c.customer_key = t.customer_key
+        JOIN dim_payment p ON p.payment_key = t.payment_key
+    """,
+    "transaction_items": f"""
+        CREATE VIEW IF NOT EXISTS transaction_items AS
+        SELECT
+            '{TRANSACTION_PREFIX}' || i.transaction_key as transaction_id,
+            i.transaction_key,
+            p.product,
+            p.category,
+            i.quantity,
+            i.unit_price,
+            i.item_total,
+            i.rating
+        FROM fact_transaction_items i
+        JOIN dim_product p ON p.product_key = i.product_key
+    """,
+}
+
+
+def date_key(date):
+    """Integer key of a ``YYYY-MM-DD`` date, e.g. 20240131; keys sort like dates"""
+    return int(date.replace("-", ""))
+
+
+def transaction_keys(transaction_ids):
+    """Integer keys of a Series of ``TXN<number>`` transaction ids"""
+    transaction_ids = transaction_ids.astype(str)
+    numbers = transaction_ids.str.slice(len(TRANSACTION_PREFIX))
+    valid = transaction_ids.str.startswith(TRANSACTION_PREFIX) & numbers.str.isdigit()
+    if not valid.all():
+        raise ValueError(
+            f"Unexpected transaction id {transaction_ids[~valid].iloc[0]!r}"
+        )
+    return numbers.astype(np.int64).to_numpy()
+
+
+def create_star_schema(cursor):
+    """Create the dimension tables, the partitioned fact tables' catalog
+    and views, and the compatibility views"""
+    for _, _, ddl in DIMENSIONS.values():
+        cursor.execute(ddl)
+    cursor.execute(RATING_DDL)
+    cursor.executemany(
+        "INSERT OR IGNORE INTO dim_rating VALUES (?, ?)",
+        [(key, label) for key, label, _ in RATING_BANDS],
+    )
+    create_partitioned(cursor, FACT_TABLES)
+    for ddl in COMPATIBILITY_VIEWS.values():
+        cursor.execute(ddl)
+
+
+class StarEncoder:
+    """Replace the labels of source frames with dimension keys
+
+    Existing keys are read from the dimension tables up front; labels seen
+    for the first time get the next free key and are written by ``save``.
+    Frames are encoded a column at a time, so Python only touches each
+    distinct label of a frame, not each row. Line items are numbered in
+    arrival order within their transaction, wherever in the stream its
+    lines appear.
+    """
+
+    def __init__(self, conn):
+        self.lines = TransactionValues()
+        self.keys = {}
+        self.next_key = {}
+        self.new_rows = {table: [] for table in DIMENSIONS}
+        for table, (key, natural, _) in DIMENSIONS.items():
+            rows = conn.execute(f"SELECT {key}, {', '.join(natural)} FROM {table}")
+            self.keys[table] = {tuple(labels): value for value, *labels in rows}
+            self.next_key[table] = max(self.keys[table].values(), default=0) + 1
+
+    def key(self, table, *labels):
+        """Key of a label, allocating one for a new label"""
+        keys = self.keys[table]
+        value = keys.get(labels)
+        if value is None:
+            if table == "dim_date":
+                value = date_key(labels[0])
+            else:
+                value = self.next_key[table]
+                self.next_key[table] += 1
+            keys[labels] = value
+            self.new_rows[table].append((value, *labels))
+        return value
+
+    def dimension_keys(self, table, frame):
+        """Keys of the labels of a frame's rows in one dimension"""
+        first, *rest = DIMENSIONS[table][1]
+        codes, labels = pd.factorize(frame[first])
+        labels = [(str(label),) for label in labels]
+        # Combine the codes of further columns into codes of distinct tuples
+        for column in rest:
+            column_codes, column_labels = pd.factorize(frame[column])
+            codes, pairs = pd.factorize(codes * len(column_labels) + column_codes)
+            labels = [
+                (
+                    *labels[pair // len(column_labels)],
+                    str(column_labels[pair % len(column_labels)]),
+                )
+                for pair in pairs
+            ]
+        keys = [self.key(table, *label) for label in labels]
+        return np.array(keys, dtype=np.int64)[codes]
+
+    def number_lines(self, transactions):
+        """Line numbers of line items, given their transaction keys"""
+        keys, positions, counts = np.unique(
+            transactions, return_inverse=True, return_counts=True
+        )
+        seen = self.lines[keys]
+        self.lines[keys] = seen + counts
+        within = pd.Series(transactions).groupby(transactions).cumcount()
+        return seen[positions] + within.to_numpy()
+
+    def encode(self, table, frames):
+        """Fact table frames, with ``FACT_COLUMNS``, for source frames"""
+        fact = FACT_FOR_SOURCE[table]
+        for frame in frames:
+            transactions = transaction_keys(frame["transaction_id"])
+            columns = {}
+            for column in FACT_COLUMNS[fact]:
+                if column == "transaction_key":
+                    columns[column] = transactions
+                elif column == "line":
+                    columns[column] = self.number_lines(transactions)
+                elif column in DIMENSION_OF_KEY:
+                    columns[column] = self.dimension_keys(
+                        DIMENSION_OF_KEY[column], frame
+                    )
+                else:
+                    columns[column] = frame[column].to_numpy()
+            yield pd.DataFrame(columns)
+
+    def save(self, conn):
+        """Insert the labels first seen since the last save and return the
+        dimensions that gained rows; caller commits"""
+        changed = []
+        for table, rows in self.new_rows.items():
+            if table == "dim_date":
+                rows = [(key, date, *_date_parts(date)) for key, date in rows]
+            if rows:
+                conn.executemany(
+                    f"INSERT INTO {table} VALUES ({', '.join('?' * len(rows[0]))})",
+                    rows,
+                )
+                changed.append(table)
+            self.new_rows[table] = []
+        return changed
+
+
+def _date_parts(date):
+    """Year, month, day and ISO weekday (Monday is 1) of a date"""
+    day = Date.fromisoformat(date)
+    return day.year, day.month, day.day, day.isoweekday()
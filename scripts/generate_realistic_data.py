@@ -1,195 +1,509 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+import argparse
 import os
+import shutil
+import sys
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
 
-def generate_realistic_sales_data(num_transactions=1200):
-    """Generate realistic supermarket sales data"""
+from instrumentation import add_trace_arguments, enable_tracing_from_args, stage
 
-    np.random.seed(42)
-    random.seed(42)
+# Store locations
+STORES = {
+    "NY": ["NY-Downtown", "NY-Uptown", "NY-Brooklyn"],
+    "LA": ["LA-Santa Monica", "LA-Beverly Hills", "LA-Downtown"],
+    "CH": ["CH-Loop", "CH-Lincoln Park", "CH-Wicker Park"],
+}
 
-    # Store locations
-    stores = {
-        "NY": ["NY-Downtown", "NY-Uptown", "NY-Brooklyn"],
-        "LA": ["LA-Santa Monica", "LA-Beverly Hills", "LA-Downtown"],
-        "CH": ["CH-Loop", "CH-Lincoln Park", "CH-Wicker Park"],
-    }
+# Realistic product catalog
+PRODUCTS = {
+    "Dairy": [
+        "Organic Whole Milk",
+        "Cheddar Cheese Block",
+        "Greek Yogurt",
+        "Butter Stick",
+        "Vanilla Ice Cream",
+    ],
+    "Bakery": [
+        "Whole Wheat Bread",
+        "Bagels (6-pack)",
+        "Croissants",
+        "Blueberry Muffins",
+        "Chocolate Chip Cookies",
+    ],
+    "Produce": ["Red Apples", "Bananas", "Tomatoes", "Romaine Lettuce", "Carrots"],
+    "Meat": [
+        "Chicken Breast",
+        "Ground Beef",
+        "Pork Chops",
+        "Salmon Fillet",
+        "Bacon",
+    ],
+    "Beverages": [
+        "Orange Juice",
+        "Cola Soda",
+        "Spring Water",
+        "Coffee Beans",
+        "Green Tea",
+    ],
+    "Snacks": [
+        "Potato Chips",
+        "Mixed Nuts",
+        "Crackers",
+        "Popcorn",
+        "Chocolate Bar",
+    ],
+    "Household": [
+        "Paper Towels",
+        "Hand Soap",
+        "Laundry Detergent",
+        "AA Batteries",
+        "Trash Bags",
+    ],
+    "Frozen": [
+        "Frozen Pizza",
+        "Ice Cream",
+        "Frozen Vegetables",
+        "Frozen Dinners",
+        "Frozen Desserts",
+    ],
+}
 
-    # Realistic product catalog
-    products = {
-        "Dairy": [
-            "Organic Whole Milk",
-            "Cheddar Cheese Block",
-            "Greek Yogurt",
-            "Butter Stick",
-            "Vanilla Ice Cream",
-        ],
-        "Bakery": [
-            "Whole Wheat Bread",
-            "Bagels (6-pack)",
-            "Croissants",
-            "Blueberry Muffins",
-            "Chocolate Chip Cookies",
-        ],
-        "Produce": ["Red Apples", "Bananas", "Tomatoes", "Romaine Lettuce", "Carrots"],
-        "Meat": [
-            "Chicken Breast",
-            "Ground Beef",
-            "Pork Chops",
-            "Salmon Fillet",
-            "Bacon",
-        ],
-        "Beverages": [
-            "Orange Juice",
-            "Cola Soda",
-            "Spring Water",
-            "Coffee Beans",
-            "Green Tea",
-        ],
-        "Snacks": [
-            "Potato Chips",
-            "Mixed Nuts",
-            "Crackers",
-            "Popcorn",
-            "Chocolate Bar",
-        ],
-        "Household": [
-            "Paper Towels",
-            "Hand Soap",
-            "Laundry Detergent",
-            "AA Batteries",
-            "Trash Bags",
-        ],
-        "Frozen": [
-            "Frozen Pizza",
-            "Ice Cream",
-            "Frozen Vegetables",
-            "Frozen Dinners",
-            "Frozen Desserts",
-        ],
-    }
+# Payment distribution based on retail patterns
+PAYMENT_METHODS = ["Cash", "Credit Card", "Debit Card", "Digital", "Gift Card"]
+PAYMENT_DIST = [0.55, 0.25, 0.15, 0.03, 0.02]
 
-    # Payment distribution based on retail patterns
-    payment_methods = ["Cash", "Credit Card", "Debit Card", "Digital", "Gift Card"]
-    payment_dist = [0.55, 0.25, 0.15, 0.03, 0.02]
+CITIES = list(STORES.keys())
+STORE_NAMES = [store for city in CITIES for store in STORES[city]]
+CATEGORIES = list(PRODUCTS.keys())
+PRODUCT_NAMES = [product for category in CATEGORIES for product in PRODUCTS[category]]
+CUSTOMER_IDS = [f"C{n}" for n in range(1000, 10000)]
 
-    # Generate transactions
-    transactions = []
-    items = []
+# Transactions per shard when generating with a process pool
+DEFAULT_SHARD_SIZE = 100_000
 
-    start_date = datetime.now() - timedelta(days=90)
+# Parquet datasets and their compact column types. Low-cardinality labels
+# are stored as categoricals; high-cardinality IDs stay plain strings, which
+# Parquet still dictionary-encodes per column chunk. Each dataset has one
+# file per month, under a month=YYYY-MM directory.
+PARQUET_DIR = "data/parquet"
+PARQUET_DTYPES = {
+    "transactions": {
+        "transaction_id": "str",
+        "time": "str",
+        "store": "category",
+        "customer_id": "str",
+        "payment_method": "category",
+        "num_items": "int16",
+    },
+    "transaction_items": {
+        "transaction_id": "str",
+        "product": "category",
+        "category": "category",
+        "quantity": "int16",
+    },
+}
 
-    for i in range(num_transactions):
-        # Transaction details
-        trans_date = start_date + timedelta(
-            days=random.randint(0, 89),
-            hours=random.randint(6, 22),
-            minutes=random.randint(0, 59),
-        )
 
-        city = random.choice(list(stores.keys()))
-        store = random.choice(stores[city])
-        payment = random.choices(payment_methods, weights=payment_dist)[0]
-
-        # Generate basket
-        basket_size = random.randint(1, 7)
-        trans_items = []
-        subtotal = 0
-
-        for _ in range(basket_size):
-            category = random.choice(list(products.keys()))
-            product = random.choice(products[category])
-
-            # Realistic pricing
-            base_price = round(random.uniform(1.99, 29.99), 2)
-            quantity = random.randint(1, 3)
-
-            # Quality premium
-            rating = round(random.uniform(3.2, 4.8), 1)
-            if rating >= 4.5:
-                price_multiplier = 1.15
-            elif rating >= 4.0:
-                price_multiplier = 1.05
-            else:
-                price_multiplier = 1.0
-
-            unit_price = round(base_price * price_multiplier, 2)
-            item_total = round(unit_price * quantity, 2)
-
-            subtotal += item_total
-
-            trans_items.append(
-                {
-                    "transaction_id": f"TXN{10000 + i}",
-                    "product": product,
-                    "category": category,
-                    "quantity": quantity,
-                    "unit_price": unit_price,
-                    "item_total": item_total,
-                    "rating": rating,
-                }
-            )
+def generate_realistic_sales_data(
+    num_transactions=1200, seed=42, chunk_size=None, start_date=None
+):
+    """Generate realistic supermarket sales data as vectorized DataFrames
 
-        # Calculate totals
-        tax = round(subtotal * 0.0825, 2)
-        total = round(subtotal + tax, 2)
-
-        # Transaction record
-        transactions.append(
-            {
-                "transaction_id": f"TXN{10000 + i}",
-                "date": trans_date.strftime("%Y-%m-%d"),
-                "time": trans_date.strftime("%H:%M:%S"),
-                "city": city,
-                "store": store,
-                "customer_id": f"C{random.randint(1000, 9999)}",
-                "payment_method": payment,
-                "num_items": basket_size,
-                "subtotal": subtotal,
-                "tax": tax,
-                "gross_income": total,
-            }
+    With ``chunk_size`` set, returns an iterator of ``(transactions, items)``
+    chunks of at most ``chunk_size`` transactions each instead of one pair.
+    Every chunk draws from its own RNG stream spawned from ``seed``, so the
+    data depends only on ``seed`` and ``chunk_size``.
+    """
+
+    if start_date is None:
+        start_date = datetime.now() - timedelta(days=90)
+
+    if chunk_size is None:
+        return _generate_shard(
+            _plan_shards(num_transactions, None, seed)[0], start_date
         )
+    return (
+        _generate_shard(shard, start_date)
+        for shard in _plan_shards(num_transactions, chunk_size, seed)
+    )
+
+
+def _plan_shards(num_transactions, chunk_size, seed):
+    """Split the transaction range into ``(seed_seq, first_index, n)`` shards"""
+    if num_transactions < 1:
+        raise ValueError(f"num_transactions must be at least 1, got {num_transactions}")
+    chunk_size = chunk_size or num_transactions
+    starts = range(0, num_transactions, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(starts))
+    return [
+        (shard_seed, first_index, min(chunk_size, num_transactions - first_index))
+        for shard_seed, first_index in zip(seeds, starts)
+    ]
+
+
+def _generate_shard(shard, start_date):
+    """Generate one shard from its own independent RNG stream"""
+    shard_seed, first_index, n = shard
+    return _generate_chunk(
+        np.random.default_rng(shard_seed), first_index, n, start_date
+    )
+
+
+def _generate_chunk(rng, first_index, n, start_date):
+    """Generate ``n`` transactions numbered from ``first_index``"""
+
+    # Transaction details, one array element per transaction
+    trans_dates = np.datetime64(start_date.replace(microsecond=0), "s") + (
+        rng.integers(0, 90, n) * 86400
+        + rng.integers(6, 23, n) * 3600
+        + rng.integers(0, 60, n) * 60
+    ).astype("timedelta64[s]")
+    city_idx = rng.integers(0, len(CITIES), n)
+    store_idx = city_idx * 3 + rng.integers(0, 3, n)
+    payment_idx = rng.choice(len(PAYMENT_METHODS), n, p=PAYMENT_DIST)
+    customer_idx = rng.integers(0, 9000, n)
+
+    # Generate baskets, one array element per line item
+    basket_size = rng.integers(1, 8, n)
+    num_lines = int(basket_size.sum())
+    line_trans_idx = np.repeat(np.arange(n), basket_size)
+
+    category_idx = rng.integers(0, len(CATEGORIES), num_lines)
+    product_idx = category_idx * 5 + rng.integers(0, 5, num_lines)
+
+    # Realistic pricing
+    base_price = np.round(rng.uniform(1.99, 29.99, num_lines), 2)
+    quantity = rng.integers(1, 4, num_lines)
 
-        # Add items
-        items.extend(trans_items)
+    # Quality premium
+    rating = np.round(rng.uniform(3.2, 4.8, num_lines), 1)
+    price_multiplier = np.select([rating >= 4.5, rating >= 4.0], [1.15, 1.05], 1.0)
+
+    unit_price = np.round(base_price * price_multiplier, 2)
+    item_total = np.round(unit_price * quantity, 2)
+
+    # Calculate totals
+    subtotal = np.bincount(line_trans_idx, weights=item_total, minlength=n)
+    tax = np.round(subtotal * 0.0825, 2)
+    total = np.round(subtotal + tax, 2)
+
+    transaction_ids = "TXN" + pd.Series(
+        np.arange(10000 + first_index, 10000 + first_index + n)
+    ).astype(str)
+
+    # Dates and times repeat heavily, so format each distinct value only once
+    day_values, day_codes = np.unique(
+        trans_dates.astype("datetime64[D]"), return_inverse=True
+    )
+    seconds_of_day = (trans_dates - trans_dates.astype("datetime64[D]")).astype(
+        np.int64
+    )
+    time_values, time_codes = np.unique(seconds_of_day, return_inverse=True)
+    time_labels = [
+        f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}"
+        for s in time_values.tolist()
+    ]
+
+    transactions = pd.DataFrame(
+        {
+            "transaction_id": transaction_ids,
+            "date": pd.Categorical.from_codes(day_codes, day_values.astype(str)),
+            "time": pd.Categorical.from_codes(time_codes, time_labels),
+            "city": pd.Categorical.from_codes(city_idx, CITIES),
+            "store": pd.Categorical.from_codes(store_idx, STORE_NAMES),
+            "customer_id": pd.Categorical.from_codes(customer_idx, CUSTOMER_IDS),
+            "payment_method": pd.Categorical.from_codes(payment_idx, PAYMENT_METHODS),
+            "num_items": basket_size,
+            "subtotal": subtotal,
+            "tax": tax,
+            "gross_income": total,
+        }
+    )
+
+    items = pd.DataFrame(
+        {
+            "transaction_id": pd.Categorical.from_codes(
+                line_trans_idx, transaction_ids
+            ),
+            "product": pd.Categorical.from_codes(product_idx, PRODUCT_NAMES),
+            "category": pd.Categorical.from_codes(category_idx, CATEGORIES),
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "item_total": item_total,
+            "rating": rating,
+        }
+    )
 
     return transactions, items
 
 
-def save_data(transactions, items):
-    """Save generated data to CSV files"""
+def save_data(transactions, items, output_format="csv"):
+    """Save generated data to CSV and/or partitioned Parquet files"""
+    with stage(
+        "save_data",
+        format=output_format,
+        transactions=len(transactions),
+        rows=len(items),
+    ):
+        save_data_chunks([(transactions, items)], output_format)
+
+
+def save_data_chunks(chunks, output_format="csv"):
+    """Stream ``(transactions, items)`` chunks to the data files
+
+    Each chunk is appended as it arrives and the summary is accumulated
+    from running totals, so memory use is bounded by the chunk size.
+    """
+    save_rendered_chunks(
+        (_render_chunk(chunk, i, output_format) for i, chunk in enumerate(chunks)),
+        output_format,
+    )
+
+
+def save_data_parallel(
+    num_transactions,
+    workers,
+    chunk_size=DEFAULT_SHARD_SIZE,
+    seed=42,
+    start_date=None,
+    output_format="csv",
+):
+    """Generate and render shards in a process pool, writing them in order
+
+    Shards and their seeds are fixed by ``seed`` and ``chunk_size`` alone,
+    so the files are byte-identical for any number of workers.
+    """
+    if start_date is None:
+        start_date = datetime.now() - timedelta(days=90)
+
+    shards = _plan_shards(num_transactions, chunk_size, seed)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        save_rendered_chunks(
+            _map_ordered(
+                pool, _render_shard, shards, start_date, output_format, workers * 2
+            ),
+            output_format,
+        )
+
+
+def _map_ordered(pool, fn, shards, start_date, output_format, window):
+    """Like ``pool.map`` but with at most ``window`` shards in flight"""
+    pending = deque()
+    for index, shard in enumerate(shards):
+        pending.append(pool.submit(fn, index, shard, start_date, output_format))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _render_shard(index, shard, start_date, output_format):
+    """Generate a shard and render it inside a worker process"""
+    return _render_chunk(_generate_shard(shard, start_date), index, output_format)
+
+
+def _render_chunk(chunk, index, output_format):
+    """Render a chunk to CSV text and/or Parquet frames plus its partial
+    totals"""
+    transactions, items = chunk
+    write_csv = output_format in ("csv", "both")
+
+    cash = transactions["payment_method"] == "Cash"
+    return (
+        transactions.to_csv(header=index == 0, index=False) if write_csv else "",
+        items.to_csv(header=index == 0, index=False) if write_csv else "",
+        len(transactions),
+        transactions["gross_income"].sum(),
+        transactions.loc[cash, "gross_income"].sum(),
+        (
+            _parquet_frames(transactions, items)
+            if output_format in ("parquet", "both")
+            else None
+        ),
+    )
+
+
+def _parquet_frames(transactions, items):
+    """One chunk's rows for the Parquet datasets, with their ``month``
+
+    Columns are cast to ``PARQUET_DTYPES`` so labels are dictionary-encoded
+    and numbers use the narrowest type that holds them. Line items go to
+    their transaction's month.
+    """
+    transactions = transactions.astype(PARQUET_DTYPES["transactions"])
+    months = transactions["date"].astype(str).str[:7]
+    positions = pd.Index(transactions["transaction_id"]).get_indexer(
+        items["transaction_id"]
+    )
+    items = items.astype(PARQUET_DTYPES["transaction_items"]).assign(
+        month=months.to_numpy()[positions]
+    )
+    return {
+        "transactions": transactions.assign(month=months).sort_values(
+            ["date", "city"], kind="stable"
+        ),
+        "transaction_items": items,
+    }
+
+
+class ParquetDatasets:
+    """Append chunks to the Parquet datasets, one file per month
+
+    Every chunk adds a row group to its months' files, so a run writes one
+    file per dataset and month however many chunks it has. Chunks arrive
+    from the workers in order and are written here, in one process.
+    """
+
+    def __init__(self, parquet_dir=PARQUET_DIR):
+        self.parquet_dir = parquet_dir
+        self.writers = {}
+
+    def write(self, frames):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        for name, df in frames.items():
+            for month, rows in df.groupby("month", sort=True):
+                table = pa.Table.from_pandas(
+                    rows.drop(columns="month"), preserve_index=False
+                )
+                if (name, month) not in self.writers:
+                    path = f"{self.parquet_dir}/{name}/month={month}/part-0.parquet"
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    self.writers[name, month] = pq.ParquetWriter(path, table.schema)
+                writer = self.writers[name, month]
+                writer.write_table(table.cast(writer.schema))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def _prepare_output(output_format):
+    """Create the data directory and drop a stale Parquet dataset"""
     os.makedirs("data", exist_ok=True)
+    if output_format in ("parquet", "both") and os.path.exists(PARQUET_DIR):
+        shutil.rmtree(PARQUET_DIR)
+
 
-    # Save transactions
-    pd.DataFrame(transactions).to_csv("data/transactions.csv", index=False)
+def save_rendered_chunks(rendered, output_format="csv"):
+    """Append rendered chunks to the data files and write the summary"""
+    _prepare_output(output_format)
 
-    # Save items
-    pd.DataFrame(items).to_csv("data/transaction_items.csv", index=False)
+    total_transactions = 0
+    total_revenue = 0.0
+    cash_revenue = 0.0
+
+    with ExitStack() as stack:
+        # Rendering is lazy, so this stage covers render and write time
+        info = stack.enter_context(stage("write_data", format=output_format))
+        if output_format in ("parquet", "both"):
+            parquet = ParquetDatasets()
+            stack.callback(parquet.close)
+        if output_format in ("csv", "both"):
+            trans_file = stack.enter_context(
+                open("data/transactions.csv", "w", newline="")
+            )
+            items_file = stack.enter_context(
+                open("data/transaction_items.csv", "w", newline="")
+            )
+
+        for trans_csv, items_csv, n, revenue, cash, frames in rendered:
+            if output_format in ("csv", "both"):
+                trans_file.write(trans_csv)
+                items_file.write(items_csv)
+            if frames:
+                parquet.write(frames)
+
+            # Summary stats
+            total_transactions += n
+            total_revenue += revenue
+            cash_revenue += cash
+        info["transactions"] = total_transactions
 
-    # Summary stats
-    df = pd.DataFrame(transactions)
     summary = {
-        "total_transactions": len(df),
-        "total_revenue": df["gross_income"].sum(),
-        "cash_revenue": df[df["payment_method"] == "Cash"]["gross_income"].sum(),
+        "total_transactions": total_transactions,
+        "total_revenue": total_revenue,
+        "cash_revenue": cash_revenue,
         "cash_percentage": (
-            df[df["payment_method"] == "Cash"]["gross_income"].sum()
-            / df["gross_income"].sum()
-            * 100
+            cash_revenue / total_revenue * 100 if total_revenue else 0.0
         ),
     }
 
     pd.DataFrame([summary]).to_csv("data/summary.csv", index=False)
 
-    print(f"Generated {len(transactions)} transactions")
+    print(f"Generated {total_transactions} transactions")
     print(f"Total revenue: ${summary['total_revenue']:,.2f}")
     print(f"Cash percentage: {summary['cash_percentage']:.1f}%")
 
 
 if __name__ == "__main__":
-    transactions, items = generate_realistic_sales_data()
-    save_data(transactions, items)
+    parser = argparse.ArgumentParser(
+        description="Generate realistic supermarket sales data"
+    )
+    parser.add_argument("--transactions", type=int, default=1200)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=None,
+        help="stream output in chunks of this many transactions",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="generate shards in a pool of N processes",
+    )
+    parser.add_argument(
+        "--start-date",
+        type=datetime.fromisoformat,
+        default=None,
+        help="first day of the 90-day window (default: 90 days ago)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet", "both"],
+        default="csv",
+        help="write CSV files, Parquet datasets partitioned by month, or both",
+    )
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    if args.transactions < 1:
+        parser.error("--transactions must be at least 1")
+    enable_tracing_from_args(args)
+
+    if args.workers:
+        save_data_parallel(
+            args.transactions,
+            args.workers,
+            chunk_size=args.chunk_size or DEFAULT_SHARD_SIZE,
+            seed=args.seed,
+            start_date=args.start_date,
+            output_format=args.format,
+        )
+    elif args.chunk_size:
+        save_data_chunks(
+            generate_realistic_sales_data(
+                args.transactions,
+                seed=args.seed,
+                chunk_size=args.chunk_size,
+                start_date=args.start_date,
+            ),
+            args.format,
+        )
+    else:
+        with stage("generate", transactions=args.transactions):
+            transactions, items = generate_realistic_sales_data(
+                args.transactions, seed=args.seed, start_date=args.start_date
+            )
+        save_data(transactions, items, args.format)
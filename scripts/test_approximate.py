@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+from aggregations import compute_metrics
+from approximate import line_hash_sql
+from backends import SQLiteBackend
+from setup_realistic_database import create_realistic_database
+from sketches import (
+    RELATIVE_ERROR,
+    estimate,
+    from_blob,
+    grouped_registers,
+    merge,
+    to_blob,
+)
+from test_database_load import make_data
+
+
+def test_blob_columns_keep_trailing_nul_bytes(tmp_path):
+    """BLOBs ending in NUL bytes come back byte for byte"""
+    registers = np.zeros(4096, dtype=np.uint8)
+    registers[7] = 3
+    blobs = [b"\x01\x00\x00", to_blob(registers), b"\x00"]
+
+    backend = SQLiteBackend(str(tmp_path / "blobs.db"))
+    backend.conn.execute("CREATE TABLE blobs (id INTEGER, registers BLOB)")
+    backend.conn.executemany("INSERT INTO blobs VALUES (?, ?)", enumerate(blobs))
+    read = backend.read_columns("SELECT registers FROM blobs ORDER BY id")["registers"]
+    backend.close()
+
+    assert list(read) == blobs
+    np.testing.assert_array_equal(from_blob(read[1]), registers)
+
+
+def test_sketches_estimate_distinct_counts():
+    """Merged sketches count the union, within the HyperLogLog error"""
+    values = np.arange(60_000) * 7919
+    # Two overlapping groups: values 0-39,999 and 20,000-59,999
+    groups = np.concatenate([np.zeros(40_000), np.ones(40_000)])
+    registers = grouped_registers(
+        groups, np.concatenate([values[:40_000], values[20_000:]]), 2
+    )
+
+    for sketch in registers:
+        assert abs(estimate(sketch) - 40_000) < 3 * RELATIVE_ERROR * 40_000
+    merged = merge([to_blob(sketch) for sketch in registers])
+    np.testing.assert_array_equal(merged, registers.max(axis=0))
+    assert abs(estimate(merged) - 60_000) < 3 * RELATIVE_ERROR * 60_000
+
+    # Small counts use linear counting, which is close to exact
+    small = grouped_registers(np.zeros(100), values[:100], 1)[0]
+    assert abs(estimate(small) - 100) < 3
+
+
+def test_sample_estimates_cover_the_exact_figures(tmp_path, monkeypatch):
+    """Horvitz-Thompson estimates of a thinned sample bound the exact totals"""
+    make_data(tmp_path, monkeypatch, num_transactions=3000)
+    create_realistic_database()
+
+    # Keep about half of the stored sample, at twice the weight; the
+    # swapped arguments make the draw independent of the sampling hash
+    conn = sqlite3.connect("database/supermarket.db")
+    conn.execute(
+        "DELETE FROM sample_items "
+        f"WHERE {line_hash_sql('line', 'transaction_key')} >= 0.5"
+    )
+    conn.execute("UPDATE sample_items SET weight = weight * 2")
+    conn.commit()
+    exact = {
+        "Line Items (est.)": conn.execute(
+            "SELECT COUNT(*) FROM fact_transaction_items"
+        ).fetchone()[0],
+        "Line-Item Revenue (est.)": conn.execute(
+            "SELECT SUM(item_total) FROM fact_transaction_items"
+        ).fetchone()[0],
+        "Unique Customers (est.)": conn.execute(
+            "SELECT COUNT(DISTINCT customer_key) FROM fact_transactions"
+        ).fetchone()[0],
+    }
+    conn.close()
+
+    backend = SQLiteBackend(read_only=True)
+    metrics = compute_metrics(backend, approximate=True)
+    backend.close()
+
+    estimates = {f"{name} (est.)": value for name, value in metrics.estimates.items()}
+    assert estimates.keys() == exact.keys()
+    for name, (value, bound) in estimates.items():
+        assert bound > 0, name
+        assert abs(value - exact[name]) <= bound, name
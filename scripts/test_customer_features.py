@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import sys
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+from aggregations import CUSTOMER_SEGMENTS_SQL
+from customer_features import CUSTOMER_FEATURE_TABLES
+from setup_realistic_database import create_realistic_database, ingest_incremental
+from test_database_load import make_data, sorted_rows, write_batch
+
+# Each feature table recomputed straight from the fact tables
+DIRECT_FEATURES = {
+    "customer_features": """
+        SELECT
+            customer_key,
+            MIN(date_key) as first_date_key,
+            MAX(date_key) as last_date_key,
+            COUNT(*) as visit_count,
+            SUM(num_items) as item_count,
+            SUM(gross_income) as monetary
+        FROM fact_transactions
+        GROUP BY customer_key
+    """,
+    "customer_category_mix": """
+        SELECT
+            t.customer_key,
+            p.category,
+            COUNT(*) as line_count,
+            SUM(i.item_total) as item_total
+        FROM fact_transaction_items i
+        JOIN fact_transactions t ON t.transaction_key = i.transaction_key
+        JOIN dim_product p ON p.product_key = i.product_key
+        GROUP BY t.customer_key, p.category
+    """,
+}
+
+
+def assert_features_match_facts():
+    conn = sqlite3.connect("database/supermarket.db")
+    for table, sql in DIRECT_FEATURES.items():
+        expected = pd.read_sql(sql, conn)
+        stored = pd.read_sql(f"SELECT * FROM {table}", conn)[expected.columns]
+        pd.testing.assert_frame_equal(sorted_rows(stored), sorted_rows(expected))
+    conn.close()
+
+
+def test_features_match_the_facts_after_an_ingest(tmp_path, monkeypatch):
+    """Refreshing only the touched customers gives the features of a full
+    recompute"""
+    make_data(tmp_path, monkeypatch)
+    transactions = pd.read_csv("data/transactions.csv")
+    items = pd.read_csv("data/transaction_items.csv")
+    create_realistic_database()
+    assert_features_match_facts()
+
+    write_batch(transactions, items)
+    ingest_incremental("new/transactions.csv", "new/transaction_items.csv")
+    assert_features_match_facts()
+
+
+def test_segments_of_hand_built_customers():
+    """Scores rank ties at the bottom of their block, so the many one-visit
+    customers score lowest on frequency and every segment can appear"""
+    # (customer_key, last_date_key, visit_count, monetary); six customers
+    # share one visit, the others score 4 or 5 on frequency
+    customers = [
+        (1, 20260710, 5, 100.0),
+        (2, 20260709, 1, 10.0),
+        (3, 20260708, 1, 20.0),
+        (4, 20260707, 2, 30.0),
+        (5, 20260706, 1, 40.0),
+        (6, 20260705, 1, 50.0),
+        (7, 20260704, 5, 90.0),
+        (8, 20260703, 1, 60.0),
+        (9, 20260702, 2, 80.0),
+        (10, 20260701, 1, 70.0),
+    ]
+    conn = sqlite3.connect(":memory:")
+    conn.execute(CUSTOMER_FEATURE_TABLES["customer_features"])
+    conn.executemany(
+        "INSERT INTO customer_features VALUES (?, 20260701, ?, ?, 0, ?)", customers
+    )
+    segments = dict(
+        conn.execute(
+            CUSTOMER_SEGMENTS_SQL + "SELECT customer_key, segment FROM segmented"
+        )
+    )
+    conn.close()
+
+    assert segments == {
+        1: "Champions",
+        2: "New",
+        3: "New",
+        4: "Loyal",
+        5: "Regular",
+        6: "Regular",
+        7: "At Risk",
+        8: "Lapsed",
+        9: "At Risk",
+        10: "Lapsed",
+    }
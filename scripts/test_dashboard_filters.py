@@ -0,0 +1,95 @@
+import argparse
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+import render_farm
+from aggregations import (
+    DashboardFilters,
+    add_filter_arguments,
+    check_date_range,
+    compute_metrics,
+)
+from backends import SQLiteBackend
+from create_realistic_dashboard import generate_realistic_insights
+from setup_realistic_database import create_realistic_database
+from test_database_load import make_data
+
+
+def test_inverted_date_range_is_rejected():
+    """--since after --until is a usage error, and an invalid slice"""
+    parser = argparse.ArgumentParser()
+    add_filter_arguments(parser)
+    args = parser.parse_args(["--since", "2026-03-01", "--until", "2026-01-01"])
+    with pytest.raises(SystemExit):
+        check_date_range(parser, args)
+    with pytest.raises(ValueError, match="ends before it starts"):
+        DashboardFilters(date_from="2026-03-01", date_to="2026-01-01")
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        DashboardFilters(cities=("XX",)),
+        DashboardFilters(date_from="2030-01-01"),
+        DashboardFilters(categories=("XX",)),
+    ],
+)
+def test_slices_without_sales_are_reported(tmp_path, monkeypatch, capsys, filters):
+    """Filters matching nothing give a note instead of a crash"""
+    make_data(tmp_path, monkeypatch)
+    create_realistic_database()
+    backend = SQLiteBackend(read_only=True)
+    metrics = compute_metrics(backend, filters=filters)
+    backend.close()
+
+    generate_realistic_insights(metrics, filters.label)
+    output = capsys.readouterr().out
+    if filters.categories:
+        # Baskets still match; only the line-item findings are left out
+        assert "High-rated products" not in output
+        assert "KEY FINDINGS" in output
+    else:
+        assert f"No sales match {filters.label}" in output
+        assert "KEY FINDINGS" not in output
+
+
+def test_render_farm_skips_scopes_without_sales(tmp_path, monkeypatch):
+    """Empty scopes get no dashboard, only a row in the index"""
+    make_data(tmp_path, monkeypatch)
+    create_realistic_database()
+    os.makedirs("farm")
+    render_farm.ensure_plotly_bundle("farm")
+    render_farm._open_worker_connection()
+    scopes = [DashboardFilters(cities=("XX",)), DashboardFilters()]
+    results = [render_farm.render_scope(scope, "farm") for scope in scopes]
+    render_farm._backend.close()
+
+    assert results[0] == ("XX", None, 0.0, 0)
+    assert os.path.exists(results[1][1])
+    with open(render_farm.write_index(results, "farm")) as f:
+        assert "<tr><td>XX</td><td colspan='2'>no sales</td></tr>" in f.read()
+
+
+def test_scopes_get_distinct_file_names():
+    """Scopes whose labels clash still render to files of their own"""
+    scopes = [
+        DashboardFilters(cities=("NY",), categories=("Dairy",)),
+        DashboardFilters(cities=("NY",), categories=("Bakery",)),
+        DashboardFilters(stores=("Store A",)),
+        DashboardFilters(stores=("store-a",)),
+        DashboardFilters(cities=("NY",), date_from="2026-07-01"),
+    ]
+    slugs = [render_farm.scope_slug(scope) for scope in scopes]
+    assert len(set(slugs)) == len(scopes)
+    assert slugs[0].startswith("ny-dairy-")
+    assert slugs == [render_farm.scope_slug(scope) for scope in scopes]
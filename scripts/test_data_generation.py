@@ -0,0 +1,92 @@
+import glob
+import os
+import sys
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+
+from bulk_loader import iter_csv_frames, iter_parquet_frames
+from generate_realistic_data import (
+    generate_realistic_sales_data,
+    save_data_chunks,
+    save_data_parallel,
+)
+
+START = datetime(2026, 7, 1)
+
+
+def read_data_files():
+    return [
+        open(f"data/{name}.csv", "rb").read()
+        for name in ("transactions", "transaction_items")
+    ]
+
+
+def test_sharded_output_is_independent_of_workers(tmp_path, monkeypatch):
+    """Sharded runs write the same bytes as a single-process chunked run"""
+    monkeypatch.chdir(tmp_path)
+
+    save_data_chunks(
+        generate_realistic_sales_data(2500, seed=7, chunk_size=600, start_date=START)
+    )
+    serial = read_data_files()
+    save_data_parallel(2500, workers=3, chunk_size=600, seed=7, start_date=START)
+    assert read_data_files() == serial
+
+    transactions = pd.read_csv("data/transactions.csv")
+    items = pd.read_csv("data/transaction_items.csv")
+    assert len(transactions) == 2500
+    assert transactions["transaction_id"].is_unique
+    assert set(items["transaction_id"]) == set(transactions["transaction_id"])
+    assert (
+        items.groupby("transaction_id").size()
+        == transactions.set_index("transaction_id")["num_items"]
+    ).all()
+
+
+def rounded(frames, columns):
+    frame = pd.concat(list(frames))[columns].astype(str)
+    for column in ("subtotal", "tax", "gross_income", "unit_price", "item_total"):
+        if column in columns:
+            frame[column] = frame[column].astype(float).round(2)
+    return frame.sort_values(columns).reset_index(drop=True)
+
+
+def test_parquet_is_one_file_per_month_with_the_csv_rows(tmp_path, monkeypatch):
+    """Every chunk of a run lands in a single file per dataset and month"""
+    monkeypatch.chdir(tmp_path)
+
+    save_data_chunks(
+        generate_realistic_sales_data(3000, chunk_size=700, start_date=START),
+        "both",
+    )
+    assert sorted(glob.glob("data/parquet/*/*/*.parquet")) == [
+        f"data/parquet/{name}/month={month}/part-0.parquet"
+        for name in ("transaction_items", "transactions")
+        for month in ("2026-07", "2026-08", "2026-09")
+    ]
+
+    for name in ("transactions", "transaction_items"):
+        columns = list(pd.read_csv(f"data/{name}.csv", nrows=0).columns)
+        csv_frames = iter_csv_frames(f"data/{name}.csv")
+        parquet_frames = iter_parquet_frames(f"data/parquet/{name}", columns)
+        pd.testing.assert_frame_equal(
+            rounded(parquet_frames, columns), rounded(csv_frames, columns)
+        )
+
+
+@pytest.mark.parametrize("num_transactions", [0, -5])
+def test_empty_runs_are_rejected(num_transactions):
+    """At least one transaction is needed to build a dataset"""
+    with pytest.raises(ValueError, match="at least 1"):
+        generate_realistic_sales_data(num_transactions)
+    with pytest.raises(ValueError, match="at least 1"):
+        generate_realistic_sales_data(num_transactions, chunk_size=100)
+    with pytest.raises(ValueError, match="at least 1"):
+        save_data_parallel(num_transactions, workers=2)
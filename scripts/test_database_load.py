@@ -0,0 +1,226 @@
+import os
+import sqlite3
+import sys
+from dataclasses import fields
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+from aggregations import DashboardMetrics, compute_metrics
+from backends import SQLiteBackend, open_backend
+from generate_realistic_data import generate_realistic_sales_data, save_data_chunks
+from partitions import TransactionMonths
+from setup_realistic_database import create_realistic_database, ingest_incremental
+
+START = datetime(2026, 7, 1)
+
+
+def make_data(tmp_path, monkeypatch, num_transactions=800, output_format="csv"):
+    """Generate a small data set and an empty database directory under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("database")
+    save_data_chunks(
+        generate_realistic_sales_data(
+            num_transactions, chunk_size=300, start_date=START
+        ),
+        output_format,
+    )
+
+
+def sorted_rows(frame):
+    frame = frame.round(2)
+    return frame.sort_values(list(frame.columns)).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("source", ["csv", "parquet"])
+def test_loaded_views_match_the_source_files(tmp_path, monkeypatch, source):
+    """The flat views over the star schema give back the generated rows"""
+    make_data(tmp_path, monkeypatch, output_format="both")
+    create_realistic_database(source)
+
+    conn = sqlite3.connect("database/supermarket.db")
+    for table in ("transactions", "transaction_items"):
+        expected = pd.read_csv(f"data/{table}.csv")
+        loaded = pd.read_sql(f"SELECT * FROM {table}", conn)[expected.columns]
+        pd.testing.assert_frame_equal(sorted_rows(loaded), sorted_rows(expected))
+
+    # Line items sit in the partition of their transaction's month
+    misplaced = conn.execute("""
+        SELECT COUNT(*) FROM fact_transaction_items_202608 i
+        JOIN fact_transactions t ON t.transaction_key = i.transaction_key
+        WHERE t.date_key / 100 != 202608
+    """).fetchone()[0]
+    assert misplaced == 0
+    conn.close()
+
+
+def test_transaction_months_outside_the_dense_run():
+    """Keys far from the first one still map to their months"""
+    months = TransactionMonths()
+    keys = np.array([1000, 1001, 1003, 10**9, 5])
+    months.add(keys, np.array([202601, 202602, 202603, 202604, 202605]))
+    months.add(np.array([1002]), np.array([202606]))
+
+    assert months.of(np.array([5, 1002, 10**9, 1000])).tolist() == [
+        202605,
+        202606,
+        202604,
+        202601,
+    ]
+    with pytest.raises(ValueError, match="unknown transaction key 1004"):
+        months.of(np.array([1001, 1004]))
+
+
+def test_lines_are_numbered_per_transaction_in_any_order(tmp_path, monkeypatch):
+    """Line items need not arrive grouped by transaction"""
+    make_data(tmp_path, monkeypatch)
+    items = pd.read_csv("data/transaction_items.csv")
+    items.sample(frac=1, random_state=3).to_csv(
+        "data/transaction_items.csv", index=False
+    )
+    create_realistic_database()
+
+    conn = sqlite3.connect("database/supermarket.db")
+    lines = pd.read_sql(
+        "SELECT transaction_key, line FROM fact_transaction_items", conn
+    )
+    assert len(lines) == len(items)
+    per_transaction = lines.groupby("transaction_key")["line"].agg(
+        ["min", "max", "count"]
+    )
+    assert (per_transaction["min"] == 0).all()
+    assert (per_transaction["max"] == per_transaction["count"] - 1).all()
+
+    joined = conn.execute("""
+        SELECT COUNT(*) FROM transactions t
+        JOIN transaction_items i ON i.transaction_key = t.transaction_key
+    """).fetchone()[0]
+    assert joined == len(items)
+    conn.close()
+
+
+def test_failed_rebuild_keeps_the_old_database(tmp_path, monkeypatch):
+    """A load that fails part way leaves the existing database untouched"""
+    make_data(tmp_path, monkeypatch)
+    create_realistic_database()
+    with open("database/supermarket.db", "rb") as f:
+        before = f.read()
+
+    with open("data/transaction_items.csv", "a") as f:
+        f.write("BAD1,Milk,Dairy,1,1.0,1.0,4.0\n")
+    with pytest.raises(ValueError):
+        create_realistic_database()
+
+    with open("database/supermarket.db", "rb") as f:
+        assert f.read() == before
+    assert sorted(os.listdir("database")) == ["supermarket.db"]
+
+
+def test_dashboard_asks_for_setup_on_an_old_database(tmp_path, monkeypatch):
+    """The flat-table database of earlier versions is reported, not queried"""
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("database")
+    with pytest.raises(FileNotFoundError, match="setup_realistic_database.py"):
+        open_backend()
+
+    conn = sqlite3.connect("database/supermarket.db")
+    conn.execute("CREATE TABLE transactions (transaction_id TEXT PRIMARY KEY)")
+    conn.close()
+    with pytest.raises(ValueError, match="no fact_transactions, daily_sales_rollup"):
+        open_backend()
+
+
+def write_batch(transactions, items):
+    """Rewrite every 40th transaction without its last line item and add 50
+    new transactions in October; returns the merged data a rebuild loads"""
+    rewritten = transactions["transaction_id"].iloc[::40]
+    batch = transactions[transactions["transaction_id"].isin(rewritten)].copy()
+    batch["payment_method"] = "Cash"
+    batch_items = items[items["transaction_id"].isin(rewritten)]
+    batch_items = batch_items[batch_items.duplicated("transaction_id", keep="last")]
+
+    new = transactions.iloc[:50].copy()
+    new_ids = dict(zip(new["transaction_id"], "TXN9" + new["transaction_id"].str[3:]))
+    new["transaction_id"] = new["transaction_id"].map(new_ids)
+    new["date"] = "2026-10-05"
+    new_items = items[items["transaction_id"].isin(new_ids)].copy()
+    new_items["transaction_id"] = new_items["transaction_id"].map(new_ids)
+
+    os.makedirs("new", exist_ok=True)
+    pd.concat([batch, new]).to_csv("new/transactions.csv", index=False)
+    pd.concat([batch_items, new_items]).to_csv("new/transaction_items.csv", index=False)
+
+    kept = ~transactions["transaction_id"].isin(rewritten)
+    kept_items = ~items["transaction_id"].isin(rewritten)
+    return (
+        pd.concat([transactions[kept], batch, new]),
+        pd.concat([items[kept_items], batch_items, new_items]),
+    )
+
+
+def dashboard_metrics():
+    backend = SQLiteBackend(read_only=True)
+    metrics = compute_metrics(backend)
+    backend.close()
+    return metrics
+
+
+def assert_metrics_equal(actual, expected):
+    for field in fields(DashboardMetrics):
+        a, b = getattr(actual, field.name), getattr(expected, field.name)
+        if isinstance(b, pd.DataFrame):
+            pd.testing.assert_frame_equal(a, b)
+        elif isinstance(b, dict):
+            assert a.keys() == b.keys()
+            for key, (dates, revenue) in b.items():
+                assert list(a[key][0]) == list(dates)
+                np.testing.assert_allclose(a[key][1], revenue)
+        else:
+            assert a == pytest.approx(b), field.name
+
+
+def test_incremental_ingest_matches_a_rebuild(tmp_path, monkeypatch):
+    """Upserting a batch gives the data and dashboard of a full rebuild"""
+    make_data(tmp_path, monkeypatch)
+    transactions = pd.read_csv("data/transactions.csv")
+    items = pd.read_csv("data/transaction_items.csv")
+    create_realistic_database()
+    merged_transactions, merged_items = write_batch(transactions, items)
+
+    counts = ingest_incremental("new/transactions.csv", "new/transaction_items.csv")
+    assert counts == {
+        "transactions": 70,
+        "transaction_items": len(pd.read_csv("new/transaction_items.csv")),
+    }
+    with open("database/supermarket.db", "rb") as f:
+        ingested = f.read()
+    assert (
+        ingest_incremental("new/transactions.csv", "new/transaction_items.csv") is None
+    )
+    with open("database/supermarket.db", "rb") as f:
+        assert f.read() == ingested
+
+    conn = sqlite3.connect("database/supermarket.db")
+    for table, expected in (
+        ("transactions", merged_transactions),
+        ("transaction_items", merged_items),
+    ):
+        loaded = pd.read_sql(f"SELECT * FROM {table}", conn)[expected.columns]
+        pd.testing.assert_frame_equal(sorted_rows(loaded), sorted_rows(expected))
+    conn.close()
+    incremental = dashboard_metrics()
+
+    merged_transactions.to_csv("data/transactions.csv", index=False)
+    merged_items.to_csv("data/transaction_items.csv", index=False)
+    create_realistic_database()
+    assert_metrics_equal(incremental, dashboard_metrics())
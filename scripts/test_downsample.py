@@ -0,0 +1,80 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+from downsample import downsample, lttb, min_max
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=np.float64), rng.normal(size=n).cumsum()
+
+
+@pytest.mark.parametrize("n, threshold", [(1000, 50), (101, 3), (37, 36), (5000, 7)])
+def test_lttb_keeps_the_ends_and_exactly_threshold_points(n, threshold):
+    """LTTB returns ``threshold`` increasing indices from first to last"""
+    x, y = series(n)
+    keep = lttb(x, y, threshold)
+    assert len(keep) == threshold
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert (np.diff(keep) > 0).all()
+
+
+def test_lttb_keeps_an_isolated_spike():
+    """A lone spike forms the largest triangle in its bucket"""
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros(1000)
+    y[617] = 100.0
+    assert 617 in lttb(x, y, 20)
+
+
+@pytest.mark.parametrize("n, threshold", [(1000, 50), (101, 4), (37, 36), (5000, 7)])
+def test_min_max_keeps_every_bucket_extreme(n, threshold):
+    """Min/max keeps the ends and each bucket's extremes, within the bound"""
+    _, y = series(n, seed=n)
+    keep = min_max(y, threshold)
+    assert len(keep) <= threshold
+    assert keep[0] == 0 and keep[-1] == n - 1
+    assert (np.diff(keep) > 0).all()
+    assert np.argmax(y) in keep and np.argmin(y) in keep
+
+    buckets = (threshold - 2) // 2
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    for start, end in zip(edges[:-1], edges[1:]):
+        assert y[keep[(keep >= start) & (keep < end)]].max() == y[start:end].max()
+        assert y[keep[(keep >= start) & (keep < end)]].min() == y[start:end].min()
+
+
+@pytest.mark.parametrize("threshold", [10, 11, 100])
+def test_short_series_are_kept_whole(threshold):
+    """Series no longer than the threshold come back unchanged"""
+    x, y = series(10)
+    np.testing.assert_array_equal(lttb(x, y, threshold), np.arange(10))
+    np.testing.assert_array_equal(min_max(y, threshold), np.arange(10))
+    for method in ("lttb", "minmax"):
+        kept_x, kept_y = downsample(x, y, threshold, method)
+        np.testing.assert_array_equal(kept_x, x)
+        np.testing.assert_array_equal(kept_y, y)
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_downsample_date_series(method):
+    """Date labels are thinned with their values and keep both ends"""
+    dates = np.array(
+        [
+            str(day)
+            for day in np.arange("2026-01-01", "2026-12-31", dtype="datetime64[D]")
+        ]
+    )
+    _, y = series(len(dates))
+    kept_dates, kept_y = downsample(dates, y, 60, method)
+    assert len(kept_dates) == len(kept_y) <= 60
+    assert kept_dates[0] == dates[0] and kept_dates[-1] == dates[-1]
+    assert list(kept_dates) == sorted(kept_dates)
+    np.testing.assert_array_equal(kept_y, y[np.searchsorted(dates, kept_dates)])
@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+
+import instrumentation
+from instrumentation import CHROME_ENV, MEMORY_ENV, enable_tracing, stage
+
+
+def test_chrome_trace_is_valid_json_across_runs(tmp_path, monkeypatch):
+    """Each run closes the array, and the next one appends to it"""
+    path = str(tmp_path / "trace.json")
+    monkeypatch.setenv(CHROME_ENV, "")
+    monkeypatch.setenv(MEMORY_ENV, "0")
+    monkeypatch.setattr(instrumentation.atexit, "register", lambda *args: None)
+
+    for run in ("first", "second"):
+        enable_tracing(chrome_path=path, memory=False)
+        with stage(f"{run}:load"):
+            with stage(f"{run}:batch", rows=10):
+                pass
+        instrumentation._close_chrome_trace(path)
+
+        with open(path) as f:
+            events = json.load(f)
+        assert [event["name"] for event in events][-2:] == [
+            f"{run}:batch",
+            f"{run}:load",
+        ]
+    assert len(events) == 4
+    assert events[0]["args"]["rows"] == 10
+
+    # A run that records nothing leaves the file valid too
+    enable_tracing(chrome_path=path, memory=False)
+    instrumentation._close_chrome_trace(path)
+    with open(path) as f:
+        assert len(json.load(f)) == 4
+
+
+def test_chrome_trace_enabled_twice_is_closed_once(tmp_path):
+    """A library and its CLI may both enable the same trace"""
+    path = tmp_path / "trace.json"
+    script = (
+        "from instrumentation import enable_tracing, stage\n"
+        f"enable_tracing(chrome_path={str(path)!r}, memory=False)\n"
+        f"enable_tracing(chrome_path={str(path)!r}, memory=False)\n"
+        "with stage('load'):\n"
+        "    pass\n"
+    )
+    database = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), os.pardir, "database"
+    )
+    env = {**os.environ, "PYTHONPATH": database}
+    env.pop(CHROME_ENV, None)
+    env.pop(instrumentation.LOG_ENV, None)
+
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", script], env=env, check=True)
+        with open(path) as f:
+            events = json.load(f)
+    assert [event["name"] for event in events] == ["load", "load"]
+
+    # Closing an already closed trace leaves it alone
+    instrumentation._close_chrome_trace(str(path))
+    with open(path) as f:
+        assert len(json.load(f)) == 2
@@ -0,0 +1,38 @@
+import asyncio
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+from generate_realistic_data import generate_realistic_sales_data, save_data_chunks
+from live_server import LiveDashboard
+from setup_realistic_database import create_realistic_database
+from test_database_load import START, make_data
+
+
+def test_refresh_follows_a_full_rebuild(tmp_path, monkeypatch):
+    """A rebuild replaces the database file; the server reads the new one"""
+    make_data(tmp_path, monkeypatch, num_transactions=800)
+    create_realistic_database()
+    dashboard = LiveDashboard(readers=2)
+    try:
+        assert asyncio.run(dashboard.refresh())
+        assert dashboard.metrics.total_transactions == 800
+        assert not asyncio.run(dashboard.refresh())
+
+        save_data_chunks(
+            generate_realistic_sales_data(500, chunk_size=300, start_date=START),
+            "csv",
+        )
+        create_realistic_database()
+        assert asyncio.run(dashboard.refresh())
+        assert dashboard.metrics.total_transactions == 500
+    finally:
+        dashboard.executor.shutdown()
+        dashboard.pool.close()
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+from index_advisor import propose_indexes, query_plan
+from partitions import (
+    create_partition_index,
+    create_partitioned,
+    ensure_partition,
+    record_partition_index,
+    route,
+)
+from setup_realistic_database import create_realistic_database
+from test_database_load import make_data
+
+SALES_DDL = """
+    CREATE TABLE IF NOT EXISTS sales (
+        date_key INTEGER,
+        store_key INTEGER,
+        total REAL
+    )
+"""
+
+
+def index_names(conn):
+    return sorted(
+        name
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE name LIKE 'idx_%'"
+        )
+    )
+
+
+def test_route_rewrites_only_table_references():
+    """Only names after FROM or JOIN are swapped for partitions"""
+    partitions = [("sales", 202607), ("sales", 202608), ("sales", 202609)]
+    sql = (
+        "SELECT 'sales' as sales, s.total FROM sales s "
+        "JOIN sales o ON o.store_key = s.store_key"
+    )
+
+    assert route(sql, partitions, (202608, 202608)) == (
+        "SELECT 'sales' as sales, s.total FROM sales_202608 s "
+        "JOIN sales_202608 o ON o.store_key = s.store_key"
+    )
+    assert route("select * from sales", partitions, (202608, 202609)) == (
+        "select * from "
+        "(SELECT * FROM sales_202608 UNION ALL SELECT * FROM sales_202609)"
+    )
+    assert route("SELECT * FROM sales", partitions, (202610, 202612)) == (
+        "SELECT * FROM (SELECT * FROM sales WHERE 0)"
+    )
+
+
+def test_recorded_indexes_are_built_on_new_partitions():
+    """A kept partition index follows the table into months loaded later"""
+    conn = sqlite3.connect(":memory:")
+    create_partitioned(conn, {"sales": SALES_DDL})
+    ensure_partition(conn, "sales", SALES_DDL, 202607)
+    ensure_partition(conn, "sales", SALES_DDL, 202608)
+
+    created = create_partition_index(
+        conn, "idx_sales_store_key", "sales", ["store_key", "total"]
+    )
+    assert created == ["idx_sales_store_key_202607", "idx_sales_store_key_202608"]
+    record_partition_index(conn, "idx_sales_store_key", "sales", ["store_key", "total"])
+
+    ensure_partition(conn, "sales", SALES_DDL, 202609)
+    assert index_names(conn) == [*created, "idx_sales_store_key_202609"]
+    columns = [
+        row[2] for row in conn.execute("PRAGMA index_info(idx_sales_store_key_202609)")
+    ]
+    assert columns == ["store_key", "total"]
+
+
+def test_advisor_proposes_indexes_for_partitioned_views(tmp_path, monkeypatch):
+    """Scans of month partitions read through a view are proposed for the
+    partitioned table"""
+    make_data(tmp_path, monkeypatch)
+    create_realistic_database()
+
+    conn = sqlite3.connect("database/supermarket.db")
+    sql = (
+        "SELECT t.store_key, SUM(t.subtotal) FROM fact_transactions t "
+        "WHERE t.payment_key = 1 GROUP BY t.store_key"
+    )
+    plan = query_plan(conn, sql)
+    assert any("fact_transactions_2026" in line for line in plan)
+    assert propose_indexes(conn, sql, plan) == [
+        ("fact_transactions", ("payment_key", "store_key", "subtotal"))
+    ]
+    conn.close()
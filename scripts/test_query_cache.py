@@ -0,0 +1,144 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "dashboard")
+)
+
+from aggregations import DashboardFilters, compute_metrics
+from backends import SQLiteBackend
+import query_cache
+from query_cache import QueryCache
+from setup_realistic_database import create_realistic_database, ingest_incremental
+from test_database_load import make_data
+
+
+class CountingBackend:
+    """Backend stand-in that counts the queries it runs"""
+
+    name = "counting"
+
+    def __init__(self):
+        self.queries = 0
+
+    def fingerprint(self, sql):
+        return "v1"
+
+    def read_columns(self, sql, params=()):
+        self.queries += 1
+        return {"total": np.array([1.5, 2.5])}
+
+
+def test_corrupt_entries_are_misses(tmp_path):
+    """A truncated entry is re-queried and replaced, not raised"""
+    cache = QueryCache(str(tmp_path))
+    backend = CountingBackend()
+    sql = "SELECT total FROM daily_sales_rollup"
+
+    cache.read_columns(sql, backend)
+    assert cache.read_columns(sql, backend)["total"].tolist() == [1.5, 2.5]
+    assert (backend.queries, cache.hits, cache.misses) == (1, 1, 1)
+
+    (entry,) = os.listdir(tmp_path)
+    with open(tmp_path / entry, "r+b") as f:
+        f.truncate(10)
+    assert cache.read_columns(sql, backend)["total"].tolist() == [1.5, 2.5]
+    assert (backend.queries, cache.hits, cache.misses) == (2, 1, 2)
+
+    # The entry was rewritten in place, with no temporary files left over
+    assert os.listdir(tmp_path) == [entry]
+    cache.read_columns(sql, backend)
+    assert (backend.queries, cache.hits) == (2, 2)
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"cbuiltins\nno_such_function\n.",  # AttributeError
+        b"cno_such_module\nthing\n.",  # ImportError
+        b"\x80\x63",  # ValueError: unsupported protocol
+    ],
+)
+def test_foreign_entries_are_misses(tmp_path, content):
+    """Any file that fails to unpickle is re-queried and replaced"""
+    cache = QueryCache(str(tmp_path))
+    backend = CountingBackend()
+    sql = "SELECT total FROM daily_sales_rollup"
+    cache.read_columns(sql, backend)
+    (entry,) = os.listdir(tmp_path)
+    with open(tmp_path / entry, "wb") as f:
+        f.write(content)
+
+    assert cache.read_columns(sql, backend)["total"].tolist() == [1.5, 2.5]
+    assert (backend.queries, cache.hits, cache.misses) == (2, 0, 2)
+
+
+def test_entries_removed_by_another_process(tmp_path, monkeypatch):
+    """Entries vanishing between listing and use are skipped"""
+    cache = QueryCache(str(tmp_path))
+    backend = CountingBackend()
+    cache.read_columns("SELECT 1", backend)
+
+    # Another process evicts the entry right after it was read
+    def utime(path):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(query_cache.os, "utime", utime)
+    assert cache.read_columns("SELECT 1", backend)["total"].tolist() == [1.5, 2.5]
+    assert cache.hits == 1
+
+    # ... or while this one evicts from a listing taken before
+    listing = list(os.scandir(tmp_path))
+    cache.clear()
+    monkeypatch.setattr(query_cache.os, "scandir", lambda path: iter(listing))
+    cache.max_bytes = 0
+    cache.evict()
+    cache.clear()
+
+
+def test_ingest_keeps_other_months_cached(tmp_path, monkeypatch):
+    """A batch within one month expires only the passes that read it"""
+    make_data(tmp_path, monkeypatch)
+    create_realistic_database()
+    transactions = pd.read_csv("data/transactions.csv")
+    items = pd.read_csv("data/transaction_items.csv")
+    first, last = transactions["date"].min()[:7], transactions["date"].max()[:7]
+    assert first != last
+
+    # Pay the last month's transactions in cash, with no new labels
+    batch = transactions[transactions["date"].str.startswith(last)].copy()
+    batch["payment_method"] = "Cash"
+    os.makedirs("new")
+    batch.to_csv("new/transactions.csv", index=False)
+    items[items["transaction_id"].isin(batch["transaction_id"])].to_csv(
+        "new/transaction_items.csv", index=False
+    )
+
+    cache = QueryCache(str(tmp_path / "cache"))
+    scopes = [
+        DashboardFilters(date_from=f"{month}-01", date_to=f"{month}-31")
+        for month in (first, last)
+    ]
+
+    def read(scope):
+        backend = SQLiteBackend(read_only=True)
+        compute_metrics(backend, cache, scope)
+        backend.close()
+
+    for scope in scopes:
+        read(scope)
+    assert (cache.hits, cache.misses) == (0, 4)
+
+    ingest_incremental("new/transactions.csv", "new/transaction_items.csv")
+    read(scopes[0])
+    assert (cache.hits, cache.misses) == (2, 4)
+    read(scopes[1])
+    assert (cache.hits, cache.misses) == (2, 6)
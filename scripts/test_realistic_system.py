@@ -1,10 +1,16 @@
 import os
-import sqlite3
-import pandas as pd
+import sys
+import argparse
 import webbrowser
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "database")
+)
 
-def test_realistic_system():
+from backends import open_backend
+
+
+def test_realistic_system(backend="sqlite", source="db"):
     """Test the realistic supermarket dashboard system"""
 
     print("Testing Supermarket Sales Dashboard...")
@@ -38,21 +44,17 @@ def test_realistic_system():
     # Test 2: Database connectivity
     print("\n2. Testing database...")
     try:
-        conn = sqlite3.connect("database/supermarket.db")
+        engine = open_backend(backend, source)
 
         # Check data counts
-        trans_count = pd.read_sql_query(
-            "SELECT COUNT(*) as count FROM transactions", conn
-        )
-        items_count = pd.read_sql_query(
-            "SELECT COUNT(*) as count FROM transaction_items", conn
-        )
-
-        print(f"   ✓ Database connected")
+        trans_count = engine.read_sql("SELECT COUNT(*) as count FROM transactions")
+        items_count = engine.read_sql("SELECT COUNT(*) as count FROM transaction_items")
+
+        print(f"   ✓ Database connected ({engine.name})")
         print(f"   ✓ {trans_count.iloc[0, 0]:,} transactions")
         print(f"   ✓ {items_count.iloc[0, 0]:,} items sold")
 
-        conn.close()
+        engine.close()
     except Exception as e:
         print(f"   ❌ Database error: {e}")
         return False
@@ -60,18 +62,15 @@ def test_realistic_system():
     # Test 3: Validate key insights
     print("\n3. Validating business insights...")
     try:
-        conn = sqlite3.connect("database/supermarket.db")
+        engine = open_backend(backend, source)
 
         # Payment analysis
-        payment_stats = pd.read_sql_query(
-            """
+        payment_stats = engine.read_sql("""
             SELECT payment_method, SUM(gross_income) as revenue
             FROM transactions
             GROUP BY payment_method
             ORDER BY revenue DESC
-        """,
-            conn,
-        )
+        """)
 
         cash_revenue = 0
         for _, row in payment_stats.iterrows():
@@ -87,20 +86,17 @@ def test_realistic_system():
             print("   ✓ Cash is primary payment method (as expected)")
 
         # Product performance
-        top_products = pd.read_sql_query(
-            """
+        top_products = engine.read_sql("""
             SELECT product, SUM(item_total) as revenue
             FROM transaction_items
             GROUP BY product
             ORDER BY revenue DESC
             LIMIT 5
-        """,
-            conn,
-        )
+        """)
 
         print(f"   ✓ Top product: {top_products['product'].iloc[0]}")
 
-        conn.close()
+        engine.close()
     except Exception as e:
         print(f"   ❌ Analysis error: {e}")
         return False
@@ -144,7 +140,22 @@ def test_realistic_system():
 
 
 if __name__ == "__main__":
-    success = test_realistic_system()
+    parser = argparse.ArgumentParser(description="Smoke test the dashboard system")
+    parser.add_argument(
+        "--backend",
+        choices=["sqlite", "duckdb"],
+        default="sqlite",
+        help="query engine used for the data checks",
+    )
+    parser.add_argument(
+        "--source",
+        choices=["db", "csv", "parquet"],
+        default="db",
+        help="data the duckdb backend queries",
+    )
+    args = parser.parse_args()
+
+    success = test_realistic_system(args.backend, args.source)
 
     if not success:
         print("\n" + "=" * 50)